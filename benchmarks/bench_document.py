@@ -0,0 +1,168 @@
+"""
+Benchmark suite for Document operations across file sizes and buffer engines.
+
+Every operation is timed on synthetic files, then run again under tracemalloc to record its peak memory.
+Results are printed as JSON, so that runs on different commits can be compared.
+
+By default the files range from 1,000 to 10,000,000 lines; the largest one takes about 650 MB on disk and over 1 GB of
+memory with the list engine, so pass --sizes to run a subset.
+
+Run from the repository root: python -m benchmarks.bench_document --sizes 1000 100000 --output results.json
+"""
+
+import argparse
+import json
+import pathlib
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable
+
+from editor.buffers import ENGINES
+from editor.document import Document
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def generate_file(directory: pathlib.Path, name: str, number_of_lines: int, line_length: int) -> pathlib.Path:
+    path = directory / name
+    filler = "x" * max(line_length - 16, 0)
+    with path.open("w", encoding="utf-8") as file:
+        for start in range(0, number_of_lines, 10_000):
+            stop = min(start + 10_000, number_of_lines)
+            file.writelines(f"{i:>12},{filler}\n" for i in range(start, stop))
+    return path
+
+
+def generate_files(directory: pathlib.Path, sizes: list[int]) -> list[tuple[str, pathlib.Path, int]]:
+    files = [("empty", generate_file(directory, "empty.txt", 0, 0), 0)]
+    files.extend((f"{size}_lines", generate_file(directory, f"{size}.txt", size, 64), size) for size in sizes)
+    files.append(("long_lines", generate_file(directory, "long_lines.txt", 100, 1 << 20), 100))
+    return files
+
+
+def operations(number_of_lines: int) -> list[tuple[str, Callable[[Document], object]]]:
+    """
+    Operations in the order they are run. Every edit is followed by an undo, so that each one starts from the
+    content of the file; save and close run last.
+    """
+
+    steps: list[tuple[str, Callable[[Document], object]]] = [
+        ("append", lambda document: document.insert_line("appended line")),
+        ("undo_append", lambda document: document.undo()),
+    ]
+    if number_of_lines >= 2:
+        positions = {"head": 1, "middle": number_of_lines // 2, "tail": number_of_lines - 1}
+        for where, line_number in positions.items():
+            steps.extend(
+                [
+                    (f"insert_line_end_{where}", lambda document, n=line_number: document.insert_line(" end", n)),
+                    (f"undo_insert_line_end_{where}", lambda document: document.undo()),
+                    (f"insert_column_{where}", lambda document, n=line_number: document.insert_line("> ", n, 2)),
+                    (f"undo_insert_column_{where}", lambda document: document.undo()),
+                    (f"delete_line_{where}", lambda document, n=line_number: document.delete_line(n)),
+                    (f"undo_delete_line_{where}", lambda document: document.undo()),
+                    (f"swap_lines_{where}", lambda document, n=line_number: document.swap_lines(n, n + 1)),
+                    (f"undo_swap_lines_{where}", lambda document: document.undo()),
+                ]
+            )
+        steps.extend(
+            [
+                ("clear", lambda document: document.clear()),
+                ("undo_clear", lambda document: document.undo()),
+            ]
+        )
+    steps.extend(
+        [
+            ("save", lambda document: document.save()),
+            ("close", lambda document: document.close()),
+        ]
+    )
+    return steps
+
+
+def run(path: pathlib.Path, engine: str, number_of_lines: int, trace_memory: bool) -> dict[str, float]:
+    results = {}
+
+    def measure(name: str, function: Callable[[], object]) -> object:
+        if trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            result = function()
+            results[name] = tracemalloc.get_traced_memory()[1] - baseline
+        else:
+            started = time.perf_counter()
+            result = function()
+            results[name] = time.perf_counter() - started
+        return result
+
+    document = measure("open", lambda: Document(path, engine))
+    # Lazy engines postpone reading the file until the number of lines is first needed.
+    measure("count_lines", lambda: document.number_of_lines)
+    for name, operation in operations(number_of_lines):
+        measure(name, lambda: operation(document))
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="numbers of lines of the synthetic files"
+    )
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES), help="buffer engines")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--output", type=pathlib.Path, help="write the JSON results to the file instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    report = {
+        "commit": git_commit(),
+        "python": sys.version,
+        "platform": platform.platform(),
+        "results": [],
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, path, number_of_lines in generate_files(pathlib.Path(directory), sorted(args.sizes)):
+            for engine in args.engines:
+                print(f"Benchmarking {name} with the {engine} engine...", file=sys.stderr)
+                seconds = run(path, engine, number_of_lines, trace_memory=False)
+                peak_bytes = {}
+                if not args.no_memory:
+                    tracemalloc.start()
+                    try:
+                        peak_bytes = run(path, engine, number_of_lines, trace_memory=True)
+                    finally:
+                        tracemalloc.stop()
+                report["results"].append(
+                    {
+                        "file": name,
+                        "lines": number_of_lines,
+                        "bytes": path.stat().st_size,
+                        "engine": engine,
+                        "seconds": seconds,
+                        "peak_bytes": peak_bytes,
+                    }
+                )
+
+    output = json.dumps(report, indent=2)
+    if args.output is not None:
+        args.output.write_text(output, encoding="utf-8")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
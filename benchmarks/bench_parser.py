@@ -0,0 +1,53 @@
+"""
+Micro-benchmark of the per-command parse overhead.
+
+Run from the repository root: python -m benchmarks.bench_parser
+"""
+
+import re
+import timeit
+
+from editor.commands import parse
+
+COMMANDS = [
+    'insert "appended text"',
+    'insert 12 "appended to the line"',
+    'insert 12 4 "inserted at the column"',
+    "delete 42",
+    "swap 3 1000",
+    "undo",
+    "undo 5",
+    "save",
+]
+
+
+def legacy_parse(command: str):
+    """
+    The re.match chain the editor used before the command registry, kept as a baseline.
+    """
+
+    if m := re.match(r"insert(?: (\d+))?(?: (\d+))? \"(.+)\"$", command):
+        *numbers, text = [x for x in m.groups() if x is not None]
+        return [*map(int, numbers), text]
+    elif m := re.match(r"delete (\d+)$", command):
+        return [int(m.group(1))]
+    elif m := re.match(r"swap (\d+) (\d+)$", command):
+        return [int(x) for x in m.groups() if x is not None]
+    elif command in ("undo", "clear", "save", "close"):
+        return []
+    return None
+
+
+def measure(function, command: str, number: int) -> float:
+    return min(timeit.repeat(lambda: function(command), number=number, repeat=5)) / number * 1e9
+
+
+def main(number: int = 100_000):
+    print(f"{'command':<40} {'registry, ns':>14} {'re.match chain, ns':>20}")
+    for command in COMMANDS:
+        legacy = measure(legacy_parse, command, number) if not command.startswith("undo ") else float("nan")
+        print(f"{command:<40} {measure(parse, command, number):>14.0f} {legacy:>20.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark of the time from starting main.py to its first prompt, across file sizes and buffer engines.
+
+Each run starts a new interpreter, so the time includes the interpreter start-up and the imports of main.py; the time
+of an interpreter that does nothing is reported as a baseline. Once the first prompt appears, a search of the last line
+is sent, and the time to the next prompt tells when the whole file was loaded.
+
+Run from the repository root: python -m benchmarks.bench_startup --sizes 1000 1000000 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_document import generate_file, git_commit
+from editor.buffers import ENGINES
+
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)
+MAIN = pathlib.Path(__file__).resolve().parent.parent / "main.py"
+PROMPT = b">>> "
+
+
+def read_until_prompt(process: subprocess.Popen) -> None:
+    output = b""
+    while not output.endswith(PROMPT):
+        data = os.read(process.stdout.fileno(), 1 << 16)
+        if not data:
+            raise RuntimeError(f"main.py exited before prompting: {process.stderr.read().decode()}")
+        output += data
+
+
+def run(path: pathlib.Path, engine: str, number_of_lines: int) -> dict[str, float]:
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, str(MAIN), str(path), "--engine", engine, "--no-stats"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        read_until_prompt(process)
+        results = {"first_prompt": time.perf_counter() - started}
+        if number_of_lines:
+            process.stdin.write(f'find {number_of_lines} {number_of_lines} "x"\n'.encode())
+            process.stdin.flush()
+            read_until_prompt(process)
+            results["last_line"] = time.perf_counter() - started
+        process.stdin.write(b"close\n")
+        process.stdin.close()
+        process.wait(timeout=60)
+    finally:
+        process.kill()
+        process.stdout.close()
+        process.stderr.close()
+    return results
+
+
+def interpreter_baseline(repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="numbers of lines of the synthetic files"
+    )
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES), help="buffer engines")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per file and engine, of which the median is kept")
+    parser.add_argument("--output", type=pathlib.Path, help="write the JSON results to the file instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    report = {
+        "commit": git_commit(),
+        "python": sys.version,
+        "platform": platform.platform(),
+        "interpreter_seconds": interpreter_baseline(args.repeat),
+        "results": [],
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        files = [("empty", generate_file(pathlib.Path(directory), "empty.txt", 0, 0), 0)]
+        files.extend(
+            (f"{size}_lines", generate_file(pathlib.Path(directory), f"{size}.txt", size, 64), size)
+            for size in sorted(args.sizes)
+        )
+        for name, path, number_of_lines in files:
+            for engine in args.engines:
+                print(f"Benchmarking {name} with the {engine} engine...", file=sys.stderr)
+                runs = [run(path, engine, number_of_lines) for _ in range(args.repeat)]
+                report["results"].append(
+                    {
+                        "file": name,
+                        "lines": number_of_lines,
+                        "bytes": path.stat().st_size,
+                        "engine": engine,
+                        "seconds": {key: statistics.median(result[key] for result in runs) for key in runs[0]},
+                    }
+                )
+
+    output = json.dumps(report, indent=2)
+    if args.output is not None:
+        args.output.write_text(output, encoding="utf-8")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
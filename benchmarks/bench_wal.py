@@ -0,0 +1,84 @@
+"""
+Benchmark of the write-ahead log: the cost of logging an edit compared to saving the file, and the replay throughput.
+
+Run from the repository root: python -m benchmarks.bench_wal --lines 100000 --edits 10000
+"""
+
+import argparse
+import json
+import pathlib
+import random
+import tempfile
+import time
+
+from benchmarks.bench_document import generate_file
+from editor.buffers import ENGINES
+from editor.document import Document
+
+
+def random_edits(document: Document, number_of_edits: int, seed: int = 42) -> None:
+    generator = random.Random(seed)
+    for _ in range(number_of_edits):
+        number_of_lines = document.number_of_lines
+        match generator.randrange(3):
+            case 0:
+                document.insert_line(" edited", generator.randint(1, number_of_lines))
+            case 1 if number_of_lines > 1:
+                document.delete_line(generator.randint(1, number_of_lines))
+            case _:
+                line1_number, line2_number = generator.sample(range(1, number_of_lines + 1), 2)
+                document.swap_lines(line1_number, line2_number)
+
+
+def run(path: pathlib.Path, engine: str, number_of_edits: int, sync_interval: float) -> dict[str, float]:
+    document = Document(path, engine)
+    document.number_of_lines
+    started = time.perf_counter()
+    random_edits(document, number_of_edits)
+    unlogged = time.perf_counter() - started
+
+    document = Document(path, engine)
+    document.number_of_lines
+    document.enable_wal(sync_interval)
+    started = time.perf_counter()
+    random_edits(document, number_of_edits)
+    logged = time.perf_counter() - started
+    document.wal.sync()
+
+    started = time.perf_counter()
+    replayed = Document(path, engine).enable_wal(sync_interval)
+    replay = time.perf_counter() - started
+
+    # Saving is what the log saves the editor from doing after every edit.
+    started = time.perf_counter()
+    document.save()
+    save = time.perf_counter() - started
+    document.close()
+
+    return {
+        "log_per_edit_us": (logged - unlogged) / number_of_edits * 1e6,
+        "save_ms": save * 1e3,
+        "replayed_records": replayed,
+        "replay_ms": replay * 1e3,
+        "replay_records_per_second": replayed / replay,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=100_000, help="number of lines of the synthetic file")
+    parser.add_argument("--edits", type=int, default=10_000, help="number of random edits")
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES), help="buffer engines")
+    parser.add_argument("--sync-interval", type=float, default=1.0, help="seconds between fsyncs of the log")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = generate_file(pathlib.Path(directory), "wal.txt", args.lines, 64)
+        for engine in args.engines:
+            results[engine] = run(path, engine, args.edits, args.sync_interval)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import threading
+import time
+from typing import MutableSequence
+
+from .document import Document
+from .storage import SaveReport, write_atomically
+
+
+def snapshot(content: MutableSequence[str]) -> list:
+    """
+    Copy the segments of a buffer. Line lists are copied, spans of a file-backed buffer are immutable and shared.
+    """
+
+    return [segment.copy() if isinstance(segment, list) else segment for segment in content.segments()]
+
+
+class Autosaver:
+    """
+    Saves a document in a background thread, so that writing to a slow filesystem never blocks the prompt.
+    Edits are coalesced: the document is written once its first unsaved edit is interval seconds old, or after
+    max_edits edits, whichever comes first. The editor runs every command under the lock; the thread holds it only
+    to snapshot the buffer, and writes the snapshot without it.
+    """
+
+    def __init__(self, document: Document, interval: float = 5.0, max_edits: int = 100):
+        self.document = document
+        self.interval = interval
+        self.max_edits = max_edits
+        self.lock = threading.Lock()
+
+        # Guarded by the condition.
+        self.condition = threading.Condition()
+        self.edits = 0
+        self.dirty_since: float | None = None
+        self.writing = False
+        self.closed = False
+        self.error: OSError | None = None
+        self.last_report: SaveReport | None = None
+
+        self.thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self.thread.start()
+
+    def edited(self) -> None:
+        with self.condition:
+            self.edits += 1
+            if self.dirty_since is None:
+                self.dirty_since = time.monotonic()
+                self.condition.notify_all()
+            elif self.edits >= self.max_edits:
+                self.condition.notify_all()
+
+    def _wait_until_due(self) -> bool:
+        with self.condition:
+            while not self.closed:
+                timeout = None
+                if self.dirty_since is not None:
+                    timeout = self.dirty_since + self.interval - time.monotonic()
+                    if timeout <= 0 or self.edits >= self.max_edits:
+                        self.edits = 0
+                        self.dirty_since = None
+                        return True
+                self.condition.wait(timeout)
+            return False
+
+    def _run(self) -> None:
+        while self._wait_until_due():
+            document = self.document
+            with self.lock:
+                if document.state == document.saved_state:
+                    continue
+                # The file is written whole, so a file still loading is loaded first.
+                document.load_lines()
+                state = document.state
+                segments = snapshot(document.current_content)
+                position = document.wal.position if document.wal is not None else None
+                with self.condition:
+                    self.writing = True
+
+            try:
+                report = write_atomically(document.path, segments)
+                stat = document.stat_file()
+            except OSError as e:
+                with self.condition:
+                    self.error = e
+                    self.writing = False
+                    self.condition.notify_all()
+                continue
+
+            with self.condition:
+                # Commands that read the saved state wait for the write first, see wait().
+                document.saved_state = state
+                document.saved_stat = stat
+                self.last_report = report
+                self.writing = False
+                self.condition.notify_all()
+
+            if position is not None:
+                with self.lock:
+                    # Unless the document was saved meanwhile, its log now only needs the edits made after the snapshot.
+                    if document.saved_state == state and document.wal is not None:
+                        document.wal.rebase(position)
+
+    def wait(self) -> None:
+        """
+        Drop the coalesced edits and wait for the write in progress. Must be called with the lock held, so that no new
+        write can start until the caller is done with the saved state of the document.
+        """
+
+        with self.condition:
+            self.edits = 0
+            self.dirty_since = None
+            while self.writing:
+                self.condition.wait()
+
+    def flush(self) -> None:
+        """
+        Write the document now if an autosave is pending. Must be called with the lock held.
+        """
+
+        self.wait()
+        if self.document.state != self.document.saved_state:
+            self.document.save()
+
+    def take_error(self) -> OSError | None:
+        with self.condition:
+            error, self.error = self.error, None
+            return error
+
+    def stop(self) -> None:
+        """
+        Stop the thread and write the edits it hasn't saved yet.
+        """
+
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+        with self.lock:
+            self.flush()
@@ -0,0 +1,131 @@
+from typing import Callable, Sequence
+
+from .exceptions import *
+
+# Above this many deletions a list buffer is rebuilt in one pass instead of shifting it once per deletion.
+REBUILD_THRESHOLD = 64
+
+
+class Batch:
+    """
+    Set of edits validated against one starting state of a document.
+    Line numbers always refer to the lines the document had when the batch started; lines appended by the batch
+    are numbered after them, in their current order. Nothing is applied until the batch is turned into operations.
+    """
+
+    def __init__(self, content: Sequence[str]):
+        self.content = content
+        self.size = len(content)
+        self.changed: dict[int, str] = {}
+        self.deleted: set[int] = set()
+        self.appended: list[str] = []
+
+    @property
+    def is_empty(self) -> bool:
+        return len(self.deleted) == self.size and not self.appended
+
+    def _index(self, line_number: int) -> int:
+        if line_number == 0:
+            raise ZeroLineNumber
+        elif line_number > self.size + len(self.appended):
+            raise TooLargeLineNumber(line_number)
+        elif line_number - 1 in self.deleted:
+            raise LineAlreadyDeleted(line_number)
+        else:
+            return line_number - 1
+
+    def _get(self, index: int) -> str:
+        if index >= self.size:
+            return self.appended[index - self.size]
+        elif index in self.changed:
+            return self.changed[index]
+        else:
+            return self.content[index]
+
+    def _set(self, index: int, text: str) -> None:
+        if index >= self.size:
+            self.appended[index - self.size] = text
+        else:
+            self.changed[index] = text
+
+    def _last_index(self) -> int | None:
+        if self.appended:
+            return self.size + len(self.appended) - 1
+        index = self.size - 1
+        while index in self.deleted:
+            index -= 1
+        return index if index >= 0 else None
+
+    def insert_line(self, text: str, line_number: int | None = None, column_number: int | None = None) -> None:
+        if line_number is not None and column_number is not None:
+            if self.is_empty and line_number == 1 and column_number == 1:
+                self.appended.append(f"{text}\n")
+            else:
+                index = self._index(line_number)
+                line_content = self._get(index)
+                if column_number == 0:
+                    raise ZeroColumnNumber
+                elif column_number > len(line_content):
+                    raise TooLargeColumnNumber(column_number)
+                else:
+                    self._set(
+                        index, "".join((line_content[: column_number - 1], text, line_content[column_number - 1 :]))
+                    )
+        elif line_number is not None:
+            if self.is_empty and line_number == 1:
+                self.appended.append(f"{text}\n")
+            else:
+                index = self._index(line_number)
+                line_content = self._get(index).removesuffix("\n")
+                self._set(index, f"{line_content}{text}\n")
+        else:
+            if (index := self._last_index()) is not None and not (line_content := self._get(index)).endswith("\n"):
+                self._set(index, f"{line_content}\n")
+            self.appended.append(text)
+
+    def delete_line(self, line_number: int) -> None:
+        index = self._index(line_number)
+        if index >= self.size:
+            del self.appended[index - self.size]
+        else:
+            self.changed.pop(index, None)
+            self.deleted.add(index)
+
+    def swap_lines(self, line1_number: int, line2_number: int) -> None:
+        if line1_number == 0 or line2_number == 0:
+            raise ZeroLineNumber
+        index1 = self._index(line1_number)
+        index2 = self._index(line2_number)
+        if index1 == index2:
+            raise LineSwappedWithItself
+
+        line1_content = self._get(index1)
+        line2_content = self._get(index2)
+
+        if not line1_content.endswith("\n"):
+            line1_content += "\n"
+        if not line2_content.endswith("\n"):
+            line2_content += "\n"
+
+        self._set(index1, line2_content)
+        self._set(index2, line1_content)
+
+    def ops(self, rebuild: Callable[[list[str]], Sequence[str]] | None = None) -> list[tuple]:
+        """
+        Turn the batch into edit operations that don't shift each other's line indexes.
+        When a rebuild factory is given, many deletions become a single operation that replaces the whole content.
+        """
+
+        if rebuild is not None and len(self.deleted) > REBUILD_THRESHOLD:
+            lines = [self._get(index) for index in range(self.size) if index not in self.deleted]
+            lines.extend(self.appended)
+            return [("replace", rebuild(lines))]
+
+        # Lines are compared by value, since engines that decode lines return a new string on every read.
+        ops: list[tuple] = [
+            ("set", index, text) for index, text in sorted(self.changed.items()) if text != self.content[index]
+        ]
+        ops.extend(("delete", index) for index in sorted(self.deleted, reverse=True))
+        size = self.size - len(self.deleted)
+        ops.extend(("insert", size + offset, text) for offset, text in enumerate(self.appended))
+        return ops
@@ -0,0 +1,20 @@
+from .bytes_buffer import BytesBuffer
+from .list_buffer import ListBuffer
+from .mapped_buffer import MappedBuffer, MappedFile
+from .rope_buffer import RopeBuffer
+
+ENGINES = {
+    "list": ListBuffer,
+    "rope": RopeBuffer,
+    "mapped": MappedBuffer,
+    "bytes": BytesBuffer,
+}
+
+__all__ = [
+    "ENGINES",
+    "BytesBuffer",
+    "ListBuffer",
+    "MappedBuffer",
+    "MappedFile",
+    "RopeBuffer",
+]
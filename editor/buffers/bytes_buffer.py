@@ -0,0 +1,146 @@
+import io
+import pathlib
+from typing import Iterable, Iterator
+
+from .mapped_buffer import MappedBuffer, MappedFile
+from .rope_buffer import RopeBuffer, _leaves, _Span
+from ..exceptions import *
+
+
+class _RawLine(str):
+    """
+    Decoded line that remembers the bytes it was decoded from, so that it's written back unchanged wherever the
+    document puts it: swapped, moved, copied or restored by undo.
+    """
+
+    raw: bytes
+
+
+def _decode(raw: bytes, path: pathlib.Path | None, offset: int) -> _RawLine:
+    try:
+        text = raw.decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise InvalidEncoding(path, offset + e.start) from None
+    if text.endswith("\r\n"):
+        text = f"{text[:-2]}\n"
+    line = _RawLine(text)
+    line.raw = raw
+    return line
+
+
+def _encode(line: str, newline: bytes) -> bytes:
+    if type(line) is _RawLine:
+        return line.raw
+    if newline != b"\n" and line.endswith("\n"):
+        return b"".join((line[:-1].encode("utf-8"), newline))
+    return line.encode("utf-8")
+
+
+class _RawFile(MappedFile):
+    """
+    Mapped file whose lines remember their bytes, line break included.
+    """
+
+    def line(self, line_index: int) -> _RawLine:
+        start = self.line_start(line_index)
+        return _decode(self.data[start : self.line_end(line_index)], self.path, start)
+
+    def iter_lines(self, start: int, stop: int) -> Iterator[_RawLine]:
+        if start >= stop:
+            return
+        position, end = self.byte_range(start, stop)
+        while position < end:
+            chunk_end = self.data.find(b"\n", min(position + self.chunk_size, end) - 1, end)
+            chunk_end = end if chunk_end == -1 else chunk_end + 1
+            for raw in io.BytesIO(self.data[position:chunk_end]).readlines():
+                yield _decode(raw, self.path, position)
+                position += len(raw)
+
+
+class _RawSpill:
+    """
+    Lines of a spill store that were written with their own bytes, read back as raw lines.
+    """
+
+    __slots__ = ("store",)
+
+    def __init__(self, store):
+        self.store = store
+
+    def fileno(self) -> int:
+        return self.store.fileno()
+
+    def byte_range(self, start: int, stop: int) -> tuple[int, int]:
+        return self.store.byte_range(start, stop)
+
+    def line(self, line_index: int) -> _RawLine:
+        return _decode(self.store.raw_line(line_index), None, 0)
+
+    def iter_lines(self, start: int, stop: int) -> Iterator[_RawLine]:
+        for raw in self.store.iter_raw_lines(start, stop):
+            yield _decode(raw, None, 0)
+
+
+class _ByteLines(list):
+    """
+    Lines of a leaf of a bytes buffer, saved with their own bytes if they were read from the file, and with the line
+    break of the buffer if they were edited.
+    """
+
+    def __init__(self, lines: Iterable[str] = (), newline: bytes = b"\n"):
+        super().__init__(lines)
+        self.newline = newline
+
+    def copy(self) -> "_ByteLines":
+        return _ByteLines(self, self.newline)
+
+    def encoded_chunks(self) -> Iterator[bytes]:
+        yield b"".join([_encode(line, self.newline) for line in self])
+
+
+class BytesBuffer(MappedBuffer):
+    """
+    Buffer engine that leaves the lines of the file as bytes in a memory-mapped file and decodes a line only when
+    it's read. Runs of untouched lines stay spans of the file, which saving copies byte for byte, so neither opening
+    nor saving depends on the size or the encoding of the untouched part of the file; lines read from the file keep
+    their bytes wherever they are put. The line break of the first line, CRLF or LF, is detected on open and used for
+    the edited and inserted lines; untouched lines keep their own.
+    """
+
+    @classmethod
+    def open(cls, path: pathlib.Path) -> "BytesBuffer":
+        buffer = cls()
+        buffer.source = _RawFile(path)
+        if buffer.source.data[: buffer.source.line_end(0)].endswith(b"\r\n"):
+            buffer.line_break = b"\r\n"
+        del buffer.root
+        return buffer
+
+    def __init__(self, lines: Iterable[str] = (), line_break: bytes = b"\n"):
+        super().__init__(lines)
+        self.line_break = line_break
+
+    @property
+    def newline(self) -> str:
+        return self.line_break.decode("ascii")
+
+    def segments(self) -> Iterator[_ByteLines | _Span]:
+        for leaf in _leaves(self.root):
+            yield leaf.piece if isinstance(leaf.piece, _Span) else _ByteLines(leaf.piece, self.line_break)
+
+    def _wrap_rope(self, rope: RopeBuffer) -> "BytesBuffer":
+        buffer = BytesBuffer(line_break=self.line_break)
+        buffer.root = rope.root
+        return buffer
+
+    def copy(self) -> "BytesBuffer":
+        return self._wrap_rope(RopeBuffer(self))
+
+    def copy_range(self, start: int, stop: int) -> "BytesBuffer":
+        return self._wrap_rope(super().copy_range(start, stop))
+
+    def cut(self, start: int, stop: int) -> "BytesBuffer":
+        return self._wrap_rope(super().cut(start, stop))
+
+    def _spilled(self, store, lines: list[str]) -> _Span:
+        return _Span(_RawSpill(store), *store.append_raw_lines([_encode(line, self.line_break) for line in lines]))
@@ -0,0 +1,33 @@
+import pathlib
+from typing import Iterable, Iterator
+
+
+class ListBuffer(list):
+    """
+    Buffer engine that keeps every line in a plain Python list.
+    """
+
+    file_backed: bool = False
+    decodes_on_open: bool = True
+
+    @classmethod
+    def open(cls, path: pathlib.Path) -> "ListBuffer":
+        with path.open("r", encoding="utf-8") as file:
+            return cls(file.readlines())
+
+    def segments(self) -> Iterator[list[str]]:
+        yield self
+
+    def copy(self) -> "ListBuffer":
+        return ListBuffer(self)
+
+    def copy_range(self, start: int, stop: int) -> "ListBuffer":
+        return ListBuffer(self[start:stop])
+
+    def cut(self, start: int, stop: int) -> "ListBuffer":
+        lines = ListBuffer(self[start:stop])
+        del self[start:stop]
+        return lines
+
+    def paste(self, index: int, lines: Iterable[str]) -> None:
+        self[index:index] = lines
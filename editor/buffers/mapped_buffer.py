@@ -0,0 +1,166 @@
+import array
+import bisect
+import collections
+import io
+import itertools
+import mmap
+import operator
+import os
+import pathlib
+import weakref
+from typing import Iterator
+
+from .rope_buffer import RopeBuffer, _Leaf, _Span
+from ..exceptions import *
+
+
+class MappedFile:
+    """
+    Read-only memory mapping of a UTF-8 text file.
+    Newlines are counted per fixed-size block the first time a block is needed, so only the blocks in front of
+    the accessed line are ever scanned, and the exact offsets of a block's newlines are kept in a small cache.
+    """
+
+    block_size: int = 1 << 16
+    cache_size: int = 128
+    chunk_size: int = 1 << 20
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self.file = path.open("rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        # Spans in the journal or in an autosave snapshot may outlive the buffer, so the mapping is closed once the
+        # last of them is gone, or explicitly when the document is closed.
+        self._finalizer = weakref.finalize(self, MappedFile._release, self.data, self.file)
+        # block_newlines[k] is the number of newlines in front of the block №k.
+        self.block_newlines = array.array("q", [0])
+        self.block_offsets: collections.OrderedDict[int, array.array] = collections.OrderedDict()
+        self._number_of_lines: int | None = None
+
+    @property
+    def number_of_lines(self) -> int:
+        if self._number_of_lines is None:
+            while self._count_next_block():
+                pass
+            trailing_line = self.size > 0 and self.data[self.size - 1] != ord("\n")
+            self._number_of_lines = self.block_newlines[-1] + trailing_line
+        return self._number_of_lines
+
+    def _count_next_block(self) -> bool:
+        start = (len(self.block_newlines) - 1) * self.block_size
+        if start >= self.size:
+            return False
+        self.block_newlines.append(self.block_newlines[-1] + self.data[start : start + self.block_size].count(b"\n"))
+        return True
+
+    def _newlines_in_block(self, block: int) -> array.array:
+        if (offsets := self.block_offsets.get(block)) is not None:
+            self.block_offsets.move_to_end(block)
+            return offsets
+
+        start = block * self.block_size
+        parts = self.data[start : start + self.block_size].split(b"\n")
+        parts.pop()
+        # The newline after each part is the length of the part plus one further than the previous newline.
+        offsets = array.array(
+            "q", itertools.accumulate(map(operator.add, map(len, parts), itertools.repeat(1)), initial=start - 1)
+        )
+        del offsets[0]
+
+        self.block_offsets[block] = offsets
+        if len(self.block_offsets) > self.cache_size:
+            self.block_offsets.popitem(last=False)
+        return offsets
+
+    def _newline_offset(self, newline_number: int) -> int | None:
+        while self.block_newlines[-1] < newline_number and self._count_next_block():
+            pass
+        if self.block_newlines[-1] < newline_number:
+            return None
+        block = bisect.bisect_left(self.block_newlines, newline_number) - 1
+        return self._newlines_in_block(block)[newline_number - self.block_newlines[block] - 1]
+
+    def line_start(self, line_index: int) -> int:
+        if line_index == 0:
+            return 0
+        offset = self._newline_offset(line_index)
+        return self.size if offset is None else offset + 1
+
+    def line_end(self, line_index: int) -> int:
+        offset = self._newline_offset(line_index + 1)
+        return self.size if offset is None else offset + 1
+
+    def byte_range(self, start: int, stop: int) -> tuple[int, int]:
+        return self.line_start(start), self.line_end(stop - 1)
+
+    def fileno(self) -> int:
+        return self.file.fileno()
+
+    def _decode(self, raw: bytes, offset: int) -> str:
+        try:
+            return raw.decode("utf-8")
+        except UnicodeDecodeError as e:
+            raise InvalidEncoding(self.path, offset + e.start) from None
+
+    def line(self, line_index: int) -> str:
+        start = self.line_start(line_index)
+        text = self._decode(self.data[start : self.line_end(line_index)], start)
+        if text.endswith("\r\n"):
+            text = f"{text[:-2]}\n"
+        return text
+
+    def iter_lines(self, start: int, stop: int) -> Iterator[str]:
+        if start >= stop:
+            return
+        position, end = self.byte_range(start, stop)
+        while position < end:
+            chunk_end = self.data.find(b"\n", min(position + self.chunk_size, end) - 1, end)
+            chunk_end = end if chunk_end == -1 else chunk_end + 1
+            text = self._decode(self.data[position:chunk_end], position)
+            if "\r\n" in text:
+                text = text.replace("\r\n", "\n")
+            yield from io.StringIO(text, newline="\n").readlines()
+            position = chunk_end
+
+    @staticmethod
+    def _release(data, file) -> None:
+        if isinstance(data, mmap.mmap):
+            data.close()
+        file.close()
+
+    def close(self) -> None:
+        self._finalizer()
+
+
+class MappedBuffer(RopeBuffer):
+    """
+    Rope buffer engine whose untouched lines stay in a memory-mapped file and are decoded only when accessed.
+    The file isn't scanned until the number of lines is first needed.
+    """
+
+    file_backed: bool = True
+    decodes_on_open: bool = False
+
+    @classmethod
+    def open(cls, path: pathlib.Path) -> "MappedBuffer":
+        buffer = cls()
+        buffer.source = MappedFile(path)
+        # The tree is built by __getattr__ on first access, once the lines have been counted.
+        del buffer.root
+        return buffer
+
+    def __init__(self, lines=()):
+        self.source: MappedFile | None = None
+        super().__init__(lines)
+
+    def __getattr__(self, name: str):
+        if name != "root" or self.__dict__.get("source") is None:
+            raise AttributeError(name)
+        number_of_lines = self.source.number_of_lines
+        self.root = _Leaf(_Span(self.source, 0, number_of_lines)) if number_of_lines else None
+        return self.root
+
+    def close(self) -> None:
+        if self.source is not None:
+            self.source.close()
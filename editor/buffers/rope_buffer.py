@@ -0,0 +1,338 @@
+import collections.abc
+import contextlib
+import itertools
+import pathlib
+from typing import Iterable, Iterator
+
+from ..spill import lines_size
+from ..exceptions import *
+
+LEAF_SIZE = 512
+# Spans shorter than this are decoded when a neighbouring line is edited, to keep the tree from fragmenting.
+MIN_SPAN_SIZE = 16
+# Ticks whenever a leaf is created or its lines are accessed by index, so that the coldest leaves are spilled first.
+_clock = itertools.count()
+
+
+class _Span:
+    """
+    Run of consecutive lines that are still read from the source they were loaded from.
+    """
+
+    __slots__ = ("source", "start", "stop")
+
+    def __init__(self, source, start: int, stop: int):
+        self.source = source
+        self.start = start
+        self.stop = stop
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def __getitem__(self, index: int) -> str:
+        return self.source.line(self.start + index)
+
+    def __iter__(self) -> Iterator[str]:
+        return self.source.iter_lines(self.start, self.stop)
+
+    def raw_range(self) -> tuple[int, int, int] | None:
+        if not hasattr(self.source, "byte_range"):
+            return None
+        return self.source.fileno(), *self.source.byte_range(self.start, self.stop)
+
+    def split(self, offset: int, middle: list[str], skip: int) -> list:
+        head = _Span(self.source, self.start, self.start + offset)
+        tail = _Span(self.source, self.start + offset + skip, self.stop)
+        # Lines that can't be decoded stay in their spans, so that editing their neighbours still works.
+        if len(head) < MIN_SPAN_SIZE:
+            with contextlib.suppress(InvalidEncoding):
+                middle = [*head, *middle]
+                head = None
+        if len(tail) < MIN_SPAN_SIZE:
+            with contextlib.suppress(InvalidEncoding):
+                middle = [*middle, *tail]
+                tail = None
+        return [piece for piece in (head, middle, tail) if piece]
+
+
+class _Leaf:
+    __slots__ = ("piece", "size", "used")
+    height = 0
+
+    def __init__(self, piece: list[str] | _Span):
+        self.piece = piece
+        self.size = len(piece)
+        self.used = next(_clock)
+
+
+class _Branch:
+    __slots__ = ("left", "right", "size", "height")
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+        self.size = left.size + right.size
+        self.height = max(left.height, right.height) + 1
+
+
+def _balance(left, right):
+    if left.height > right.height + 1:
+        if left.left.height >= left.right.height:
+            return _Branch(left.left, _Branch(left.right, right))
+        return _Branch(_Branch(left.left, left.right.left), _Branch(left.right.right, right))
+    if right.height > left.height + 1:
+        if right.right.height >= right.left.height:
+            return _Branch(_Branch(left, right.left), right.right)
+        return _Branch(_Branch(left, right.left.left), _Branch(right.left.right, right.right))
+    return _Branch(left, right)
+
+
+def _join(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.height > right.height + 1:
+        return _balance(left.left, _join(left.right, right))
+    if right.height > left.height + 1:
+        return _balance(_join(left, right.left), right.right)
+    return _Branch(left, right)
+
+
+def _build(leaves: list, lo: int, hi: int):
+    if lo == hi:
+        return None
+    if hi - lo == 1:
+        return leaves[lo]
+    middle = (lo + hi) // 2
+    return _Branch(_build(leaves, lo, middle), _build(leaves, middle, hi))
+
+
+def _from_pieces(pieces: list):
+    leaves = [_Leaf(piece) for piece in pieces]
+    return _build(leaves, 0, len(leaves))
+
+
+def _locate(node, index: int) -> tuple[_Leaf, int]:
+    while node.height:
+        left = node.left
+        if index < left.size:
+            node = left
+        else:
+            index -= left.size
+            node = node.right
+    return node, index
+
+
+def _insert(node, index: int, value: str):
+    if isinstance(node, _Leaf):
+        if isinstance(node.piece, _Span):
+            return _from_pieces(node.piece.split(index, [value], 0))
+        node.piece.insert(index, value)
+        node.size += 1
+        node.used = next(_clock)
+        if node.size > LEAF_SIZE:
+            middle = node.size // 2
+            return _Branch(_Leaf(node.piece[:middle]), _Leaf(node.piece[middle:]))
+        return node
+    if index <= node.left.size:
+        return _join(_insert(node.left, index, value), node.right)
+    return _join(node.left, _insert(node.right, index - node.left.size, value))
+
+
+def _assign(node, index: int, value: str):
+    if isinstance(node, _Leaf):
+        if isinstance(node.piece, _Span):
+            return _from_pieces(node.piece.split(index, [value], 1))
+        node.piece[index] = value
+        return node
+    if index < node.left.size:
+        return _join(_assign(node.left, index, value), node.right)
+    return _join(node.left, _assign(node.right, index - node.left.size, value))
+
+
+def _delete(node, index: int):
+    if isinstance(node, _Leaf):
+        if isinstance(node.piece, _Span):
+            return _from_pieces(node.piece.split(index, [], 1))
+        del node.piece[index]
+        node.size -= 1
+        node.used = next(_clock)
+        return node if node.size else None
+    if index < node.left.size:
+        return _join(_delete(node.left, index), node.right)
+    return _join(node.left, _delete(node.right, index - node.left.size))
+
+
+def _split(node, index: int) -> tuple:
+    """
+    Split the tree into the trees of the lines before and from the index, sharing every leaf but the one split.
+    """
+
+    if node is None:
+        return None, None
+    if isinstance(node, _Leaf):
+        if index == 0:
+            return None, node
+        if index == node.size:
+            return node, None
+        if isinstance(node.piece, _Span):
+            span = node.piece
+            return _Leaf(_Span(span.source, span.start, span.start + index)), _Leaf(
+                _Span(span.source, span.start + index, span.stop)
+            )
+        return _Leaf(node.piece[:index]), _Leaf(node.piece[index:])
+    if index < node.left.size:
+        left, right = _split(node.left, index)
+        return left, _join(right, node.right)
+    left, right = _split(node.right, index - node.left.size)
+    return _join(node.left, left), right
+
+
+def _leaves(node) -> Iterator[_Leaf]:
+    stack = [node] if node is not None else []
+    while stack:
+        node = stack.pop()
+        if isinstance(node, _Leaf):
+            yield node
+        else:
+            stack.append(node.right)
+            stack.append(node.left)
+
+
+class RopeBuffer(collections.abc.MutableSequence):
+    """
+    Buffer engine that keeps lines in the leaves of a height-balanced tree indexed by line number.
+    Insert, delete and lookup of a single line cost O(log n).
+    """
+
+    file_backed: bool = False
+    decodes_on_open: bool = True
+
+    @classmethod
+    def open(cls, path: pathlib.Path) -> "RopeBuffer":
+        with path.open("r", encoding="utf-8") as file:
+            return cls(file.readlines())
+
+    def __init__(self, lines: Iterable[str] = ()):
+        lines = list(lines)
+        leaves = [_Leaf(lines[i : i + LEAF_SIZE]) for i in range(0, len(lines), LEAF_SIZE)]
+        self.root = _build(leaves, 0, len(leaves))
+
+    def _normalize_index(self, index: int) -> int:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("buffer index out of range")
+        return index
+
+    def __len__(self) -> int:
+        return self.root.size if self.root is not None else 0
+
+    def __getitem__(self, index: int | slice) -> str | list[str]:
+        if isinstance(index, slice):
+            return list(itertools.islice(self, *index.indices(len(self))))
+        leaf, offset = _locate(self.root, self._normalize_index(index))
+        leaf.used = next(_clock)
+        return leaf.piece[offset]
+
+    def __setitem__(self, index: int, value: str) -> None:
+        index = self._normalize_index(index)
+        leaf, offset = _locate(self.root, index)
+        if isinstance(leaf.piece, _Span):
+            self.root = _assign(self.root, index, value)
+        else:
+            leaf.piece[offset] = value
+            leaf.used = next(_clock)
+
+    def __delitem__(self, index: int) -> None:
+        self.root = _delete(self.root, self._normalize_index(index))
+
+    def __iter__(self) -> Iterator[str]:
+        for leaf in _leaves(self.root):
+            yield from leaf.piece
+
+    def segments(self) -> Iterator[list[str] | _Span]:
+        for leaf in _leaves(self.root):
+            yield leaf.piece
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, collections.abc.Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({list(self)!r})"
+
+    def insert(self, index: int, value: str) -> None:
+        size = len(self)
+        if index < 0:
+            index = max(index + size, 0)
+        index = min(index, size)
+
+        if self.root is None:
+            self.root = _Leaf([value])
+        else:
+            self.root = _insert(self.root, index, value)
+
+    def clear(self) -> None:
+        self.root = None
+
+    def copy(self) -> "RopeBuffer":
+        return RopeBuffer(self)
+
+    @staticmethod
+    def _wrap(root) -> "RopeBuffer":
+        lines = RopeBuffer()
+        lines.root = root
+        return lines
+
+    def copy_range(self, start: int, stop: int) -> "RopeBuffer":
+        _, rest = _split(self.root, start)
+        middle, _ = _split(rest, stop - start)
+        # Leaves are edited in place, so lists are copied, while spans of the source are shared.
+        return RopeBuffer._wrap(
+            _from_pieces(
+                [leaf.piece if isinstance(leaf.piece, _Span) else list(leaf.piece) for leaf in _leaves(middle)]
+            )
+        )
+
+    def cut(self, start: int, stop: int) -> "RopeBuffer":
+        """
+        Remove the lines from start to stop in O(log n) and return them as a rope, without copying them.
+        """
+
+        left, rest = _split(self.root, start)
+        middle, right = _split(rest, stop - start)
+        self.root = _join(left, right)
+        return RopeBuffer._wrap(middle)
+
+    def paste(self, index: int, lines: Iterable[str]) -> None:
+        """
+        Insert the lines before the index. The tree of a rope is joined in O(log n) and belongs to this buffer then.
+        """
+
+        root = lines.root if isinstance(lines, RopeBuffer) else RopeBuffer(lines).root
+        left, right = _split(self.root, index)
+        self.root = _join(_join(left, root), right)
+
+    def spill(self, store, keep: int = 0) -> int:
+        """
+        Write the least recently used lists of lines to the spill store until the others take at most keep bytes, and
+        return the bytes they take. Spilled lists become spans of the store, paged in when their lines are read.
+        """
+
+        leaves = [leaf for leaf in _leaves(self.root) if not isinstance(leaf.piece, _Span)]
+        leaves.sort(key=lambda leaf: leaf.used, reverse=True)
+        resident = 0
+        for leaf in leaves:
+            if resident + (size := lines_size(leaf.piece)) <= keep:
+                resident += size
+            else:
+                leaf.piece = self._spilled(store, leaf.piece)
+        return resident
+
+    def _spilled(self, store, lines: list[str]) -> _Span:
+        return _Span(store, *store.append_lines(lines))
@@ -0,0 +1,239 @@
+from typing import Any, Callable, NamedTuple
+
+from .document import Document
+from .exceptions import *
+
+# Marks the quoted text argument of a signature. The quoted text is always the last argument of a command.
+TEXT = object()
+# Marks two quoted texts separated by a space, such as "old" "new". The text is split at the first '" "', and only
+# the second text may be empty.
+TEXT_PAIR = object()
+
+
+def number(token: str) -> int:
+    if not token.isdecimal():
+        raise ValueError(f"Not a number: {token}")
+    return int(token)
+
+
+class LineRange(NamedTuple):
+    first: int
+    last: int
+
+    def __str__(self) -> str:
+        return f"{self.first}-{self.last}"
+
+
+def lines(token: str) -> int | LineRange:
+    """
+    Convert a line number, or a range of lines such as 10-20.
+    """
+
+    first, separator, last = token.partition("-")
+    if not separator:
+        return number(token)
+    return LineRange(number(first), number(last))
+
+
+def _range(line_numbers: int | LineRange) -> LineRange:
+    return line_numbers if isinstance(line_numbers, LineRange) else LineRange(line_numbers, line_numbers)
+
+
+def _call(convert: Callable[[str], Any], word: str) -> Any:
+    return convert(word)
+
+
+class Command(NamedTuple):
+    name: str
+    handler: Callable[..., Any]
+    # Converters of the words after the command name and the text marker, if any, keyed by the number of words and
+    # whether text follows them.
+    signatures: dict[tuple[int, bool], tuple[tuple[Callable[[str], Any], ...], object | None]]
+
+
+class ParsedCommand:
+    """
+    Command with converted arguments, ready to be executed on a document, queued or batched.
+    """
+
+    __slots__ = ("command", "args")
+
+    def __init__(self, command: Command, args: tuple):
+        self.command = command
+        self.args = args
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ParsedCommand):
+            return NotImplemented
+        return self.command.name == other.command.name and self.args == other.args
+
+    def __repr__(self) -> str:
+        return f"ParsedCommand({self!s})"
+
+    @property
+    def name(self) -> str:
+        return self.command.name
+
+    def execute(self, document: Document) -> Any:
+        return self.command.handler(document, *self.args)
+
+    def __str__(self) -> str:
+        return " ".join((self.name, *(f'"{arg}"' if isinstance(arg, str) else f"{arg}" for arg in self.args)))
+
+
+COMMANDS: dict[str, Command] = {}
+
+
+def command(name: str, *signatures: tuple) -> Callable:
+    """
+    Register the decorated function as the handler of the command.
+    Each signature is a tuple of converters for the words after the command name, optionally ending with TEXT or
+    TEXT_PAIR.
+    A command without signatures takes no arguments.
+    """
+
+    def register(handler: Callable) -> Callable:
+        table = {}
+        for signature in signatures or ((),):
+            text = signature[-1] if signature and signature[-1] in (TEXT, TEXT_PAIR) else None
+            converters = signature[:-1] if text is not None else signature
+            table[len(converters), text is not None] = converters, text
+        COMMANDS[name] = Command(name, handler, table)
+        return handler
+
+    return register
+
+
+def tokenize(line: str) -> tuple[list[str], str | None]:
+    """
+    Split the line into single-space separated words and the trailing quoted text, if there is one.
+    """
+
+    if (quote := line.find('"')) == -1:
+        return line.split(" "), None
+    if quote == 0 or line[quote - 1] != " " or len(line) - quote < 3 or not line.endswith('"'):
+        raise UnknownCommand(line)
+    return line[: quote - 1].split(" "), line[quote + 1 : -1]
+
+
+def parse(line: str) -> ParsedCommand:
+    words, text = tokenize(line)
+    if (command := COMMANDS.get(words[0])) is None:
+        raise UnknownCommand(line)
+    if (signature := command.signatures.get((len(words) - 1, text is not None))) is None:
+        raise UnknownCommand(line)
+
+    converters, marker = signature
+    try:
+        args = tuple(map(_call, converters, words[1:])) if converters else ()
+    except ValueError:
+        raise UnknownCommand(line) from None
+    if marker is TEXT_PAIR:
+        texts = text.split('" "', 1)
+        if len(texts) != 2 or not texts[0]:
+            raise UnknownCommand(line)
+        return ParsedCommand(command, (*args, *texts))
+    return ParsedCommand(command, args if text is None else (*args, text))
+
+
+@command("insert", (TEXT,), (number, TEXT), (number, number, TEXT))
+def insert(document: Document, *args) -> None:
+    *numbers, text = args
+    document.insert_line(text, *numbers)
+
+
+@command("delete", (lines,))
+def delete(document: Document, line_numbers: int | LineRange) -> None:
+    if isinstance(line_numbers, LineRange):
+        document.delete_lines(*line_numbers)
+    else:
+        document.delete_line(line_numbers)
+
+
+@command("move", (lines, number))
+def move(document: Document, line_numbers: int | LineRange, line_number: int) -> None:
+    document.move_lines(*_range(line_numbers), line_number)
+
+
+@command("copy", (lines, number))
+def copy(document: Document, line_numbers: int | LineRange, line_number: int) -> None:
+    document.copy_lines(*_range(line_numbers), line_number)
+
+
+@command("swap", (number, number))
+def swap(document: Document, line1_number: int, line2_number: int) -> None:
+    document.swap_lines(line1_number, line2_number)
+
+
+@command("swap-range", (lines, lines))
+def swap_range(document: Document, first_lines: int | LineRange, second_lines: int | LineRange) -> None:
+    document.swap_ranges(_range(first_lines), _range(second_lines))
+
+
+@command("undo", (), (number,))
+def undo(document: Document, steps: int = 1) -> None:
+    document.undo(steps)
+
+
+@command("redo", (), (number,))
+def redo(document: Document, steps: int = 1) -> None:
+    document.redo(steps)
+
+
+def _format_matches(matches: list[tuple[int, str]]) -> str:
+    if not matches:
+        return "No matches."
+    return "\n".join(f"{line_number}: {line}".removesuffix("\n") for line_number, line in matches)
+
+
+@command("find", (TEXT,), (number, number, TEXT))
+def find(document: Document, *args) -> str:
+    *numbers, pattern = args
+    return _format_matches(document.find(pattern, False, *numbers))
+
+
+@command("find-re", (TEXT,), (number, number, TEXT))
+def find_re(document: Document, *args) -> str:
+    *numbers, pattern = args
+    return _format_matches(document.find(pattern, True, *numbers))
+
+
+@command("replace", (TEXT_PAIR,), (number, number, TEXT_PAIR))
+def replace(document: Document, *args) -> str:
+    *numbers, old, new = args
+    occurrences, lines = document.replace(old, new, False, *numbers)
+    return f"Replaced {occurrences} occurrences on {lines} lines."
+
+
+@command("replace-re", (TEXT_PAIR,), (number, number, TEXT_PAIR))
+def replace_re(document: Document, *args) -> str:
+    *numbers, old, new = args
+    occurrences, lines = document.replace(old, new, True, *numbers)
+    return f"Replaced {occurrences} occurrences on {lines} lines."
+
+
+@command("diff")
+def diff(document: Document) -> str:
+    return document.diff() or "No changes."
+
+
+@command("clear")
+def clear(document: Document) -> None:
+    document.clear()
+
+
+@command("save")
+def save(document: Document) -> Any:
+    return document.save()
+
+
+@command("close")
+def close(document: Document) -> None:
+    document.close()
+
+
+@command("stats")
+def stats(document: Document) -> str:
+    if document.stats is None:
+        return "Statistics are disabled."
+    return document.stats.report(document)
@@ -0,0 +1,251 @@
+import itertools
+import sys
+from typing import Iterator, Sequence
+
+# Number of unchanged lines shown around each change.
+CONTEXT = 3
+
+
+def _hash_lines(old: Sequence[str], new: Sequence[str]) -> tuple[list[int], list[int]]:
+    """
+    Replace every line by an integer, the same for equal lines, so that the diff compares small ints.
+    """
+
+    ids: dict[str, int] = {}
+    return [ids.setdefault(line, len(ids)) for line in old], [ids.setdefault(line, len(ids)) for line in new]
+
+
+def _middle_snake(a: list[int], a_lo: int, a_hi: int, b: list[int], b_lo: int, b_hi: int) -> tuple[int, int, int, int]:
+    """
+    Return the start and end of the snake in the middle of a shortest edit script, searching from both ends at once.
+    Only the furthest point reached on each diagonal is kept, so the search takes O(n + m) memory.
+    """
+
+    n, m = a_hi - a_lo, b_hi - b_lo
+    delta = n - m
+    odd = delta & 1
+    offset = (n + m + 1) // 2 + 1
+    forward = [0] * (2 * offset + 1)
+    backward = [0] * (2 * offset + 1)
+
+    for d in range(offset):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+            y = x - k
+            start_x, start_y = x, y
+            while x < n and y < m and a[a_lo + x] == b[b_lo + y]:
+                x += 1
+                y += 1
+            forward[offset + k] = x
+            if odd and -(d - 1) <= delta - k <= d - 1 and x + backward[offset + delta - k] >= n:
+                return start_x, start_y, x, y
+
+        for c in range(-d, d + 1, 2):
+            if c == -d or (c != d and backward[offset + c - 1] < backward[offset + c + 1]):
+                x = backward[offset + c + 1]
+            else:
+                x = backward[offset + c - 1] + 1
+            y = x - c
+            start_x, start_y = x, y
+            while x < n and y < m and a[a_hi - 1 - x] == b[b_hi - 1 - y]:
+                x += 1
+                y += 1
+            backward[offset + c] = x
+            if not odd and -d <= delta - c <= d and x + forward[offset + delta - c] >= n:
+                return n - x, m - y, n - start_x, m - start_y
+
+    raise AssertionError("the searches from both ends always meet")
+
+
+def matching_blocks(a: list[int], b: list[int]) -> list[tuple[int, int, int]]:
+    """
+    Return the (i, j, size) blocks of a longest common subsequence of a and b, sorted, by Myers' linear space diff.
+    Takes O((n + m) * d) time for d differences, so it's fast for small edits of big files.
+    """
+
+    blocks = []
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        a_lo, a_hi, b_lo, b_hi = stack.pop()
+        # Common lines at both ends are matched without a search, which also leaves at least one edit in between.
+        prefix = 0
+        while a_lo + prefix < a_hi and b_lo + prefix < b_hi and a[a_lo + prefix] == b[b_lo + prefix]:
+            prefix += 1
+        if prefix:
+            blocks.append((a_lo, b_lo, prefix))
+            a_lo += prefix
+            b_lo += prefix
+        suffix = 0
+        while a_lo < a_hi - suffix and b_lo < b_hi - suffix and a[a_hi - 1 - suffix] == b[b_hi - 1 - suffix]:
+            suffix += 1
+        if suffix:
+            blocks.append((a_hi - suffix, b_hi - suffix, suffix))
+            a_hi -= suffix
+            b_hi -= suffix
+        if a_lo == a_hi or b_lo == b_hi:
+            continue
+
+        x, y, u, v = _middle_snake(a, a_lo, a_hi, b, b_lo, b_hi)
+        if u > x:
+            blocks.append((a_lo + x, b_lo + y, u - x))
+        stack.append((a_lo, a_lo + x, b_lo, b_lo + y))
+        stack.append((a_lo + u, a_hi, b_lo + v, b_hi))
+
+    blocks.sort()
+    return blocks
+
+
+def _format_range(start: int, stop: int) -> str:
+    # Same as in diff -u and difflib: an empty range is given by the line before it.
+    length = stop - start
+    if length == 1:
+        return f"{start + 1}"
+    return f"{start + 1 if length else start},{length}"
+
+
+def _format_line(prefix: str, line: str) -> Iterator[str]:
+    if line.endswith("\n"):
+        yield f"{prefix}{line[:-1]}"
+    else:
+        yield f"{prefix}{line}"
+        yield "\\ No newline at end of file"
+
+
+def unified_hunks(old: Sequence[str], new: Sequence[str], old_start: int = 0, new_start: int = 0) -> list[str]:
+    """
+    Return the hunks of a unified diff from the old lines to the new ones, as lines without line breaks.
+    The lines may be windows of longer files, starting at the given indexes, which the hunk headers count from.
+    """
+
+    a, b = _hash_lines(old, new)
+    opcodes = []
+    i = j = 0
+    for block_i, block_j, size in [*matching_blocks(a, b), (len(a), len(b), 0)]:
+        if i < block_i or j < block_j:
+            opcodes.append((i, block_i, j, block_j))
+        i, j = block_i + size, block_j + size
+    if not opcodes:
+        return []
+
+    # Changes separated by at most twice the context are shown in one hunk.
+    hunks = [[opcodes[0]]]
+    for opcode in opcodes[1:]:
+        if opcode[0] - hunks[-1][-1][1] <= 2 * CONTEXT:
+            hunks[-1].append(opcode)
+        else:
+            hunks.append([opcode])
+
+    lines = []
+    for hunk in hunks:
+        first_i, first_j = hunk[0][0], hunk[0][2]
+        context = min(CONTEXT, first_i, first_j)
+        i_lo, j_lo = first_i - context, first_j - context
+        context = min(CONTEXT, len(a) - hunk[-1][1], len(b) - hunk[-1][3])
+        i_hi, j_hi = hunk[-1][1] + context, hunk[-1][3] + context
+        lines.append(
+            f"@@ -{_format_range(old_start + i_lo, old_start + i_hi)} "
+            f"+{_format_range(new_start + j_lo, new_start + j_hi)} @@"
+        )
+        i = i_lo
+        for change_i, change_i_hi, change_j, change_j_hi in hunk:
+            for line in old[i:change_i]:
+                lines.extend(_format_line(" ", line))
+            for line in old[change_i:change_i_hi]:
+                lines.extend(_format_line("-", line))
+            for line in new[change_j:change_j_hi]:
+                lines.extend(_format_line("+", line))
+            i = change_i_hi
+        for line in old[i:i_hi]:
+            lines.extend(_format_line(" ", line))
+    return lines
+
+
+class LineMap:
+    """
+    Runs of lines of a buffer that no edit has touched since its file was opened or saved, with the number of the
+    line each run starts at in the file, so that a diff only has to compare the lines around the other ones.
+    The buffer is a list of (file_start, length) runs; edited, inserted and moved lines are in runs whose file_start is
+    None. The length of the last run may be larger than the buffer, which is fine since only its start is needed.
+    An edit costs O(number of runs), which is bounded by max_runs: past it, the shortest runs are forgotten.
+    """
+
+    max_runs: int = 256
+
+    def __init__(self, unmodified: bool = True):
+        self.runs: list[tuple[int | None, int]] = [(0, sys.maxsize)] if unmodified else [(None, sys.maxsize)]
+
+    def changed(self, start: int, stop: int, count: int) -> None:
+        """
+        Record that the lines from start to stop were replaced by count other lines.
+        """
+
+        before: list[tuple[int | None, int]] = []
+        after: list[tuple[int | None, int]] = []
+        position = 0
+        for file_start, length in self.runs:
+            end = position + length
+            if position < start:
+                before.append((file_start, min(end, start) - position))
+            if end > stop:
+                skipped = max(stop - position, 0)
+                after.append((file_start if file_start is None else file_start + skipped, length - skipped))
+            position = end
+
+        runs: list[tuple[int | None, int]] = []
+        for file_start, length in (*before, (None, count), *after):
+            if not length:
+                continue
+            if runs and file_start is None and runs[-1][0] is None:
+                runs[-1] = None, runs[-1][1] + length
+            else:
+                runs.append((file_start, length))
+        self.runs = runs
+        if len(runs) > self.max_runs:
+            self._forget_short_runs()
+
+    def _forget_short_runs(self) -> None:
+        shortest = sorted(length for file_start, length in self.runs if file_start is not None)
+        threshold = shortest[len(shortest) // 2]
+        runs = self.runs
+        self.runs = [(None, 0)]
+        for file_start, length in runs:
+            if file_start is not None and length <= threshold:
+                file_start = None
+            if file_start is None and self.runs[-1][0] is None:
+                self.runs[-1] = None, self.runs[-1][1] + length
+            else:
+                self.runs.append((file_start, length))
+
+    def windows(self, file_size: int, buffer_size: int) -> list[tuple[int, int, int, int]]:
+        """
+        Return the (file_start, file_stop, buffer_start, buffer_stop) windows of lines that may differ, with their
+        context. The unmodified runs between windows are longer than two contexts, so no hunk spans two windows.
+        """
+
+        # The unmodified runs as (file_start, buffer_start, length), in order in both, between the ends of both.
+        anchors = [(0, 0, 0)]
+        position = 0
+        for file_start, length in self.runs:
+            if (length := min(length, buffer_size - position)) <= 0:
+                break
+            if file_start is not None and file_start >= anchors[-1][0] + anchors[-1][2]:
+                if (file_length := min(length, file_size - file_start)) > 0:
+                    anchors.append((file_start, position, file_length))
+            position += length
+        anchors.append((file_size, buffer_size, 0))
+
+        windows: list[tuple[int, int, int, int]] = []
+        for (file_a, buffer_a, length_a), (file_b, buffer_b, length_b) in itertools.pairwise(anchors):
+            file_end, buffer_end = file_a + length_a, buffer_a + length_a
+            if file_b == file_end and buffer_b == buffer_end:
+                continue
+            before, after = min(CONTEXT, length_a), min(CONTEXT, length_b)
+            window = file_end - before, file_b + after, buffer_end - before, buffer_b + after
+            if windows and window[0] <= windows[-1][1]:
+                windows[-1] = windows[-1][0], window[1], windows[-1][2], window[3]
+            else:
+                windows.append(window)
+        return windows
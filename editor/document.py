@@ -1,22 +1,88 @@
 import sys
+import hashlib
+import itertools
 import pathlib
+import re
+import time
+from typing import Iterable, MutableSequence
 
+from .batch import Batch
+from .diff import LineMap, unified_hunks
+from .buffers import ENGINES, MappedFile
+from .journal import Journal, op_size
+from .loader import BackgroundLoader
+from .long_line import LONG_LINE_THRESHOLD, GapLine
+from .search import SearchIndex
+from .spill import SpillStore, lines_size
+from .stats import Stats
+from .storage import SaveReport, write_atomically
+from .wal import WriteAheadLog
 from .exceptions import *
 
 
 class Document:
-    def __init__(self):
-        self.path: pathlib.Path = Document.extract_path()
-        self.current_content: list[str] = self.get_lines()
-        self.previous_content: list[str] = self.current_content.copy()
+    default_engine: str = "list"
+
+    def __init__(self, path: str | pathlib.Path | None = None, engine: str | None = None, background: bool = False):
+        """
+        With background set, an engine that decodes the whole file on open starts empty instead, and a background
+        loader reads the file into it while the document is already used: see load_lines().
+        """
+
+        self.engine: str = engine if engine is not None else Document.default_engine
+        if self.engine not in ENGINES:
+            raise UnknownBufferEngine(self.engine)
+
+        self.path: pathlib.Path = Document.extract_path() if path is None else Document.check_path(pathlib.Path(path))
+        # The long line being edited at a column, whose buffer line is only updated when the buffer is read.
+        self._gap_line: GapLine | None = None
+        self._gap_index: int = -1
+        self._gap_dirty: bool = False
+        # Set while the file is still being read into the buffer, with the lines appended meanwhile and the number of
+        # lines of the file already in the buffer.
+        self.loader: BackgroundLoader | None = None
+        self.queued_appends: list[str] = []
+        self._loaded_lines: int = 0
+        if background and ENGINES[self.engine].decodes_on_open:
+            self.loader = BackgroundLoader(self.path)
+            self.current_content = ENGINES[self.engine]()
+        else:
+            self.current_content = self.get_lines()
+        self.journal: Journal = Journal()
+        self.search_index: SearchIndex = SearchIndex()
+        # Estimated bytes the edits added to the buffer, negative if they removed more than they added.
+        self.edited_size: int = 0
+
+        # Every edit moves the document to a new state; undo and redo move it back to a state it had before.
+        self.states: itertools.count = itertools.count(1)
+        self.state: int = 0
+        self.saved_state: int = 0
+        self.saved_stat: tuple[int, int] = self.stat_file()
+        # Lines that no edit has touched since the file was opened or saved, valid while the file has the given stat.
+        self.line_map: LineMap = LineMap()
+        self.line_map_stat: tuple[int, int] = self.saved_stat
+
+        # Set by the editor to collect backup and I/O timings of commands.
+        self.stats: Stats | None = None
+        # Set by enable_wal() to log every edit until the document is saved.
+        self.wal: WriteAheadLog | None = None
+        # Set by enable_spill() to keep the lines and the undo history held in memory within the budget.
+        self.memory_budget: int | None = None
+        self.spill_store: SpillStore | None = None
+        # Bytes of decoded lines the buffer held, and the edited size, when the buffer was last spilled.
+        self._resident_size: int = 0
+        self._resident_edited_size: int = 0
+        self._spill_threshold: int = 0
 
     @staticmethod
     def extract_path() -> pathlib.Path:
         if len(sys.argv) != 2:
             raise WrongNumberOfCommandLineArgs(2, len(sys.argv))
         else:
-            path = pathlib.Path(sys.argv[1])
+            return Document.check_path(pathlib.Path(sys.argv[1]))
 
+    @staticmethod
+    def check_path(path: pathlib.Path) -> pathlib.Path:
         if not path.exists():
             raise PathDoesNotExist(path)
         if not path.is_file():
@@ -24,101 +90,604 @@ class Document:
         else:
             return path
 
-    def get_lines(self) -> list[str]:
-        with self.path.open("r", encoding="utf-8") as file:
-            return file.readlines()
+    def get_lines(self) -> MutableSequence[str]:
+        return ENGINES[self.engine].open(self.path)
+
+    def stat_file(self) -> tuple[int, int]:
+        stat = self.path.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    @property
+    def current_content(self) -> MutableSequence[str]:
+        # Outside of the document the buffer holds the whole file, so the lines still loading are waited for.
+        self.load_lines()
+        return self._loaded_content
+
+    @property
+    def _loaded_content(self) -> MutableSequence[str]:
+        if self._gap_dirty:
+            self._flush_gap()
+        return self._content
+
+    @current_content.setter
+    def current_content(self, content: MutableSequence[str]) -> None:
+        self._gap_line = None
+        self._gap_index = -1
+        self._gap_dirty = False
+        self._content = content
+
+    def _flush_gap(self) -> None:
+        line = str(self._gap_line)
+        self._content[self._gap_index] = line
+        if self.search_index.built:
+            self.search_index.line_set(self._gap_index, line)
+        # Starting again from the joined line keeps the number of pieces to join next time small.
+        self._gap_line = GapLine(line)
+        self._gap_dirty = False
+
+    def _gap_at(self, index: int) -> GapLine:
+        if index != self._gap_index:
+            self._close_gap()
+            self._gap_line = GapLine(self._content[index])
+            self._gap_index = index
+        self._gap_dirty = True
+        return self._gap_line
+
+    def _close_gap(self) -> None:
+        if self._gap_dirty:
+            self._flush_gap()
+        self._gap_line = None
+        self._gap_index = -1
+
+    def _line_length(self, index: int) -> int:
+        return len(self._gap_line) if index == self._gap_index else len(self._content[index])
+
+    def _apply_op(self, op: tuple) -> tuple:
+        match op:
+            case ("splice", index, position, text):
+                self._gap_at(index).insert(position, text)
+                return "cut", index, position, len(text)
+            case ("cut", index, position, length):
+                return "splice", index, position, self._gap_at(index).cut(position, length)
+        # Other operations may shift the line being edited, so it's written back to the buffer first.
+        if self._gap_line is not None:
+            self._close_gap()
+        match op:
+            case ("set", index, line):
+                previous_line = self._content[index]
+                self._content[index] = line
+                if self.search_index.built:
+                    self.search_index.line_set(index, line)
+                return "set", index, previous_line
+            case ("insert", index, line):
+                self._content.insert(index, line)
+                if self.search_index.built:
+                    self.search_index.line_inserted(index, line)
+                return "delete", index
+            case ("delete", index):
+                previous_line = self._content[index]
+                del self._content[index]
+                if self.search_index.built:
+                    self.search_index.line_deleted(index)
+                return "insert", index, previous_line
+            case ("delete_range", start, stop):
+                lines = self._content.cut(start, stop)
+                if self.search_index.built:
+                    self.search_index.lines_deleted(start, stop)
+                return "insert_range", start, lines
+            case ("insert_range", index, lines):
+                # The lines are pasted without being copied, so they must not be shared with the journal or a buffer.
+                self._content.paste(index, lines)
+                if self.search_index.built:
+                    self.search_index.lines_inserted(index, len(lines))
+                return "delete_range", index, index + len(lines)
+            case ("move_range", start, stop, index):
+                # The index is where the lines start in the content without them.
+                self._content.paste(index, self._content.cut(start, stop))
+                if self.search_index.built:
+                    self.search_index.lines_moved(start, stop, index)
+                return "move_range", index, index + stop - start, start
+            case ("replace", content):
+                previous_content = self._content
+                self.current_content = content
+                self.search_index.clear()
+                return "replace", previous_content
+            case _:
+                raise ValueError(f"Unknown edit operation: {op!r}")
+
+    def _apply_ops(self, ops: list[tuple]) -> list[tuple]:
+        inverse_ops = []
+        for op in ops:
+            self._track_unmodified(op)
+            inverse_op = self._apply_op(op)
+            # An operation puts the values it carries into the buffer and takes out those its inverse carries.
+            self.edited_size += op_size(op) - op_size(inverse_op)
+            inverse_ops.append(inverse_op)
+        inverse_ops.reverse()
+        if self.wal is not None:
+            self._log(ops)
+        return inverse_ops
+
+    def _track_unmodified(self, op: tuple) -> None:
+        match op:
+            case ("splice" | "cut" | "set", index, *_):
+                self.line_map.changed(index, index + 1, 1)
+            case ("insert", index, _):
+                self.line_map.changed(index, index, 1)
+            case ("delete", index):
+                self.line_map.changed(index, index + 1, 0)
+            case ("delete_range", start, stop):
+                self.line_map.changed(start, stop, 0)
+            case ("insert_range", index, lines):
+                self.line_map.changed(index, index, len(lines))
+            case ("move_range", start, stop, index):
+                self.line_map.changed(start, stop, 0)
+                self.line_map.changed(index, index, stop - start)
+            case ("replace", content):
+                self.line_map.changed(0, sys.maxsize, len(content))
 
-    def back_up(self) -> None:
-        self.previous_content = self.current_content.copy()
+    def _log(self, ops: list[tuple]) -> None:
+        started = time.perf_counter_ns()
+        # Whole buffers aren't logged: the buffer is checkpointed instead, which also bounds the time of a replay.
+        if self.wal.records >= self.wal.checkpoint_records or any(op[0] == "replace" for op in ops):
+            self.wal.checkpoint(self._loaded_content.segments())
+        else:
+            self.wal.append([("insert_range", op[1], list(op[2])) if op[0] == "insert_range" else op for op in ops])
+        if self.stats is not None:
+            self.stats.add("io", time.perf_counter_ns() - started)
+
+    def enable_wal(self, sync_interval: float = 1.0) -> int:
+        """
+        Replay the edits logged by a session that was killed before it saved or closed the file, then log every edit
+        to a write-ahead log next to the file. Returns the number of replayed records. Recovered edits are unsaved,
+        and the undo history of the killed session isn't recovered.
+        """
+
+        # The logged edits apply to the whole file.
+        self.load_lines()
+        self.wal = WriteAheadLog(self.path, sync_interval)
+        checkpoint, groups = self.wal.recover()
+        if checkpoint is not None:
+            self.current_content = ENGINES[self.engine].open(checkpoint)
+        # Replayed operations aren't journaled, so unlike _apply_op they don't need to read the lines they overwrite.
+        content = self.current_content
+        for ops in groups:
+            for op in ops:
+                match op:
+                    case ("set", index, line) if self._gap_line is None:
+                        content[index] = line
+                    case ("insert", index, line) if self._gap_line is None:
+                        content.insert(index, line)
+                    case ("delete", index) if self._gap_line is None:
+                        del content[index]
+                    case _:
+                        self._apply_op(op)
+        if checkpoint is not None or groups:
+            self.state = next(self.states)
+            self.line_map = LineMap(unmodified=False)
+        return len(groups)
+
+    def enable_spill(self, memory_budget: int, directory: str | pathlib.Path | None = None) -> None:
+        """
+        Keep the estimated bytes of the lines held in memory by the buffer and the undo history within the budget:
+        past it, the oldest undo entries and then the least recently used lines of the buffer are spilled to a
+        temporary file in the directory, and paged in when they are accessed again. The list engine only spills the
+        undo history, the others spill the lines of the buffer too.
+        """
+
+        self.memory_budget = memory_budget
+        if self.spill_store is None:
+            self.spill_store = SpillStore(directory)
+        self._spill()
+
+    @property
+    def memory_size(self) -> int:
+        """
+        Estimated bytes of the lines held in memory by the buffer and the undo history, counting the lines of the
+        buffer as they were when it was last spilled, plus the size the edits added since.
+        """
+
+        buffer_size = self._resident_size + self.edited_size - self._resident_edited_size
+        return max(0, buffer_size) + self.journal.size - self.journal.spilled_size
+
+    def _spill(self) -> None:
+        started = time.perf_counter_ns()
+        # Spilling down to half of the budget leaves room for the next edits before the next spill.
+        keep = self.memory_budget // 2
+        self.journal.spill(self.spill_store, keep // 2)
+        content = self._loaded_content
+        if hasattr(content, "spill"):
+            self._resident_size = content.spill(self.spill_store, keep - self.journal.size + self.journal.spilled_size)
+            self._resident_edited_size = self.edited_size
+        # What can't be spilled, such as the newest undo entries, doesn't make every edit try again.
+        self._spill_threshold = max(self.memory_budget, self.memory_size + keep)
+        elapsed = time.perf_counter_ns() - started
+        self.spill_store.spills.record(elapsed)
+        if self.stats is not None:
+            self.stats.add("io", elapsed)
+
+    def _check_budget(self) -> None:
+        if self.spill_store is not None and self.memory_size > self._spill_threshold:
+            self._spill()
+
+    def _edit(self, *ops: tuple) -> None:
+        inverse_ops = self._apply_ops(list(ops))
+        if self.stats is None:
+            self.journal.record(inverse_ops, self.state)
+        else:
+            started = time.perf_counter_ns()
+            self.journal.record(inverse_ops, self.state)
+            self.stats.add("backup", time.perf_counter_ns() - started)
+        self.state = next(self.states)
+        self._check_budget()
 
     @property
     def number_of_lines(self) -> int:
-        return len(self.current_content)
+        self.load_lines()
+        return len(self._content)
 
     @property
     def is_empty(self) -> bool:
-        return self.current_content == []
+        return self.number_of_lines == 0
+
+    def load_lines(self, line_number: int | None = None) -> None:
+        """
+        Put the lines read by the background loader so far into the buffer, waiting until it has the line with the
+        number, or the last line of the file if it's None. Lines of the file are added after the lines loaded before
+        them, so the edits already made to those keep their indexes.
+        Lines appended while the file was loading are queued, since they go after its last line. The first other edit
+        or command waits for the whole file and applies them before it runs, so that they are undone in order.
+        """
+
+        if self.loader is None:
+            return
+        if self.queued_appends:
+            line_number = None
+
+        started = time.perf_counter_ns()
+        needed = self._loaded_lines
+        while True:
+            for lines in self.loader.take(needed):
+                index = len(self._content)
+                self._content.paste(index, lines)
+                self._loaded_lines += len(lines)
+                if self.search_index.built:
+                    self.search_index.lines_inserted(index, len(lines))
+                if self.spill_store is not None and hasattr(self._content, "spill"):
+                    self._resident_size += lines_size(lines)
+            if self.loader.finished:
+                self.loader = None
+                break
+            if line_number is not None and line_number <= len(self._content):
+                break
+            needed = None if line_number is None else self._loaded_lines + line_number - len(self._content)
+        if self.stats is not None:
+            self.stats.add("io", time.perf_counter_ns() - started)
+        self._check_budget()
+
+        queued_appends, self.queued_appends = self.queued_appends, []
+        for text in queued_appends:
+            self.insert_line(text)
+
+    @staticmethod
+    def _last_line_number(edits: list[tuple]) -> int | None:
+        """
+        Return the number of the last line the edits of a batch refer to, or None if they append lines.
+        """
+
+        last_line_number = 0
+        for edit in edits:
+            match edit:
+                case ("insert_line", _) | ("insert_line", _, None, *_):
+                    return None
+                case ("insert_line", _, int(line_number), *_) | ("delete_line", int(line_number)):
+                    last_line_number = max(last_line_number, line_number)
+                case ("swap_lines", int(line1_number), int(line2_number)):
+                    last_line_number = max(last_line_number, line1_number, line2_number)
+        return last_line_number
+
+    def apply_batch(self, edits: Iterable[tuple]) -> None:
+        """
+        Validate and apply edits such as ("insert_line", text, line_number, column_number), ("delete_line", number)
+        or ("swap_lines", number, number) as one undoable change.
+        Line numbers refer to the lines the document had before the batch. If any edit is invalid, nothing is applied.
+        """
+
+        edits = list(edits)
+        self.load_lines(self._last_line_number(edits))
+        batch = Batch(self._loaded_content)
+        for edit in edits:
+            match edit:
+                case ("insert_line", str(text), *position) if len(position) <= 2:
+                    batch.insert_line(text, *position)
+                case ("delete_line", int(line_number)):
+                    batch.delete_line(line_number)
+                case ("swap_lines", int(line1_number), int(line2_number)):
+                    batch.swap_lines(line1_number, line2_number)
+                case _:
+                    raise ValueError(f"Unknown edit: {edit!r}")
+
+        # A buffer replaced while loading would miss the lines loaded into its replacement once the edit is undone.
+        rebuild = ENGINES[self.engine] if isinstance(self._content, list) and self.loader is None else None
+        if ops := batch.ops(rebuild):
+            self._edit(*ops)
 
     def insert_line(self, text: str, line_number: int | None = None, column_number: int | None = None) -> None:
-        if line_number is not None and column_number is not None:
-            if self.is_empty and line_number == 1 and column_number == 1:
-                self.back_up()
-                self.current_content.append(f"{text}\n")
-            elif line_number == 0:
-                raise ZeroLineNumber
-            elif line_number > self.number_of_lines:
-                raise TooLargeLineNumber(line_number)
-            elif column_number == 0:
-                raise ZeroColumnNumber
-            elif column_number > len(self.current_content[line_number - 1]):
-                raise TooLargeColumnNumber(column_number)
-            else:
-                self.back_up()
-                line_content = self.current_content[line_number - 1]
-                self.current_content[line_number - 1] = "".join(
-                    (line_content[: column_number - 1], text, line_content[column_number - 1 :])
-                )
-        elif line_number is not None:
-            if self.is_empty and line_number == 1:
-                self.back_up()
-                self.current_content.append(f"{text}\n")
-            elif line_number == 0:
-                raise ZeroLineNumber
-            elif line_number > self.number_of_lines:
-                raise TooLargeLineNumber(line_number)
-            else:
-                self.back_up()
-                self.current_content[line_number - 1] = self.current_content[line_number - 1].removesuffix("\n")
-                self.current_content[line_number - 1] += f"{text}\n"
-        else:
-            self.back_up()
-            if not self.is_empty and not self.current_content[-1].endswith("\n"):
-                self.current_content[-1] += "\n"
-            self.current_content.append(text)
+        if line_number is None and self.loader is not None:
+            self.queued_appends.append(text)
+            return
+        self.load_lines(line_number)
+        if line_number is not None and column_number and 0 < line_number <= len(self._content):
+            index = line_number - 1
+            # A column insert into a long line is applied to its gap buffer, and journaled and logged as the
+            # inserted text only, instead of copying the whole line every time.
+            if (length := self._line_length(index)) >= LONG_LINE_THRESHOLD:
+                if column_number > length:
+                    raise TooLargeColumnNumber(column_number)
+                self._edit(("splice", index, column_number - 1, text))
+                return
+        self.apply_batch((("insert_line", text, line_number, column_number),))
 
     def delete_line(self, line_number: int) -> None:
-        if line_number == 0:
-            raise ZeroLineNumber
-        elif line_number > self.number_of_lines:
-            raise TooLargeLineNumber(line_number)
-        else:
-            self.back_up()
-            del self.current_content[line_number - 1]
+        self.apply_batch((("delete_line", line_number),))
 
     def swap_lines(self, line1_number: int, line2_number: int) -> None:
-        if line1_number == 0 or line2_number == 0:
+        self.apply_batch((("swap_lines", line1_number, line2_number),))
+
+    def _block_ops(self, start: int, stop: int, line_number: int) -> list[tuple]:
+        """
+        Return the operation that ends the last line with a line break if it's in the lines from start to stop, or if
+        lines are put after it, so that it isn't joined with the line that follows it.
+        """
+
+        last_index = len(self._content) - 1
+        if start <= last_index < stop or line_number == last_index + 1:
+            if not (line := self._loaded_content[last_index]).endswith("\n"):
+                return [("set", last_index, f"{line}\n")]
+        return []
+
+    def _check_destination(self, line_number: int) -> None:
+        self.load_lines(line_number)
+        if line_number > len(self._content):
+            raise TooLargeLineNumber(line_number)
+
+    def delete_lines(self, first_line_number: int, last_line_number: int) -> None:
+        start, stop = self._line_range(first_line_number, last_line_number)
+        self._edit(("delete_range", start, stop))
+
+    def move_lines(self, first_line_number: int, last_line_number: int, line_number: int) -> None:
+        """
+        Move a range of lines after the line with the number, or to the top if it's 0, as one bulk operation.
+        """
+
+        start, stop = self._line_range(first_line_number, last_line_number)
+        self._check_destination(line_number)
+        if start < line_number < stop:
+            raise LinesMovedIntoThemselves(first_line_number, last_line_number, line_number)
+        if line_number in (start, stop):
+            return
+        index = line_number if line_number < start else line_number - (stop - start)
+        self._edit(*self._block_ops(start, stop, line_number), ("move_range", start, stop, index))
+
+    def copy_lines(self, first_line_number: int, last_line_number: int, line_number: int) -> None:
+        """
+        Copy a range of lines after the line with the number, or to the top if it's 0, as one bulk operation.
+        """
+
+        start, stop = self._line_range(first_line_number, last_line_number)
+        self._check_destination(line_number)
+        # Reading the current content writes back the long line being edited, so its last edits are copied too.
+        lines = self._loaded_content.copy_range(start, stop)
+        if not (last_line := lines[-1]).endswith("\n"):
+            lines[-1] = f"{last_line}\n"
+        self._edit(*self._block_ops(line_number, line_number, line_number), ("insert_range", line_number, lines))
+
+    def swap_ranges(self, first_range: tuple[int, int], second_range: tuple[int, int]) -> None:
+        """
+        Swap two ranges of lines, given as pairs of line numbers, as one bulk operation.
+        """
+
+        (start1, stop1), (start2, stop2) = sorted((self._line_range(*first_range), self._line_range(*second_range)))
+        if start2 < stop1:
+            raise LineRangesOverlap(first_range, second_range)
+        # The second range is moved before the first one, then the first range after the lines between them.
+        moved = start1 + stop2 - start2
+        self._edit(
+            *self._block_ops(start2, stop2, 0),
+            ("move_range", start2, stop2, start1),
+            ("move_range", moved, moved + stop1 - start1, moved + start2 - stop1),
+        )
+
+    def _line_range(self, first_line_number: int | None, last_line_number: int | None) -> tuple[int, int]:
+        if first_line_number is None or last_line_number is None:
+            self.load_lines()
+            return 0, len(self._content)
+        self.load_lines(last_line_number)
+        if first_line_number == 0 or last_line_number == 0:
             raise ZeroLineNumber
-        elif line1_number > self.number_of_lines:
-            raise TooLargeLineNumber(line1_number)
-        elif line2_number > self.number_of_lines:
-            raise TooLargeLineNumber(line2_number)
-        elif line1_number == line2_number:
-            raise LineSwappedWithItself
+        elif last_line_number > len(self._content):
+            raise TooLargeLineNumber(last_line_number)
+        elif first_line_number > last_line_number:
+            raise WrongLineRange(first_line_number, last_line_number)
         else:
-            self.back_up()
+            return first_line_number - 1, last_line_number
 
-            if not self.current_content[line1_number - 1].endswith("\n"):
-                self.current_content[line1_number - 1] += "\n"
-            if not self.current_content[line2_number - 1].endswith("\n"):
-                self.current_content[line2_number - 1] += "\n"
+    def _matching_indexes(
+        self, pattern: str, regex: bool, first_line_number: int | None, last_line_number: int | None
+    ) -> list[int]:
+        start, stop = self._line_range(first_line_number, last_line_number)
+        return self.search_index.lookup(self._loaded_content, pattern, regex, start, stop)
 
-            self.current_content[line1_number - 1], self.current_content[line2_number - 1] = (
-                self.current_content[line2_number - 1],
-                self.current_content[line1_number - 1],
-            )
+    def find(
+        self,
+        pattern: str,
+        regex: bool = False,
+        first_line_number: int | None = None,
+        last_line_number: int | None = None,
+    ) -> list[tuple[int, str]]:
+        """
+        Return the numbers and contents of the lines containing the pattern, optionally only within a range of lines.
+        """
 
-    def undo(self) -> None:
-        self.current_content = self.previous_content.copy()
+        return [
+            (index + 1, self._loaded_content[index])
+            for index in self._matching_indexes(pattern, regex, first_line_number, last_line_number)
+        ]
+
+    def replace(
+        self,
+        old: str,
+        new: str,
+        regex: bool = False,
+        first_line_number: int | None = None,
+        last_line_number: int | None = None,
+    ) -> tuple[int, int]:
+        """
+        Replace every occurrence of the pattern, optionally only within a range of lines, as one undoable change.
+        A regex replacement may refer to groups like re.sub. Returns the numbers of occurrences and changed lines.
+        """
+
+        indexes = self._matching_indexes(old, regex, first_line_number, last_line_number)
+        compiled = re.compile(old) if regex else None
+        ops = []
+        occurrences = 0
+
+        for index in indexes:
+            line = self._loaded_content[index]
+            text = line.removesuffix("\n")
+            if compiled is None:
+                new_text, count = text.replace(old, new), text.count(old)
+            else:
+                try:
+                    new_text, count = compiled.subn(new, text)
+                except (re.error, IndexError) as e:
+                    raise InvalidPattern(new, f"{e}") from None
+            if "\n" in new_text:
+                raise InvalidPattern(new, "the replacement can't contain line breaks")
+
+            occurrences += count
+            if (new_line := f"{new_text}{line[len(text):]}") != line:
+                ops.append(("set", index, new_line))
+
+        if ops:
+            self._edit(*ops)
+        return occurrences, len(ops)
+
+    def undo(self, steps: int = 1) -> None:
+        # The edits of the buffer don't depend on the lines loaded after them, but the queued appends come first.
+        self.load_lines(0)
+        for _ in range(steps):
+            if not self.journal.can_undo:
+                break
+            ops, state = self.journal.pop_undo()
+            self.journal.push_redo(self._apply_ops(ops), self.state)
+            self.state = state
+        self._check_budget()
+
+    def redo(self, steps: int = 1) -> None:
+        self.load_lines(0)
+        for _ in range(steps):
+            if not self.journal.can_redo:
+                break
+            ops, state = self.journal.pop_redo()
+            self.journal.push_undo(self._apply_ops(ops), self.state)
+            self.state = state
+        self._check_budget()
 
     def clear(self) -> None:
-        self.back_up()
-        self.current_content.clear()
+        # An empty range of the buffer keeps what the engine detected on open, such as the line break of the file.
+        self._edit(("replace", self.current_content.copy_range(0, 0)))
 
-    def save(self) -> None:
-        with self.path.open("w", encoding="utf-8") as file:
-            file.writelines(self.current_content)
+    def save(self) -> SaveReport:
+        started = time.perf_counter_ns()
+        report = write_atomically(self.path, self.current_content.segments())
 
-    def close(self) -> None:
+        # File-backed buffers are reopened, so that every line is backed by the new file again.
+        if self.current_content.file_backed:
+            self.current_content = self.get_lines()
+            self._resident_size = 0
+            self._resident_edited_size = self.edited_size
+
+        self.saved_state = self.state
+        self.saved_stat = self.stat_file()
+        self.line_map = LineMap()
+        self.line_map_stat = self.saved_stat
+        if self.wal is not None:
+            self.wal.start()
+        if self.stats is not None:
+            self.stats.add("io", time.perf_counter_ns() - started)
+        return report
+
+    def diff(self) -> str:
+        """
+        Return a unified diff from the file on disk to the buffer, or an empty string if they have the same lines.
+        Only the lines around those edited since the file was opened or saved are read and compared, unless the file
+        was changed by someone else since then.
+        """
+
+        content = self.current_content
+        started = time.perf_counter_ns()
+        source = MappedFile(self.path)
+        line_map = self.line_map if self.stat_file() == self.line_map_stat else LineMap(unmodified=False)
+        try:
+            windows = [
+                (file_start, buffer_start, list(source.iter_lines(file_start, file_stop)), buffer_stop)
+                for file_start, file_stop, buffer_start, buffer_stop in line_map.windows(
+                    source.number_of_lines, len(content)
+                )
+            ]
+        finally:
+            source.close()
+        if self.stats is not None:
+            self.stats.add("io", time.perf_counter_ns() - started)
+
+        hunks = []
+        for file_start, buffer_start, old, buffer_stop in windows:
+            hunks.extend(
+                unified_hunks(old, list(content.copy_range(buffer_start, buffer_stop)), file_start, buffer_start)
+            )
+        if not hunks:
+            return ""
+        return "\n".join((f"--- {self.path}", f"+++ {self.path} (unsaved)", *hunks))
+
+    def content_digest(self) -> bytes:
+        digest = hashlib.blake2b()
+        for line in self.current_content:
+            digest.update(line.encode("utf-8"))
+        return digest.digest()
+
+    def file_digest(self) -> bytes:
+        digest = hashlib.blake2b()
         with self.path.open("r", encoding="utf-8") as file:
-            if self.current_content != file.readlines():
-                raise UnsavedChangesExist
+            while chunk := file.read(1 << 20):
+                digest.update(chunk.encode("utf-8"))
+        return digest.digest()
+
+    @property
+    def has_unsaved_changes(self) -> bool:
+        if self.stat_file() == self.saved_stat:
+            return self.state != self.saved_state
+        # The file was changed by someone else since it was opened or saved, so the buffer is compared to it.
+        try:
+            return self.content_digest() != self.file_digest()
+        except UnicodeDecodeError:
+            # The file isn't UTF-8 anymore, so it can't hold the lines of the buffer.
+            return True
+
+    def close(self) -> None:
+        # Lines that are still loading are only needed if they are compared to a file changed by someone else.
+        self.load_lines(0)
+        started = time.perf_counter_ns()
+        has_unsaved_changes = self.has_unsaved_changes
+        if self.stats is not None:
+            self.stats.add("io", time.perf_counter_ns() - started)
+        if has_unsaved_changes:
+            raise UnsavedChangesExist
+        if self.wal is not None:
+            self.wal.remove()
+        if self._content.file_backed:
+            self._content.close()
+        if self.spill_store is not None:
+            self.spill_store.close()
+        if self.loader is not None:
+            self.loader.cancel()
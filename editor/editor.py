@@ -1,69 +1,229 @@
-import re
 import sys
+import time
+import pathlib
+from typing import Any, Callable, Iterable, TextIO
 
+from .autosave import Autosaver
+from .commands import ParsedCommand, parse
 from .document import Document
+from .stats import Stats
+from .streaming import StreamedDocument
 from .exceptions import *
 
+EDIT_ERRORS = (
+    ZeroLineNumber,
+    TooLargeLineNumber,
+    ZeroColumnNumber,
+    TooLargeColumnNumber,
+    LineSwappedWithItself,
+    WrongLineRange,
+    LineRangesOverlap,
+    LinesMovedIntoThemselves,
+    InvalidPattern,
+    InvalidEncoding,
+)
 
-class Editor:
-    def __init__(self):
+
+def _untimed_parse(command: str) -> tuple[ParsedCommand, int]:
+    return parse(command), 0
+
+
+def parse_script(
+    script: Iterable[str],
+    keep_going: bool = False,
+    parse_command: Callable[[str], tuple[ParsedCommand, int]] = _untimed_parse,
+) -> tuple[list[tuple[int, ParsedCommand, int]], list[tuple[int, str]]]:
+    """
+    Parse the commands of the script, skipping blank lines and lines starting with '#'.
+    Returns the commands with their script line numbers and parse times, and the errors with their line numbers.
+    Parsing stops at the first error unless keep_going is set.
+    """
+
+    commands = []
+    errors = []
+
+    for line_number, line in enumerate(script, start=1):
+        command = line.rstrip("\r\n")
+        if not command.strip() or command.startswith("#"):
+            continue
         try:
-            self.document = Document()
-        except (WrongNumberOfCommandLineArgs, PathDoesNotExist, PathIsNotFilepath) as e:
-            sys.exit(f"{e}")
+            commands.append((line_number, *parse_command(command)))
+        except UnknownCommand as e:
+            errors.append((line_number, f"{e}"))
+            if not keep_going:
+                break
+
+    return commands, errors
+
+
+class Editor:
+    def __init__(
+        self,
+        path: str | pathlib.Path | None = None,
+        engine: str | None = None,
+        stats: bool = True,
+        output: str | pathlib.Path | None = None,
+        document: Document | None = None,
+        autosave: float | None = None,
+        autosave_edits: int = 100,
+        wal: float | None = None,
+        memory_budget: int | None = None,
+    ):
+        if document is not None:
+            self.document = document
+        else:
+            try:
+                # The file is read in the background, so that the first prompt doesn't wait for the whole file.
+                self.document = (
+                    Document(path, engine, background=True) if output is None else StreamedDocument(path, output)
+                )
+            except (WrongNumberOfCommandLineArgs, PathDoesNotExist, PathIsNotFilepath, UnknownBufferEngine) as e:
+                sys.exit(f"{e}")
 
         self.user_input = None
+        self.stats: Stats | None = Stats() if stats else None
+        self.document.stats = self.stats
+        if memory_budget is not None:
+            self.document.enable_spill(memory_budget)
+        if wal is not None:
+            recovered = self.document.enable_wal(wal)
+            if self.document.state != self.document.saved_state:
+                print(f"Recovered {recovered} unsaved edits from the write-ahead log.", file=sys.stderr)
+        # With autosave, commands run under the autosaver's lock, and save and close flush it first.
+        self.autosaver: Autosaver | None = (
+            Autosaver(self.document, autosave, autosave_edits) if autosave is not None else None
+        )
+
+    def parse(self, command: str) -> ParsedCommand:
+        return parse(command)
+
+    def timed_parse(self, command: str) -> tuple[ParsedCommand, int]:
+        if self.stats is None:
+            return self.parse(command), 0
+
+        started = time.perf_counter_ns()
+        try:
+            return self.parse(command), time.perf_counter_ns() - started
+        except UnknownCommand:
+            self.stats.record("unknown", time.perf_counter_ns() - started, None, failed=True)
+            raise
+
+    def execute(self, command: ParsedCommand, parse_time: int = 0) -> Any:
+        if self.autosaver is None:
+            return self._execute(command, parse_time)
+
+        with self.autosaver.lock:
+            if command.name == "save":
+                self.autosaver.wait()
+            elif command.name == "close":
+                self.autosaver.flush()
+            state = self.document.state
+            try:
+                return self._execute(command, parse_time)
+            finally:
+                if self.document.state != state:
+                    self.autosaver.edited()
+
+    def _execute(self, command: ParsedCommand, parse_time: int) -> Any:
+        if self.stats is None:
+            return command.execute(self.document)
+
+        failed = True
+        started = time.perf_counter_ns()
+        try:
+            result = command.execute(self.document)
+            failed = False
+            return result
+        finally:
+            self.stats.record(command.name, parse_time, time.perf_counter_ns() - started, failed)
+
+    def shutdown(self) -> None:
+        """
+        Stop autosaving, writing the edits that haven't been autosaved yet.
+        """
+
+        if self.autosaver is not None:
+            self.autosaver.stop()
+            self.autosaver = None
+
+    def dump_stats(self, path: pathlib.Path) -> None:
+        if self.stats is not None:
+            self.stats.dump(self.document, path)
 
     def start(self):
         while True:
+            if self.autosaver is not None and (error := self.autosaver.take_error()) is not None:
+                print(f"Error! Autosave failed: {error}")
             self.user_input = input(">>> ")
 
             try:
-                if m := re.match(r"insert(?: (\d+))?(?: (\d+))? \"(.+)\"$", self.user_input):
-                    match len(args := [x for x in m.groups() if x is not None]):
-                        case 1:
-                            self.document.insert_line(text=args[0])
-                            continue
-                        case 2:
-                            self.document.insert_line(line_number=int(args[0]), text=args[1])
-                            continue
-                        case 3:
-                            self.document.insert_line(
-                                line_number=int(args[0]), column_number=int(args[1]), text=args[2]
-                            )
-                            continue
-                elif m := re.match(r"delete (\d+)$", self.user_input):
-                    self.document.delete_line(line_number=int(m.group(1)))
-                    continue
-                elif m := re.match(r"swap (\d+) (\d+)$", self.user_input):
-                    if len(args := [x for x in m.groups() if x is not None]) == 2:
-                        self.document.swap_lines(int(args[0]), int(args[1]))
-                        continue
-            except (
-                ZeroLineNumber,
-                TooLargeLineNumber,
-                ZeroColumnNumber,
-                TooLargeColumnNumber,
-                LineSwappedWithItself,
-            ) as e:
+                command, parse_time = self.timed_parse(self.user_input)
+                result = self.execute(command, parse_time)
+            except (UnknownCommand, *EDIT_ERRORS) as e:
                 print(f"{e}")
                 continue
-
-            if self.user_input == "undo":
-                self.document.undo()
-            elif self.user_input == "clear":
-                self.document.clear()
-            elif self.user_input == "save":
-                self.document.save()
-            elif self.user_input == "close":
-                try:
-                    self.document.close()
-                except UnsavedChangesExist as e:
-                    if input(f"{e}").lower() == "y":
-                        sys.exit(0)
-                    else:
-                        continue
-                else:
+            except UnsavedChangesExist as e:
+                if input(f"{e}").lower() == "y":
+                    if self.document.wal is not None:
+                        self.document.wal.remove()
                     sys.exit(0)
+                else:
+                    continue
+
+            if command.name == "close":
+                sys.exit(0)
+            elif result is not None:
+                print(result)
+
+    def parse_script(
+        self, script: Iterable[str], keep_going: bool = False
+    ) -> tuple[list[tuple[int, ParsedCommand, int]], list[tuple[int, str]]]:
+        return parse_script(script, keep_going, self.timed_parse)
+
+    def apply_script(
+        self,
+        commands: Iterable[tuple[int, ParsedCommand, int]],
+        keep_going: bool = False,
+        output: TextIO | None = None,
+    ) -> list[tuple[int, str]]:
+        """
+        Apply parsed commands until the first error, or all of them if keep_going is set, and return the errors.
+        Results of commands such as find or save are printed to the output, if it is given.
+        A streamed document is written to its output when the commands end, even if they don't close it.
+        """
+
+        errors = []
+
+        for line_number, command, parse_time in commands:
+            try:
+                result = self.execute(command, parse_time)
+            except (*EDIT_ERRORS, UnsavedChangesExist) as e:
+                message = "Error! The file has unsaved changes." if isinstance(e, UnsavedChangesExist) else f"{e}"
+                errors.append((line_number, message))
+                if not keep_going:
+                    return errors
             else:
-                print("Error! Unknown command.")
+                if output is not None and result is not None:
+                    print(result, file=output)
+                if command.name == "close":
+                    break
+        else:
+            if isinstance(self.document, StreamedDocument):
+                self.document.close()
+
+        return errors
+
+    def run_script(self, script: Iterable[str], keep_going: bool = False) -> int:
+        """
+        Parse every command of the script up front, then apply them without prompting.
+        Results are printed to stdout and errors to stderr with the script line number; the script stops at the first
+        error unless keep_going is set. Returns the exit status.
+        """
+
+        commands, errors = self.parse_script(script, keep_going)
+        if not errors or keep_going:
+            errors.extend(self.apply_script(commands, keep_going, sys.stdout))
+
+        for line_number, message in errors:
+            print(f"Line {line_number}: {message}", file=sys.stderr)
+        return 1 if errors else 0
@@ -4,10 +4,19 @@ __all__ = [
     "WrongNumberOfCommandLineArgs",
     "PathDoesNotExist",
     "PathIsNotFilepath",
+    "PathOutsideRoot",
     "ZeroLineNumber",
     "TooLargeLineNumber",
     "ZeroColumnNumber",
     "TooLargeColumnNumber",
     "LineSwappedWithItself",
+    "LineAlreadyDeleted",
     "UnsavedChangesExist",
+    "UnknownBufferEngine",
+    "UnknownCommand",
+    "WrongLineRange",
+    "LineRangesOverlap",
+    "LinesMovedIntoThemselves",
+    "InvalidPattern",
+    "InvalidEncoding",
 ]
@@ -35,6 +35,18 @@ class PathIsNotFilepath(Exception):
         super().__init__(self.message)
 
 
+class PathOutsideRoot(Exception):
+    """
+    Exception raised when a path is outside the directory the editor is allowed to access.
+    """
+
+    def __init__(self, path: pathlib.Path, root: pathlib.Path):
+        self.path = path
+        self.root = root
+        self.message = f"Error! Following path is outside {self.root}: {self.path}"
+        super().__init__(self.message)
+
+
 class ZeroLineNumber(Exception):
     """
     Exception raised when a line number is equal to zero.
@@ -93,6 +105,19 @@ class LineSwappedWithItself(Exception):
         super().__init__(self.message)
 
 
+class LineAlreadyDeleted(Exception):
+    """
+    Exception raised when a batch of edits accesses a line it has already deleted.
+    """
+
+    def __init__(self, line_number: int):
+        self.line_number = line_number
+        self.message = (
+            f"Error! You can't access the line №{self.line_number}. The line was deleted earlier in the batch."
+        )
+        super().__init__(self.message)
+
+
 class UnsavedChangesExist(Exception):
     """
     Exception raised when attempting to close the editor with unsaved changes.
@@ -101,3 +126,95 @@ class UnsavedChangesExist(Exception):
     def __init__(self):
         self.message = "All unsaved changes will be lost. Are you sure you want to close the editor? (Y/n): "
         super().__init__(self.message)
+
+
+class UnknownBufferEngine(Exception):
+    """
+    Exception raised when a document is opened with a buffer engine that doesn't exist.
+    """
+
+    def __init__(self, engine: str):
+        self.engine = engine
+        self.message = f"Error! Unknown buffer engine: {self.engine}"
+        super().__init__(self.message)
+
+
+class UnknownCommand(Exception):
+    """
+    Exception raised when a command can't be recognized.
+    """
+
+    def __init__(self, command: str):
+        self.command = command
+        self.message = "Error! Unknown command."
+        super().__init__(self.message)
+
+
+class WrongLineRange(Exception):
+    """
+    Exception raised when the first line of a range comes after the last one.
+    """
+
+    def __init__(self, first_line_number: int, last_line_number: int):
+        self.first_line_number = first_line_number
+        self.last_line_number = last_line_number
+        self.message = (
+            f"Error! The range of lines №{self.first_line_number}-{self.last_line_number} is wrong. "
+            "The first line must not come after the last one."
+        )
+        super().__init__(self.message)
+
+
+class LineRangesOverlap(Exception):
+    """
+    Exception raised when attempting to swap ranges of lines that overlap.
+    """
+
+    def __init__(self, first_range: tuple[int, int], second_range: tuple[int, int]):
+        self.first_range = first_range
+        self.second_range = second_range
+        self.message = (
+            f"Error! The ranges of lines №{first_range[0]}-{first_range[1]} and "
+            f"№{second_range[0]}-{second_range[1]} overlap."
+        )
+        super().__init__(self.message)
+
+
+class LinesMovedIntoThemselves(Exception):
+    """
+    Exception raised when attempting to move a range of lines after one of its own lines but the last.
+    """
+
+    def __init__(self, first_line_number: int, last_line_number: int, line_number: int):
+        self.first_line_number = first_line_number
+        self.last_line_number = last_line_number
+        self.line_number = line_number
+        self.message = (
+            f"Error! You can't move the lines №{self.first_line_number}-{self.last_line_number} after the line "
+            f"№{self.line_number}, which is one of them."
+        )
+        super().__init__(self.message)
+
+
+class InvalidEncoding(Exception):
+    """
+    Exception raised when a line of a lazily decoded file turns out not to be valid UTF-8.
+    """
+
+    def __init__(self, path: pathlib.Path, offset: int):
+        self.path = path
+        self.offset = offset
+        self.message = f"Error! Following file isn't valid UTF-8 at byte {self.offset}: {self.path}"
+        super().__init__(self.message)
+
+
+class InvalidPattern(Exception):
+    """
+    Exception raised when a search pattern or its replacement can't be used.
+    """
+
+    def __init__(self, pattern: str, reason: str):
+        self.pattern = pattern
+        self.reason = reason
+        self.message = f"Error! Invalid pattern: {self.pattern} ({self.reason})"
+        super().__init__(self.message)
@@ -0,0 +1,97 @@
+import collections
+
+# Rough per-line cost of a buffer kept alive by the journal (list slot plus str header).
+LINE_COST = 64
+
+
+def op_size(op: tuple) -> int:
+    size = 0
+    for value in op[1:]:
+        if isinstance(value, str):
+            size += len(value)
+        elif type(value) is not int:
+            size += len(value) * LINE_COST
+    return size
+
+
+class Journal:
+    """
+    Bounded history of edits stored as inverse operations.
+    Each entry is a list of operations that, applied in order, reverts one edit,
+    together with the document state the entry leads back to.
+    Old entries may be spilled to a spill store, and are paged in when they are undone or redone.
+    """
+
+    def __init__(self, max_depth: int = 1000, max_size: int = 64 * 1024 * 1024):
+        self.max_depth = max_depth
+        self.max_size = max_size
+        self.undo_stack: collections.deque[tuple[list[tuple], int, int]] = collections.deque()
+        self.redo_stack: list[tuple[list[tuple], int, int]] = []
+        self.size = 0
+        # Part of the size taken by spilled entries, which isn't held in memory.
+        self.spilled_size = 0
+
+    @property
+    def can_undo(self) -> bool:
+        return bool(self.undo_stack)
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self.redo_stack)
+
+    def record(self, ops: list[tuple], state: int) -> None:
+        self.push_undo(ops, state)
+        while self.redo_stack:
+            self._forget(*self.redo_stack.pop()[:2])
+
+    def push_undo(self, ops: list[tuple], state: int) -> None:
+        size = sum(map(op_size, ops))
+        self.undo_stack.append((ops, size, state))
+        self.size += size
+        self.trim()
+
+    def push_redo(self, ops: list[tuple], state: int) -> None:
+        size = sum(map(op_size, ops))
+        self.redo_stack.append((ops, size, state))
+        self.size += size
+
+    def _forget(self, ops, size: int) -> None:
+        self.size -= size
+        if not isinstance(ops, list):
+            self.spilled_size -= size
+
+    def pop_undo(self) -> tuple[list[tuple], int]:
+        ops, size, state = self.undo_stack.pop()
+        self._forget(ops, size)
+        return ops if isinstance(ops, list) else ops.load(), state
+
+    def pop_redo(self) -> tuple[list[tuple], int]:
+        ops, size, state = self.redo_stack.pop()
+        self._forget(ops, size)
+        return ops if isinstance(ops, list) else ops.load(), state
+
+    def trim(self) -> None:
+        if len(self.undo_stack) <= self.max_depth and self.size <= self.max_size:
+            return
+        # The newest entry is always kept so that the last edit can be undone.
+        while len(self.undo_stack) > 1 and (len(self.undo_stack) > self.max_depth or self.size > self.max_size):
+            self._forget(*self.undo_stack.popleft()[:2])
+
+    def spill(self, store, keep: int = 0) -> None:
+        """
+        Spill the oldest entries in memory, undo entries before redo ones, until the others take at most keep bytes.
+        """
+
+        for stack in (self.undo_stack, self.redo_stack):
+            for position, (ops, size, state) in enumerate(stack):
+                if self.size - self.spilled_size <= keep:
+                    return
+                if isinstance(ops, list):
+                    stack[position] = store.spill_ops(ops), size, state
+                    self.spilled_size += size
+
+    def clear(self) -> None:
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.size = 0
+        self.spilled_size = 0
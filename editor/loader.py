@@ -0,0 +1,84 @@
+import io
+import pathlib
+import threading
+
+from .storage import CHUNK_SIZE
+from .exceptions import *
+
+
+class BackgroundLoader:
+    """
+    Thread that reads and decodes the lines of a file in chunks of about chunk_size bytes, so that the editor can
+    prompt for commands before the whole file is read.
+    The thread never touches the buffer: the document takes the chunks read so far and puts them into its buffer
+    itself, between commands. Line breaks are translated like a file opened in text mode.
+    """
+
+    def __init__(self, path: pathlib.Path, chunk_size: int = CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.condition = threading.Condition()
+        # Chunks of lines read but not taken by the document yet.
+        self.chunks: list[list[str]] = []
+        self.lines_read = 0
+        self.done = False
+        self.cancelled = False
+        self.error: Exception | None = None
+        self.thread = threading.Thread(target=self._run, name=f"loader-{path.name}", daemon=True)
+        self.thread.start()
+
+    def _run(self) -> None:
+        position = 0
+        try:
+            with self.path.open("rb") as file:
+                # A chunk of whole lines ends with a line feed, so a CRLF is never split between two chunks.
+                while not self.cancelled and (raw_lines := self._read(file)):
+                    raw = b"".join(raw_lines)
+                    try:
+                        text = raw.decode("utf-8")
+                    except UnicodeDecodeError as e:
+                        raise InvalidEncoding(self.path, position + e.start) from None
+                    position += len(raw)
+                    lines = io.StringIO(text, newline=None).readlines()
+                    with self.condition:
+                        self.chunks.append(lines)
+                        self.lines_read += len(lines)
+                        self.condition.notify_all()
+        except (OSError, InvalidEncoding) as e:
+            self.error = e
+        finally:
+            with self.condition:
+                self.done = True
+                self.condition.notify_all()
+
+    def _read(self, file: io.BufferedReader) -> list[bytes]:
+        return file.readlines(self.chunk_size)
+
+    @property
+    def finished(self) -> bool:
+        """
+        Whether the whole file was read and taken.
+        """
+
+        with self.condition:
+            return self.done and not self.chunks and self.error is None and not self.cancelled
+
+    def take(self, number_of_lines: int | None = None) -> list[list[str]]:
+        """
+        Wait until the number of lines, or the whole file if it's None, was read, and return the chunks read since the
+        last call. Lines past the end of the file aren't waited for. If the thread stopped on an error before reading
+        the lines, the error is raised once the chunks read before it were taken.
+        """
+
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.done or (number_of_lines is not None and self.lines_read >= number_of_lines)
+            )
+            chunks, self.chunks = self.chunks, []
+            missing = number_of_lines is None or self.lines_read < number_of_lines
+            if not chunks and missing and self.error is not None:
+                raise self.error
+            return chunks
+
+    def cancel(self) -> None:
+        self.cancelled = True
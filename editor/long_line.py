@@ -0,0 +1,87 @@
+# Lines at least this long are edited through a gap buffer instead of being rebuilt on every column insert.
+LONG_LINE_THRESHOLD = 1 << 16
+# Inserted texts are merged into one piece while they are shorter than this, so that typing doesn't fragment the line.
+MERGE_SIZE = 1 << 12
+
+
+class GapLine:
+    """
+    Gap buffer over a single long line, for repeated edits at nearby columns.
+    The text before and after the gap is a list of pieces, each a (text, start, stop) slice that shares the string it
+    comes from instead of copying it. The pieces after the gap are kept in reverse order, so that moving the gap only
+    moves the pieces it passes over, splitting at most one of them, and an insert at the gap appends one piece.
+    Thus an insert costs O(size of the text + pieces between it and the previous edit), and the line is only joined
+    into a string again when it is read.
+    """
+
+    __slots__ = ("before", "after", "gap", "length")
+
+    def __init__(self, line: str):
+        self.before: list[tuple[str, int, int]] = [(line, 0, len(line))] if line else []
+        self.after: list[tuple[str, int, int]] = []
+        self.gap = len(line)
+        self.length = len(line)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __str__(self) -> str:
+        return "".join(
+            [
+                *(text[start:stop] for text, start, stop in self.before),
+                *(text[start:stop] for text, start, stop in reversed(self.after)),
+            ]
+        )
+
+    def _move_gap(self, position: int) -> None:
+        while self.gap > position:
+            text, start, stop = self.before.pop()
+            if (split := start + position - (self.gap - (stop - start))) > start:
+                self.before.append((text, start, split))
+                self.after.append((text, split, stop))
+                self.gap = position
+            else:
+                self.after.append((text, start, stop))
+                self.gap -= stop - start
+        while self.gap < position:
+            text, start, stop = self.after.pop()
+            if (split := start + position - self.gap) < stop:
+                self.before.append((text, start, split))
+                self.after.append((text, split, stop))
+                self.gap = position
+            else:
+                self.before.append((text, start, stop))
+                self.gap += stop - start
+
+    def insert(self, position: int, text: str) -> None:
+        if not text:
+            return
+        self._move_gap(position)
+        if (
+            self.before
+            and (last := self.before[-1])[2] - last[1] + len(text) <= MERGE_SIZE
+            and len(last[0]) <= MERGE_SIZE
+        ):
+            self.before[-1] = (f"{last[0][last[1]:last[2]]}{text}", 0, last[2] - last[1] + len(text))
+        else:
+            self.before.append((text, 0, len(text)))
+        self.gap += len(text)
+        self.length += len(text)
+
+    def cut(self, position: int, length: int) -> str:
+        """
+        Remove length characters at the position and return them.
+        """
+
+        self._move_gap(position)
+        removed = []
+        remaining = length
+        while remaining:
+            text, start, stop = self.after.pop()
+            if stop - start > remaining:
+                self.after.append((text, start + remaining, stop))
+                stop = start + remaining
+            removed.append(text[start:stop])
+            remaining -= stop - start
+        self.length -= length
+        return "".join(removed)
@@ -0,0 +1,95 @@
+import glob
+import multiprocessing
+import os
+import pathlib
+import time
+from typing import Iterable, Iterator, NamedTuple
+
+from .commands import ParsedCommand
+from .document import Document
+from .editor import Editor
+from .exceptions import *
+
+
+class FileResult(NamedTuple):
+    path: str
+    errors: tuple[tuple[int, str], ...]
+    elapsed: float
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def __str__(self) -> str:
+        if self.ok:
+            return f"{self.path}: OK"
+        return "\n".join(
+            f"{self.path}: {message}" if line_number == 0 else f"{self.path}: Line {line_number}: {message}"
+            for line_number, message in self.errors
+        )
+
+
+def expand_paths(patterns: Iterable[str]) -> list[str]:
+    """
+    Expand glob patterns, including recursive '**' ones, and keep plain paths that match nothing as they are,
+    so that they are reported as missing files. Duplicates are dropped.
+    """
+
+    paths = {}
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        paths.update(dict.fromkeys(matches))
+    return list(paths)
+
+
+# Job of the worker process, set once by the pool initializer instead of being pickled with every file.
+_commands: list[tuple[int, ParsedCommand, int]] = []
+_engine: str | None = None
+_keep_going: bool = False
+
+
+def _init_worker(commands: list[tuple[int, ParsedCommand, int]], engine: str | None, keep_going: bool) -> None:
+    global _commands, _engine, _keep_going
+    _commands, _engine, _keep_going = commands, engine, keep_going
+
+
+def _edit_file(path: str) -> FileResult:
+    started = time.perf_counter()
+    try:
+        document = Document(pathlib.Path(path), _engine)
+    except (PathDoesNotExist, PathIsNotFilepath, UnknownBufferEngine) as e:
+        return FileResult(path, ((0, f"{e}"),), time.perf_counter() - started)
+    except (OSError, UnicodeDecodeError) as e:
+        return FileResult(path, ((0, f"Error! Can't read the file: {e}"),), time.perf_counter() - started)
+
+    try:
+        errors = Editor(document=document, stats=False).apply_script(_commands, _keep_going)
+    except OSError as e:
+        errors = [(0, f"Error! Can't write the file: {e}")]
+    return FileResult(path, tuple(errors), time.perf_counter() - started)
+
+
+def edit_files(
+    paths: list[str],
+    commands: list[tuple[int, ParsedCommand, int]],
+    engine: str | None = None,
+    keep_going: bool = False,
+    workers: int | None = None,
+    chunksize: int | None = None,
+) -> Iterator[FileResult]:
+    """
+    Apply the parsed commands to every file with the same semantics as a script, in a pool of worker processes.
+    Results are yielded in the order of the paths as soon as they are ready. A single worker edits the files in
+    this process. By default there is a worker per CPU, and every worker is sent about four chunks of files.
+    """
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(paths) <= 1:
+        _init_worker(commands, engine, keep_going)
+        yield from map(_edit_file, paths)
+        return
+
+    workers = min(workers, len(paths))
+    chunksize = chunksize or max(1, len(paths) // (workers * 4))
+    with multiprocessing.Pool(workers, _init_worker, (commands, engine, keep_going)) as pool:
+        yield from pool.imap(_edit_file, paths, chunksize)
@@ -0,0 +1,296 @@
+import re
+from typing import Callable, Sequence
+
+from .exceptions import *
+
+
+def compile_matcher(pattern: str, regex: bool) -> Callable[[str], bool]:
+    """
+    Return a predicate telling whether a line, without its line break, contains the pattern.
+    """
+
+    if not regex:
+        # A literal pattern comes from a single command line, so it can't contain the line break.
+        return lambda line: pattern in line
+    try:
+        search = re.compile(pattern).search
+    except re.error as e:
+        raise InvalidPattern(pattern, f"{e}") from None
+    return lambda line: search(line.removesuffix("\n")) is not None
+
+
+def trigrams(text: str) -> set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def _bitset(keys: list[int]) -> int:
+    bits = bytearray(max(keys, default=0) // 8 + 1)
+    for key in keys:
+        bits[key >> 3] |= 1 << (key & 7)
+    return int.from_bytes(bits, "little")
+
+
+class _Block:
+    """
+    Run of consecutive lines. Its key is the bit of the block in the postings of the trigram index, or None while its
+    lines aren't indexed. Blocks split from one block share its key, since their trigrams are a subset of its own.
+    """
+
+    __slots__ = ("size", "key", "stale")
+
+    def __init__(self, size: int, key: int | None = None, stale: int = 0):
+        self.size = size
+        self.key = key
+        # Number of edits since the block was indexed, whose replaced trigrams are still in the postings.
+        self.stale = stale
+
+
+class SearchIndex:
+    """
+    Trigram index of the lines, kept up to date by every edit operation.
+    Lines are grouped into blocks, and each trigram maps to a bitset of the keys of the blocks containing it. A key
+    belongs to a block, not to a line number, so inserting or deleting lines never touches the postings: only the
+    block sizes change, kept in a Fenwick tree that finds the block of a line in O(log n). An edit therefore costs
+    O(log n + length of the line), however many lines match any pattern.
+    Only the trigrams of the patterns searched for are indexed: a search of the whole content for a literal pattern
+    with trigrams the index doesn't have yet reads every block and records which blocks contain them, which costs
+    little more than the scan itself. A literal pattern of three or more characters whose trigrams are indexed is
+    answered by scanning only the blocks whose bitsets contain all of them, so a repeated search reads only the blocks
+    that may match; regular expressions and shorter patterns scan every block. Blocks inserted since are indexed by
+    the first search that scans them, since it has read their lines anyway.
+    Edits only add trigrams, so the index may return blocks that no longer match, which the scan filters out; a block
+    edited more times than it has lines is indexed again.
+    """
+
+    block_size: int = 256
+
+    def __init__(self):
+        self.built = False
+        self.blocks: list[_Block] = []
+        self.postings: dict[tuple[str, str, str], int] = {}
+        self.next_key = 0
+        self._tree: list[int] = [0]
+
+    def clear(self) -> None:
+        self.built = False
+        self.blocks = []
+        self.postings = {}
+        self.next_key = 0
+        self._tree = [0]
+
+    def _build(self, number_of_lines: int) -> None:
+        self.blocks = [
+            _Block(min(self.block_size, number_of_lines - start))
+            for start in range(0, number_of_lines, self.block_size)
+        ]
+        self.built = True
+        self._rebuild_tree()
+
+    def _rebuild_tree(self) -> None:
+        tree = [0] * (len(self.blocks) + 1)
+        for slot, block in enumerate(self.blocks, 1):
+            tree[slot] += block.size
+            if (parent := slot + (slot & -slot)) < len(tree):
+                tree[parent] += tree[slot]
+        self._tree = tree
+
+    def _add_size(self, slot: int, delta: int) -> None:
+        slot += 1
+        while slot < len(self._tree):
+            self._tree[slot] += delta
+            slot += slot & -slot
+
+    def _locate(self, index: int) -> tuple[int, int]:
+        """
+        Return the slot of the block containing the line and the offset of the line in it. The index of the line
+        after the last one gives the slot after the last block.
+        """
+
+        slot = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            if (next_slot := slot + step) < len(self._tree) and self._tree[next_slot] <= index:
+                slot = next_slot
+                index -= self._tree[next_slot]
+            step >>= 1
+        return slot, index
+
+    def _split_at(self, index: int) -> int:
+        """
+        Split the block containing the line so that a block starts at it, and return the slot of that block.
+        """
+
+        slot, offset = self._locate(index)
+        if offset:
+            block = self.blocks[slot]
+            self.blocks.insert(slot + 1, _Block(block.size - offset, block.key, block.stale))
+            block.size = offset
+            slot += 1
+            self._rebuild_tree()
+        return slot
+
+    def _merge_blocks(self) -> None:
+        """
+        Merge runs of small unindexed blocks left by range operations, and rebuild the tree.
+        """
+
+        blocks = []
+        for block in self.blocks:
+            if not block.size:
+                continue
+            if (
+                blocks
+                and block.key is None
+                and blocks[-1].key is None
+                and blocks[-1].size + block.size <= self.block_size
+            ):
+                blocks[-1].size += block.size
+            else:
+                blocks.append(block)
+        self.blocks = blocks
+        self._rebuild_tree()
+
+    def _index_text(self, key: int, text: str) -> None:
+        bit = 1 << key
+        postings = self.postings
+        for trigram in trigrams(text) & postings.keys():
+            postings[trigram] |= bit
+
+    def _edited(self, block: _Block, line: str | None) -> None:
+        if block.key is None:
+            return
+        if line is not None:
+            self._index_text(block.key, line)
+        block.stale += 1
+        if block.stale > block.size:
+            block.key = None
+
+    def line_set(self, index: int, line: str) -> None:
+        slot, _ = self._locate(index)
+        self._edited(self.blocks[slot], line)
+
+    def line_inserted(self, index: int, line: str) -> None:
+        if not self.blocks:
+            self.blocks.append(_Block(1))
+            self._rebuild_tree()
+            return
+        slot, _ = self._locate(index)
+        slot = min(slot, len(self.blocks) - 1)
+        block = self.blocks[slot]
+        block.size += 1
+        self._add_size(slot, 1)
+        if block.key is not None:
+            self._index_text(block.key, line)
+        if block.size > 2 * self.block_size:
+            # The halves are indexed again by the searches that scan them.
+            half = block.size // 2
+            self.blocks[slot : slot + 1] = [_Block(half), _Block(block.size - half)]
+            self._rebuild_tree()
+
+    def line_deleted(self, index: int) -> None:
+        slot, _ = self._locate(index)
+        block = self.blocks[slot]
+        block.size -= 1
+        if block.size:
+            self._add_size(slot, -1)
+            self._edited(block, None)
+        else:
+            del self.blocks[slot]
+            self._rebuild_tree()
+
+    def lines_inserted(self, index: int, number_of_lines: int) -> None:
+        # The inserted lines aren't read: their blocks are indexed by the searches that scan them.
+        slot = self._split_at(index)
+        self.blocks[slot:slot] = [
+            _Block(min(self.block_size, number_of_lines - start))
+            for start in range(0, number_of_lines, self.block_size)
+        ]
+        self._merge_blocks()
+
+    def lines_deleted(self, start: int, stop: int) -> None:
+        first_slot = self._split_at(start)
+        del self.blocks[first_slot : self._split_at(stop)]
+        self._merge_blocks()
+
+    def lines_moved(self, start: int, stop: int, index: int) -> None:
+        """
+        Move the lines from start to stop so that they start at the index of the content without them. Their blocks
+        are moved with their keys, so the moved lines aren't read again.
+        """
+
+        first_slot = self._split_at(start)
+        last_slot = self._split_at(stop)
+        moved = self.blocks[first_slot:last_slot]
+        del self.blocks[first_slot:last_slot]
+        self._rebuild_tree()
+        slot = self._split_at(index)
+        self.blocks[slot:slot] = moved
+        self._merge_blocks()
+
+    def _candidate_keys(self, pattern_trigrams: set[str]) -> set[int] | None:
+        """
+        Return the keys of the blocks that may contain the indexed trigrams, or None if none of them is indexed.
+        """
+
+        bits = -1
+        for trigram in pattern_trigrams & self.postings.keys():
+            if not (bits := bits & self.postings[trigram]):
+                return set()
+        if bits == -1:
+            return None
+        flags = f"{bits:b}"[::-1]
+        return {key for key, flag in enumerate(flags) if flag == "1"}
+
+    def lookup(
+        self, content: Sequence[str], pattern: str, regex: bool, start: int = 0, stop: int | None = None
+    ) -> list[int]:
+        """
+        Return the sorted indexes of the lines from start to stop that contain the pattern.
+        """
+
+        matches = compile_matcher(pattern, regex)
+        stop = len(content) if stop is None else stop
+        if not self.built:
+            self._build(len(content))
+        elif self.next_key > 4 * len(self.blocks) + 64:
+            # Most keys belong to blocks that were indexed again since, so the postings are rebuilt from scratch.
+            self.postings = {}
+            self.next_key = 0
+            for block in self.blocks:
+                block.key = None
+
+        pattern_trigrams = set() if regex else trigrams(pattern)
+        # New trigrams are only learned by a search that reads every block, since their bits must cover all blocks.
+        learned = [] if start or stop < len(content) else [t for t in pattern_trigrams if t not in self.postings]
+        keys = None if learned else self._candidate_keys(pattern_trigrams)
+        found: dict[str, list[int]] = {trigram: [] for trigram in learned}
+        indexes = []
+        block_stop = 0
+        for block in self.blocks:
+            block_start, block_stop = block_stop, block_stop + block.size
+            if block_stop <= start or block_start >= stop:
+                continue
+            if block.key is not None and keys is not None and block.key not in keys:
+                continue
+
+            lines = content.copy_range(block_start, block_stop)
+            text = "".join(lines)
+            if block.key is None:
+                block.key = self.next_key
+                block.stale = 0
+                self.next_key += 1
+                for trigram in self.postings:
+                    if trigram in text:
+                        found.setdefault(trigram, []).append(block.key)
+            for trigram in learned:
+                if trigram in text:
+                    found[trigram].append(block.key)
+            # A literal pattern can't contain a line break, so a block without it has no matching line.
+            if regex or pattern in text:
+                indexes.extend(
+                    index for index, line in enumerate(lines, block_start) if start <= index < stop and matches(line)
+                )
+
+        for trigram, trigram_keys in found.items():
+            self.postings[trigram] = self.postings.get(trigram, 0) | _bitset(trigram_keys)
+        return indexes
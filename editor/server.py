@@ -0,0 +1,238 @@
+import asyncio
+import collections
+import concurrent.futures
+import json
+import pathlib
+import sys
+from typing import Any
+
+from .commands import parse
+from .document import Document
+from .editor import EDIT_ERRORS
+from .stats import estimate_memory
+from .exceptions import *
+
+# Commands that read or write files, so they are run in the thread pool instead of the event loop. Every command is
+# run there on documents whose edits are logged to a write-ahead log or whose lines are read from a mapped file.
+IO_COMMANDS = frozenset(("save", "close", "diff"))
+EVICTION_POLICIES = ("save", "journal")
+
+
+class _Entry:
+    __slots__ = ("document", "lock", "base_size", "base_edited_size")
+
+    def __init__(self, document: Document, base_size: int):
+        self.document = document
+        # Serializes the commands on the document, which may run in the event loop or in the thread pool.
+        self.lock = asyncio.Lock()
+        self.measure(base_size)
+
+    def measure(self, base_size: int) -> None:
+        self.base_size = base_size
+        self.base_edited_size = self.document.edited_size
+
+    @property
+    def size(self) -> int:
+        # The lines as they were last measured, with what the edits added to or removed from the buffer since, plus
+        # the journal, which grows with every line the edits replace.
+        edited_size = self.document.edited_size - self.base_edited_size
+        return max(0, self.base_size + edited_size) + self.document.journal.size
+
+
+class EditorServer:
+    """
+    Asyncio server editing many documents at once over a line-delimited JSON protocol.
+    Every request is a JSON object with the "path" of a file and a "command" as typed at the prompt, and optionally an
+    "id" that is echoed back; every response has "ok" and either the "result" of the command or an "error".
+    Open documents are kept in an LRU cache. Once their estimated size exceeds memory_limit bytes, the least recently
+    used idle documents are evicted: saved first, or with the journal policy, left to their write-ahead logs, which are
+    replayed when the document is opened again. Opening, saving and closing files runs in a thread pool, and so does
+    every command on documents that log their edits or read their lines from a mapped file.
+    """
+
+    def __init__(
+        self,
+        root: str | pathlib.Path = ".",
+        engine: str | None = None,
+        memory_limit: int = 256 << 20,
+        eviction: str = "save",
+        workers: int | None = None,
+    ):
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: {eviction}")
+        self.root = pathlib.Path(root).resolve()
+        self.engine = engine
+        self.memory_limit = memory_limit
+        self.eviction = eviction
+        self.executor = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix="editor-io")
+        self.documents: collections.OrderedDict[pathlib.Path, _Entry] = collections.OrderedDict()
+        # Documents being opened or evicted, so that they aren't opened twice or again before their files are written.
+        self.pending: dict[pathlib.Path, asyncio.Future] = {}
+        self.size = 0
+
+    async def _run_blocking(self, function, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def _resolve(self, path: str) -> pathlib.Path:
+        resolved = (self.root / path).resolve()
+        if not resolved.is_relative_to(self.root):
+            raise PathOutsideRoot(pathlib.Path(path), self.root)
+        return resolved
+
+    @staticmethod
+    def _does_io(document: Document) -> bool:
+        return document.wal is not None or document.current_content.file_backed
+
+    def _open(self, path: pathlib.Path) -> _Entry:
+        document = Document(path, self.engine)
+        if self.eviction == "journal":
+            document.enable_wal()
+        return _Entry(document, estimate_memory(document.current_content.segments())[0])
+
+    async def _acquire(self, path: pathlib.Path) -> _Entry:
+        while (entry := self.documents.get(path)) is None:
+            if (pending := self.pending.get(path)) is not None:
+                await pending
+                continue
+            opening = asyncio.get_running_loop().create_future()
+            self.pending[path] = opening
+            try:
+                entry = await self._run_blocking(self._open, path)
+            finally:
+                del self.pending[path]
+                opening.set_result(None)
+            self.documents[path] = entry
+            self.size += entry.size
+            return entry
+
+        self.documents.move_to_end(path)
+        return entry
+
+    def _release(self, document: Document) -> None:
+        if self.eviction == "journal":
+            document.wal.close()
+        elif document.has_unsaved_changes:
+            document.save()
+
+    async def _drop(self, path: pathlib.Path, entry: _Entry, release: bool) -> None:
+        del self.documents[path]
+        self.size -= entry.size
+        if not release:
+            return
+
+        releasing = asyncio.get_running_loop().create_future()
+        self.pending[path] = releasing
+        try:
+            await self._run_blocking(self._release, entry.document)
+        except OSError as e:
+            # The edits would be lost, so the document stays open and is tried again on the next eviction.
+            print(f"Error! Can't evict {path}: {e}", file=sys.stderr)
+            self.documents[path] = entry
+            self.documents.move_to_end(path, last=False)
+            self.size += entry.size
+        finally:
+            del self.pending[path]
+            releasing.set_result(None)
+
+    async def _evict(self) -> None:
+        for path, entry in list(self.documents.items()):
+            if self.size <= self.memory_limit:
+                break
+            if not entry.lock.locked() and path in self.documents:
+                await self._drop(path, entry, release=True)
+
+    async def execute(self, path: str, command: str) -> Any:
+        parsed = parse(command)
+        resolved = self._resolve(path)
+
+        while True:
+            entry = await self._acquire(resolved)
+            async with entry.lock:
+                # The document may have been evicted while this request was waiting for it.
+                if self.documents.get(resolved) is not entry:
+                    continue
+                size = entry.size
+                try:
+                    if parsed.name in IO_COMMANDS or self._does_io(entry.document):
+                        result = await self._run_blocking(parsed.execute, entry.document)
+                    else:
+                        result = parsed.execute(entry.document)
+                finally:
+                    self.size += entry.size - size
+
+                if parsed.name == "save":
+                    size = entry.size
+                    entry.measure(
+                        await self._run_blocking(lambda: estimate_memory(entry.document.current_content.segments())[0])
+                    )
+                    self.size += entry.size - size
+                elif parsed.name == "close":
+                    await self._drop(resolved, entry, release=False)
+                break
+
+        await self._evict()
+        return result
+
+    async def handle_request(self, line: bytes) -> dict:
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict) or not isinstance(request.get("path"), str):
+                raise ValueError
+            command = request.get("command")
+            if not isinstance(command, str):
+                raise ValueError
+        except ValueError:
+            return {"ok": False, "error": "Error! Invalid request."}
+
+        response = {"id": request["id"]} if "id" in request else {}
+        try:
+            result = await self.execute(request["path"], command)
+        except UnsavedChangesExist:
+            response.update(ok=False, error="Error! The file has unsaved changes.")
+        except (PathDoesNotExist, PathIsNotFilepath, PathOutsideRoot, UnknownCommand, *EDIT_ERRORS) as e:
+            response.update(ok=False, error=f"{e}")
+        except (OSError, UnicodeDecodeError) as e:
+            response.update(ok=False, error=f"Error! {e}")
+        else:
+            response.update(ok=True, result=None if result is None else f"{result}")
+        return response
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    response = await self.handle_request(line)
+                    writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, address: str) -> asyncio.AbstractServer:
+        """
+        Listen on a TCP "host:port" address, or on a Unix socket if the address is a path.
+        """
+
+        host, separator, port = address.rpartition(":")
+        if separator and port.isdecimal():
+            return await asyncio.start_server(self.handle_connection, host or None, int(port))
+        return await asyncio.start_unix_server(self.handle_connection, address)
+
+    async def shutdown(self) -> None:
+        """
+        Release every open document according to the eviction policy and stop the thread pool.
+        """
+
+        for path, entry in list(self.documents.items()):
+            async with entry.lock:
+                await self._drop(path, entry, release=True)
+        self.executor.shutdown()
+
+    async def serve(self, address: str) -> None:
+        server = await self.start(address)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.shutdown()
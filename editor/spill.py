@@ -0,0 +1,159 @@
+import array
+import os
+import pickle
+import tempfile
+import time
+from typing import Iterator, Sequence
+
+from .journal import LINE_COST
+from .stats import Histogram
+from .storage import LINES_PER_CHUNK, _write_all
+
+
+def lines_size(lines: Sequence[str]) -> int:
+    """
+    Estimate the bytes held by decoded lines, the same way the journal estimates the lines it keeps alive.
+    """
+
+    return sum(map(len, lines)) + len(lines) * LINE_COST
+
+
+class SpilledOps:
+    """
+    Journal entry whose operations were pickled into a spill store. Buffers that spill their own lines, such as ropes,
+    are kept out of the pickle with only their lines spilled, since their spans can't be pickled.
+    """
+
+    __slots__ = ("store", "offset", "length", "buffers")
+
+    def __init__(self, store: "SpillStore", offset: int, length: int, buffers: list[tuple[int, int, object]]):
+        self.store = store
+        self.offset = offset
+        self.length = length
+        # (operation index, value index, buffer) of the values left out of the pickle.
+        self.buffers = buffers
+
+    def load(self) -> list[tuple]:
+        return self.store.load_ops(self)
+
+
+class SpillStore:
+    """
+    Temporary file that the cold lines and undo entries of a document are spilled to once they exceed its memory
+    budget, and paged in from when they are accessed again.
+    Lines are appended with their UTF-8 encoding, and only the offset of each line is kept in memory, so that a run of
+    spilled lines is a span of the store that reads its lines like a span of a mapped file, and that a save copies as
+    a byte range. Nothing is ever removed from the file, which is deleted when the store is closed.
+    Reading spilled lines and entries back is timed, to tell how much the budget costs the commands.
+    """
+
+    def __init__(self, directory: str | os.PathLike | None = None):
+        self.file = tempfile.TemporaryFile(prefix="editor-spill-", dir=directory, buffering=0)
+        # Line k of the store is stored from offsets[k] to offsets[k + 1].
+        self.offsets = array.array("q", [0])
+        self.size = 0
+        self.spilled_lines = 0
+        self.spilled_entries = 0
+        self.paged_in_bytes = 0
+        self.line_page_ins = Histogram()
+        self.entry_page_ins = Histogram()
+        # Time spent deciding what to spill and writing it.
+        self.spills = Histogram()
+
+    def fileno(self) -> int:
+        return self.file.fileno()
+
+    def _append(self, data: bytes) -> int:
+        offset = self.size
+        self.size += _write_all(self.file.fileno(), data)
+        return offset
+
+    def append_lines(self, lines: Sequence[str]) -> tuple[int, int]:
+        """
+        Write the lines to the store and return the range of their line indexes in it.
+        """
+
+        return self.append_raw_lines([line.encode("utf-8") for line in lines])
+
+    def append_raw_lines(self, encoded: Sequence[bytes]) -> tuple[int, int]:
+        """
+        Write lines already encoded to the store and return the range of their line indexes in it.
+        """
+
+        if self.offsets[-1] != self.size:
+            # Entries were written since the last lines, so the bytes of the entries become a line that is never read.
+            self.offsets.append(self.size)
+        start = len(self.offsets) - 1
+        position = self._append(b"".join(encoded))
+        for line in encoded:
+            position += len(line)
+            self.offsets.append(position)
+        self.spilled_lines += len(encoded)
+        return start, start + len(encoded)
+
+    def byte_range(self, start: int, stop: int) -> tuple[int, int]:
+        return self.offsets[start], self.offsets[stop]
+
+    def _read(self, start: int, stop: int) -> bytes:
+        started = time.perf_counter_ns()
+        data = os.pread(self.file.fileno(), stop - start, start)
+        self.line_page_ins.record(time.perf_counter_ns() - started)
+        self.paged_in_bytes += len(data)
+        return data
+
+    def raw_line(self, line_index: int) -> bytes:
+        return self._read(self.offsets[line_index], self.offsets[line_index + 1])
+
+    def iter_raw_lines(self, start: int, stop: int) -> Iterator[bytes]:
+        offsets = self.offsets
+        for chunk_start in range(start, stop, LINES_PER_CHUNK):
+            chunk_stop = min(chunk_start + LINES_PER_CHUNK, stop)
+            base = offsets[chunk_start]
+            data = self._read(base, offsets[chunk_stop])
+            for index in range(chunk_start, chunk_stop):
+                yield data[offsets[index] - base : offsets[index + 1] - base]
+
+    def line(self, line_index: int) -> str:
+        return self.raw_line(line_index).decode("utf-8")
+
+    def iter_lines(self, start: int, stop: int) -> Iterator[str]:
+        for raw in self.iter_raw_lines(start, stop):
+            yield raw.decode("utf-8")
+
+    def spill_ops(self, ops: list[tuple]) -> SpilledOps:
+        buffers = []
+        pickled_ops = []
+        for op_index, op in enumerate(ops):
+            values = list(op)
+            for value_index, value in enumerate(values):
+                if hasattr(value, "spill"):
+                    value.spill(self)
+                    buffers.append((op_index, value_index, value))
+                    values[value_index] = None
+            pickled_ops.append(tuple(values))
+        data = pickle.dumps(pickled_ops, pickle.HIGHEST_PROTOCOL)
+        self.spilled_entries += 1
+        return SpilledOps(self, self._append(data), len(data), buffers)
+
+    def load_ops(self, spilled: SpilledOps) -> list[tuple]:
+        started = time.perf_counter_ns()
+        ops = [list(op) for op in pickle.loads(os.pread(self.file.fileno(), spilled.length, spilled.offset))]
+        for op_index, value_index, value in spilled.buffers:
+            ops[op_index][value_index] = value
+        self.entry_page_ins.record(time.perf_counter_ns() - started)
+        self.paged_in_bytes += spilled.length
+        return [tuple(op) for op in ops]
+
+    def to_dict(self) -> dict:
+        return {
+            "file_bytes": self.size,
+            "spilled_lines": self.spilled_lines,
+            "spilled_entries": self.spilled_entries,
+            "paged_in_bytes": self.paged_in_bytes,
+            "line_page_ins": self.line_page_ins.to_dict(),
+            "entry_page_ins": self.entry_page_ins.to_dict(),
+            "spills": self.spills.to_dict(),
+        }
+
+    def close(self) -> None:
+        self.file.close()
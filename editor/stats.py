@@ -0,0 +1,172 @@
+import collections
+import json
+import pathlib
+import sys
+import time
+from typing import Iterable
+
+PHASES = ("parse", "apply", "backup", "io")
+
+
+class Histogram:
+    """
+    Latency histogram with one bucket per power of two nanoseconds.
+    """
+
+    __slots__ = ("buckets", "count", "total", "maximum")
+
+    def __init__(self):
+        self.buckets = [0] * 64
+        self.count = 0
+        self.total = 0
+        self.maximum = 0
+
+    def record(self, nanoseconds: int) -> None:
+        self.buckets[min(nanoseconds.bit_length(), 63)] += 1
+        self.count += 1
+        self.total += nanoseconds
+        if nanoseconds > self.maximum:
+            self.maximum = nanoseconds
+
+    def percentile(self, fraction: float) -> int:
+        """
+        Upper bound of the bucket the percentile falls in.
+        """
+
+        threshold = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= threshold:
+                return min(1 << bucket, self.maximum)
+        return self.maximum
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ns": self.total // self.count if self.count else 0,
+            "p50_ns": self.percentile(0.5),
+            "p99_ns": self.percentile(0.99),
+            "max_ns": self.maximum,
+        }
+
+
+def format_duration(nanoseconds: float) -> str:
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("µs", 1e3)):
+        if nanoseconds >= scale:
+            return f"{nanoseconds / scale:.1f} {unit}"
+    return f"{nanoseconds:.0f} ns"
+
+
+def estimate_memory(segments: Iterable) -> tuple[int, int]:
+    """
+    Estimate the bytes held by decoded lines and count the lines still backed by a file.
+    """
+
+    decoded_bytes = mapped_lines = 0
+    for segment in segments:
+        if isinstance(segment, list):
+            decoded_bytes += sys.getsizeof(segment) + sum(map(sys.getsizeof, segment))
+        else:
+            mapped_lines += len(segment)
+    return decoded_bytes, mapped_lines
+
+
+class Stats:
+    """
+    Per-command counts and latency histograms, split into parse, apply, backup and I/O phases.
+    The editor times parsing and the whole command; the document adds the backup and I/O time it spends on
+    the current command, and the rest of the command is counted as apply time.
+    """
+
+    def __init__(self):
+        self.histograms: dict[str, dict[str, Histogram]] = collections.defaultdict(
+            lambda: {phase: Histogram() for phase in PHASES}
+        )
+        self.errors: collections.Counter[str] = collections.Counter()
+        self.pending = {"backup": 0, "io": 0}
+        self.started = time.time()
+
+    def add(self, phase: str, nanoseconds: int) -> None:
+        self.pending[phase] += nanoseconds
+
+    def record(self, command: str, parse: int, total: int | None, failed: bool = False) -> None:
+        """
+        Record a command that took the total time to execute, or None if it wasn't executed.
+        """
+
+        histograms = self.histograms[command]
+        backup, io = self.pending["backup"], self.pending["io"]
+        self.pending["backup"] = self.pending["io"] = 0
+
+        histograms["parse"].record(parse)
+        if total is not None:
+            histograms["apply"].record(max(total - backup - io, 0))
+        if backup:
+            histograms["backup"].record(backup)
+        if io:
+            histograms["io"].record(io)
+        if failed:
+            self.errors[command] += 1
+
+    def to_dict(self, document) -> dict:
+        decoded_bytes, mapped_lines = estimate_memory(document.current_content.segments())
+        data = {
+            "uptime_seconds": time.time() - self.started,
+            "buffer": {
+                "engine": document.engine,
+                "lines": document.number_of_lines,
+                "decoded_bytes_estimate": decoded_bytes,
+                "mapped_lines": mapped_lines,
+                "journal_bytes_estimate": document.journal.size,
+                "journal_entries": len(document.journal.undo_stack) + len(document.journal.redo_stack),
+            },
+            "commands": {
+                command: {
+                    "errors": self.errors[command],
+                    **{phase: histogram.to_dict() for phase, histogram in histograms.items() if histogram.count},
+                }
+                for command, histograms in sorted(self.histograms.items())
+            },
+        }
+        if document.spill_store is not None:
+            data["spill"] = {
+                "budget_bytes": document.memory_budget,
+                "memory_bytes_estimate": document.memory_size,
+                **document.spill_store.to_dict(),
+            }
+        return data
+
+    def report(self, document) -> str:
+        data = self.to_dict(document)
+        buffer = data["buffer"]
+        lines = [
+            f"Buffer: {buffer['lines']} lines ({buffer['engine']} engine), "
+            f"~{buffer['decoded_bytes_estimate']} bytes decoded, {buffer['mapped_lines']} lines mapped, "
+            f"journal ~{buffer['journal_bytes_estimate']} bytes in {buffer['journal_entries']} entries",
+        ]
+        if (spill := data.get("spill")) is not None:
+            lines.append(
+                f"Spill: ~{spill['memory_bytes_estimate']} of {spill['budget_bytes']} bytes in memory, "
+                f"{spill['spilled_lines']} lines and {spill['spilled_entries']} undo entries in {spill['file_bytes']} "
+                f"bytes on disk, {spill['line_page_ins']['count'] + spill['entry_page_ins']['count']} page-ins of "
+                f"{spill['paged_in_bytes']} bytes (lines p99 {format_duration(spill['line_page_ins']['p99_ns'])}, "
+                f"entries p99 {format_duration(spill['entry_page_ins']['p99_ns'])})"
+            )
+        lines.append(
+            f"{'command':<10} {'count':>8} {'errors':>7} {'phase':<7} {'mean':>10} {'p50':>10} {'p99':>10} {'max':>10}"
+        )
+        for command, phases in data["commands"].items():
+            count = phases["parse"]["count"]
+            for phase in PHASES:
+                if (histogram := phases.get(phase)) is None:
+                    continue
+                lines.append(
+                    f"{command:<10} {count:>8} {phases['errors']:>7} {phase:<7} "
+                    f"{format_duration(histogram['mean_ns']):>10} {format_duration(histogram['p50_ns']):>10} "
+                    f"{format_duration(histogram['p99_ns']):>10} {format_duration(histogram['max_ns']):>10}"
+                )
+        return "\n".join(lines)
+
+    def dump(self, document, path: pathlib.Path) -> None:
+        path.write_text(json.dumps(self.to_dict(document), indent=2), encoding="utf-8")
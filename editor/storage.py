@@ -0,0 +1,120 @@
+import itertools
+import os
+import pathlib
+import shutil
+import tempfile
+import time
+from typing import Iterable, NamedTuple
+
+CHUNK_SIZE = 1 << 20
+LINES_PER_CHUNK = 1 << 14
+
+
+class SaveReport(NamedTuple):
+    bytes_written: int
+    bytes_copied: int
+    elapsed: float
+
+    def __str__(self) -> str:
+        return (
+            f"Saved {self.bytes_written} bytes in {self.elapsed * 1000:.2f} ms "
+            f"({self.bytes_copied} bytes copied unchanged)."
+        )
+
+
+def _write_all(fd: int, data: bytes) -> int:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view) :]
+    return len(data)
+
+
+def _copy_range(source_fd: int, target_fd: int, offset: int, count: int) -> None:
+    while count > 0:
+        try:
+            if hasattr(os, "copy_file_range"):
+                copied = os.copy_file_range(source_fd, target_fd, count, offset)
+            else:
+                copied = os.sendfile(target_fd, source_fd, offset, count)
+        except (AttributeError, OSError):
+            copied = _write_all(target_fd, os.pread(source_fd, min(count, CHUNK_SIZE), offset))
+        if copied == 0:
+            raise EOFError(f"Source file ended {count} bytes before the expected end of the copied range.")
+        offset += copied
+        count -= copied
+
+
+def _encoded_chunks(segment: Iterable[str]) -> Iterable[bytes]:
+    lines = iter(segment)
+    while batch := list(itertools.islice(lines, LINES_PER_CHUNK)):
+        yield "".join(batch).encode("utf-8")
+
+
+def write_atomically(
+    path: pathlib.Path, segments: Iterable[Iterable[str]], mode_source: pathlib.Path | None = None
+) -> SaveReport:
+    """
+    Write the segments to a temporary file next to the path, fsync it and rename it over the path.
+    Segments that know their byte range in an open file are copied from it by the kernel instead of re-encoded, and
+    segments that encode themselves are written as they encode.
+    The file mode is copied from mode_source if it is given, otherwise from the file being replaced.
+    """
+
+    started = time.perf_counter()
+    bytes_written = bytes_copied = 0
+    fd, temporary_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+
+    try:
+        pending: list[bytes] = []
+        pending_size = 0
+
+        def flush() -> None:
+            nonlocal pending_size
+            if pending:
+                _write_all(fd, b"".join(pending))
+                pending.clear()
+                pending_size = 0
+
+        for segment in segments:
+            raw_range = segment.raw_range() if hasattr(segment, "raw_range") else None
+            if raw_range is not None:
+                flush()
+                source_fd, start, end = raw_range
+                _copy_range(source_fd, fd, start, end - start)
+                bytes_copied += end - start
+                bytes_written += end - start
+                continue
+
+            chunks = segment.encoded_chunks() if hasattr(segment, "encoded_chunks") else _encoded_chunks(segment)
+            for chunk in chunks:
+                pending.append(chunk)
+                pending_size += len(chunk)
+                bytes_written += len(chunk)
+                if pending_size >= CHUNK_SIZE:
+                    flush()
+
+        flush()
+        os.fsync(fd)
+        os.close(fd)
+        fd = -1
+        shutil.copymode(path if mode_source is None else mode_source, temporary_name)
+        os.replace(temporary_name, path)
+    except BaseException:
+        if fd != -1:
+            os.close(fd)
+        os.unlink(temporary_name)
+        raise
+
+    try:
+        directory_fd = os.open(path.parent, os.O_RDONLY)
+    except OSError:
+        pass
+    else:
+        try:
+            os.fsync(directory_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(directory_fd)
+
+    return SaveReport(bytes_written, bytes_copied, time.perf_counter() - started)
@@ -0,0 +1,41 @@
+import pathlib
+import time
+
+from .document import Document
+from .storage import SaveReport, write_atomically
+
+
+class StreamedDocument(Document):
+    """
+    Document that applies commands to a file too large to load and writes the result to another file.
+    The input is opened with the mapped engine: only the lines the commands read or change are decoded, the rest
+    stay spans of the input, so line numbers are rebased through every edit by the rope instead of by moving lines.
+    Lines displaced by swaps and inserts are the only ones held in memory; saving walks the spans in order and
+    copies the untouched byte ranges of the input into the output.
+    """
+
+    def __init__(self, path: str | pathlib.Path | None, output: str | pathlib.Path):
+        super().__init__(path, "mapped")
+        self.output: pathlib.Path = pathlib.Path(output)
+        self.written: bool = False
+
+    def save(self) -> SaveReport:
+        started = time.perf_counter_ns()
+        mode_source = self.output if self.output.exists() else self.path
+        report = write_atomically(self.output, self.current_content.segments(), mode_source)
+
+        # Unlike a regular save, the buffer keeps referring to the input, which hasn't changed.
+        self.saved_state = self.state
+        self.written = True
+        if self.stats is not None:
+            self.stats.add("io", time.perf_counter_ns() - started)
+        return report
+
+    @property
+    def has_unsaved_changes(self) -> bool:
+        return not self.written or self.state != self.saved_state
+
+    def close(self) -> None:
+        # The output is the whole point of streaming, so closing writes it instead of refusing to close.
+        if self.has_unsaved_changes:
+            self.save()
@@ -0,0 +1,197 @@
+import json
+import os
+import pathlib
+import tempfile
+import time
+import zlib
+from typing import Iterable, NamedTuple
+
+from .storage import _write_all, write_atomically
+
+VERSION = 1
+
+
+class Recovery(NamedTuple):
+    # The checkpoint to load instead of the file, if the log starts from one.
+    checkpoint: pathlib.Path | None
+    groups: list[list[tuple]]
+
+
+def _encode(payload) -> bytes:
+    data = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return b"%08x %s\n" % (zlib.crc32(data), data)
+
+
+def _decode(line: bytes):
+    """
+    Return the payload of a record, or None if the record is torn or corrupted.
+    """
+
+    if not line.endswith(b"\n") or len(line) < 10 or line[8:9] != b" ":
+        return None
+    data = line[9:-1]
+    try:
+        if int(line[:8], 16) != zlib.crc32(data):
+            return None
+        return json.loads(data)
+    except ValueError:
+        return None
+
+
+class WriteAheadLog:
+    """
+    Append-only log of the edit operations applied to a document since it was last saved, kept next to the file.
+    Each record is written to the OS as soon as its edit is applied, so a killed process loses nothing, while fsync is
+    batched to at most once per sync_interval seconds, which bounds what a power loss can lose.
+    A record is one line: the CRC32 of its JSON payload in hex, a space and the payload. The first record describes the
+    base the log applies to: the file with its size and mtime, and optionally a checkpoint of the buffer. Operations
+    that replace the whole buffer, and every checkpoint_records records, write a new checkpoint and start a new log.
+    """
+
+    checkpoint_records: int = 10_000
+
+    def __init__(self, path: pathlib.Path, sync_interval: float = 1.0):
+        self.path = path
+        self.log_path = path.with_name(f".{path.name}.wal")
+        self.checkpoint_path = path.with_name(f".{path.name}.checkpoint")
+        self.sync_interval = sync_interval
+        self.fd = -1
+        self.header: dict = {}
+        self.records = 0
+        self.size = 0
+        # Incremented whenever the log is started again, so that positions from an older log are recognized.
+        self.generation = 0
+        self.last_sync = time.monotonic()
+
+    @staticmethod
+    def stat(path: pathlib.Path) -> list[int]:
+        stat = path.stat()
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def recover(self) -> Recovery:
+        """
+        Read the log left by a session that didn't close the file, and keep appending to its valid part.
+        A log whose base doesn't match the file any more is discarded.
+        """
+
+        try:
+            with self.log_path.open("rb") as file:
+                lines = file.readlines()
+        except FileNotFoundError:
+            lines = []
+
+        header = _decode(lines[0]) if lines else None
+        valid = (
+            isinstance(header, dict) and header.get("version") == VERSION and header.get("file") == self.stat(self.path)
+        )
+        if valid and header["checkpoint"] is not None:
+            valid = self.checkpoint_path.exists() and header["checkpoint"] == self.stat(self.checkpoint_path)
+        if not valid:
+            self.start()
+            return Recovery(None, [])
+
+        groups = []
+        size = len(lines[0])
+        for line in lines[1:]:
+            if (ops := _decode(line)) is None:
+                break
+            groups.append([tuple(op) for op in ops])
+            size += len(line)
+
+        self.header = header
+        self._open(size)
+        self.records = len(groups)
+        return Recovery(self.checkpoint_path if header["checkpoint"] is not None else None, groups)
+
+    def _open(self, size: int) -> None:
+        if self.fd != -1:
+            os.close(self.fd)
+        self.fd = os.open(self.log_path, os.O_WRONLY)
+        # A torn or corrupted tail is cut off, so that new records follow the last valid one.
+        os.ftruncate(self.fd, size)
+        os.lseek(self.fd, size, os.SEEK_SET)
+        self.size = size
+        self.generation += 1
+
+    def _write_log(self, header: dict, tail: bytes = b"") -> None:
+        fd, temporary_name = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp")
+        try:
+            data = _encode(header) + tail
+            _write_all(fd, data)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(temporary_name, self.log_path)
+        self.header = header
+        self._open(len(data))
+        self.records = tail.count(b"\n")
+        self.last_sync = time.monotonic()
+
+    def start(self) -> None:
+        """
+        Start an empty log based on the file as it is now, which is after opening or saving it.
+        """
+
+        self._write_log({"version": VERSION, "file": self.stat(self.path), "checkpoint": None})
+        self.checkpoint_path.unlink(missing_ok=True)
+
+    def checkpoint(self, segments: Iterable[Iterable[str]]) -> None:
+        """
+        Write the buffer to the checkpoint file and start an empty log based on it.
+        """
+
+        write_atomically(self.checkpoint_path, segments, self.path)
+        self._write_log(
+            {"version": VERSION, "file": self.header["file"], "checkpoint": self.stat(self.checkpoint_path)}
+        )
+
+    def append(self, ops: list[tuple]) -> None:
+        data = _encode(ops)
+        _write_all(self.fd, data)
+        self.size += len(data)
+        self.records += 1
+        if time.monotonic() - self.last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self) -> None:
+        os.fsync(self.fd)
+        self.last_sync = time.monotonic()
+
+    @property
+    def position(self) -> tuple[int, int]:
+        return self.generation, self.size
+
+    def rebase(self, position: tuple[int, int]) -> None:
+        """
+        Record that the file was written with the content the buffer had at the position of the log. The records
+        before the position are dropped; if the log was started again since then, its newer base is kept.
+        """
+
+        generation, size = position
+        header = {**self.header, "file": self.stat(self.path)}
+        with self.log_path.open("rb") as file:
+            file.readline()
+            if generation == self.generation:
+                file.seek(size)
+                header["checkpoint"] = None
+            tail = file.read(self.size - file.tell())
+        self._write_log(header, tail)
+        if header["checkpoint"] is None:
+            self.checkpoint_path.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        """
+        Sync and close the log but keep it, so that its edits are replayed when the file is opened again.
+        """
+
+        if self.fd != -1:
+            os.fsync(self.fd)
+            os.close(self.fd)
+            self.fd = -1
+
+    def remove(self) -> None:
+        if self.fd != -1:
+            os.close(self.fd)
+            self.fd = -1
+        self.log_path.unlink(missing_ok=True)
+        self.checkpoint_path.unlink(missing_ok=True)
@@ -1,9 +1,201 @@
+import argparse
+import asyncio
+import glob
+import pathlib
+import sys
+import time
+
 from editor import Editor
+from editor.buffers import ENGINES
+from editor.editor import parse_script
+from editor.parallel import edit_files, expand_paths
+from editor.server import EVICTION_POLICIES, EditorServer
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Edit text files with CLI using a set of commands.")
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        metavar="path",
+        help="file to edit; several files or glob patterns ('**' matches directories recursively) are edited in "
+        "parallel with the script",
+    )
+    parser.add_argument(
+        "-s",
+        "--script",
+        type=argparse.FileType("r", encoding="utf-8"),
+        help="apply the commands from the script ('-' for stdin) instead of prompting for them",
+    )
+    parser.add_argument(
+        "-k", "--keep-going", action="store_true", help="don't stop the script on the first failed command"
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=pathlib.Path,
+        help="stream the file through the script and write the result to OUTPUT, leaving the file unchanged",
+    )
+    parser.add_argument("-e", "--engine", choices=ENGINES, help="buffer engine (default: list)")
+    parser.add_argument(
+        "--files-from",
+        type=argparse.FileType("r", encoding="utf-8"),
+        help="also edit the files listed in the file, one per line ('-' for stdin)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="number of worker processes for several files, or of I/O threads of the server (default: number of CPUs)",
+    )
+    parser.add_argument("--chunksize", type=int, help="number of files sent to a worker at a time")
+    parser.add_argument(
+        "--autosave",
+        type=float,
+        metavar="SECONDS",
+        help="save in the background once the first unsaved edit is SECONDS old",
+    )
+    parser.add_argument(
+        "--autosave-edits",
+        type=int,
+        default=100,
+        metavar="N",
+        help="with --autosave, also save in the background after N edits (default: 100)",
+    )
+    parser.add_argument(
+        "--wal",
+        nargs="?",
+        type=float,
+        const=1.0,
+        metavar="SECONDS",
+        help="log every edit next to the file and replay the log after a crash; the log is fsynced at most once per "
+        "SECONDS (default: 1)",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        metavar="MIB",
+        help="spill the coldest lines and undo entries to a temporary file once those in memory take more than MIB "
+        "(uses the rope engine unless --engine is given)",
+    )
+    parser.add_argument(
+        "--serve",
+        metavar="ADDRESS",
+        help="serve line-delimited JSON requests on a Unix socket path or a TCP host:port instead of editing a file",
+    )
+    parser.add_argument(
+        "--root", type=pathlib.Path, default=pathlib.Path("."), help="directory of the files the server may edit"
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=int,
+        default=256,
+        metavar="MIB",
+        help="estimated size of the documents the server keeps open before it evicts them (default: 256)",
+    )
+    parser.add_argument(
+        "--evict",
+        choices=EVICTION_POLICIES,
+        default="save",
+        help="save evicted documents, or keep their unsaved edits in write-ahead logs (default: save)",
+    )
+    parser.add_argument("--no-stats", action="store_true", help="don't collect per-command latency statistics")
+    parser.add_argument("--stats-json", type=pathlib.Path, help="write the statistics to the JSON file on exit")
+    args = parser.parse_args()
+    if args.files_from is not None:
+        args.paths.extend(line.rstrip("\r\n") for line in args.files_from if line.strip())
+    if args.serve is not None:
+        if args.paths or args.script is not None:
+            parser.error("--serve doesn't take files or a script")
+        return args
+    args.multiple = len(args.paths) != 1 or glob.has_magic(args.paths[0])
+    if not args.paths:
+        parser.error("no file to edit")
+    if args.multiple and args.script is None:
+        parser.error("editing several files requires --script")
+    if args.multiple and args.output is not None:
+        parser.error("--output can't be used with several files")
+    if args.autosave is not None and (args.multiple or args.output is not None):
+        parser.error("--autosave can only be used to edit a single file in place")
+    if args.wal is not None and (args.multiple or args.output is not None):
+        parser.error("--wal can only be used to edit a single file in place")
+    if args.memory_budget is not None and args.multiple:
+        parser.error("--memory-budget can only be used to edit a single file")
+    if args.output is not None and args.script is None:
+        parser.error("--output requires --script")
+    if args.output is not None and args.engine not in (None, "mapped"):
+        parser.error("--output always uses the mapped engine")
+    if args.memory_budget is not None and args.output is None:
+        # The list engine can only spill the undo history, so the budget wouldn't bound the lines of the file.
+        if args.engine is None:
+            args.engine = "rope"
+        elif not hasattr(ENGINES[args.engine], "spill"):
+            parser.error(
+                f"--memory-budget can't bound the lines of the {args.engine} engine, use rope, mapped or bytes"
+            )
+    return args
+
+
+def edit_multiple_files(args: argparse.Namespace) -> int:
+    """
+    Report every file's result on stdout and a summary on stderr. Returns 1 if the script failed on any file.
+    """
+
+    commands, errors = parse_script(args.script, args.keep_going)
+    for line_number, message in errors:
+        print(f"Line {line_number}: {message}", file=sys.stderr)
+    if errors and not args.keep_going:
+        return 1
+
+    started = time.perf_counter()
+    number_of_files = number_of_failures = 0
+    for result in edit_files(
+        expand_paths(args.paths), commands, args.engine, args.keep_going, args.jobs, args.chunksize
+    ):
+        print(result)
+        number_of_files += 1
+        number_of_failures += not result.ok
+
+    print(
+        f"Edited {number_of_files - number_of_failures} of {number_of_files} files "
+        f"in {time.perf_counter() - started:.2f} s.",
+        file=sys.stderr,
+    )
+    return 1 if errors or number_of_failures else 0
 
 
 def main():
-    app = Editor()
-    app.start()
+    args = parse_args()
+    if args.serve is not None:
+        server = EditorServer(args.root, args.engine, args.memory_limit << 20, args.evict, args.jobs)
+        try:
+            asyncio.run(server.serve(args.serve))
+        except KeyboardInterrupt:
+            pass
+        return
+    if args.multiple:
+        sys.exit(edit_multiple_files(args))
+
+    app = Editor(
+        args.paths[0],
+        args.engine,
+        stats=not args.no_stats,
+        output=args.output,
+        autosave=args.autosave,
+        autosave_edits=args.autosave_edits,
+        wal=args.wal,
+        memory_budget=args.memory_budget << 20 if args.memory_budget is not None else None,
+    )
+
+    try:
+        if args.script is not None:
+            sys.exit(app.run_script(args.script, args.keep_going))
+
+        app.start()
+    finally:
+        app.shutdown()
+        if args.stats_json is not None:
+            app.dump_stats(args.stats_json)
 
 
 if __name__ == "__main__":
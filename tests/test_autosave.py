@@ -0,0 +1,88 @@
+import os
+import pathlib
+import threading
+import time
+import unittest
+import unittest.mock
+
+from editor import Editor
+from editor.storage import write_atomically
+
+
+class TestAutosave(unittest.TestCase):
+    temporary_file = pathlib.Path("files", "tmp_autosave.txt")
+
+    def setUp(self):
+        with open(self.temporary_file, "w", encoding="utf-8") as f:
+            f.write("Line #1\nLine #2\nLine #3")
+        self.addCleanup(os.remove, self.temporary_file)
+
+        self.writes = []
+        self.write_delay = 0.0
+
+        def write(path, segments, *args):
+            time.sleep(self.write_delay)
+            self.writes.append(threading.current_thread().name)
+            return write_atomically(path, segments, *args)
+
+        patcher = unittest.mock.patch("editor.autosave.write_atomically", write)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_editor(self, interval: float, max_edits: int) -> Editor:
+        editor = Editor(self.temporary_file, autosave=interval, autosave_edits=max_edits)
+        self.addCleanup(editor.shutdown)
+        return editor
+
+    def run_commands(self, editor: Editor, *commands: str) -> None:
+        for command in commands:
+            editor.execute(editor.parse(command))
+
+    def wait_for_autosave(self, editor: Editor) -> None:
+        deadline = time.monotonic() + 5
+        while editor.document.state != editor.document.saved_state and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(editor.document.state, editor.document.saved_state)
+
+    def read_file(self) -> list[str]:
+        with open(self.temporary_file, "r", encoding="utf-8") as f:
+            return f.readlines()
+
+    def test_edits_are_coalesced_into_one_write(self):
+        editor = self.make_editor(interval=60, max_edits=3)
+        self.run_commands(editor, "delete 1", 'insert 1 "!"', "swap 1 2")
+        self.wait_for_autosave(editor)
+        self.assertEqual(self.writes, ["autosave"])
+        self.assertEqual(self.read_file(), ["Line #3\n", "Line #2!\n"])
+
+    def test_autosave_after_interval(self):
+        editor = self.make_editor(interval=0.05, max_edits=100)
+        self.run_commands(editor, "delete 3")
+        self.wait_for_autosave(editor)
+        self.assertEqual(self.read_file(), ["Line #1\n", "Line #2\n"])
+
+    def test_slow_write_doesnt_block_commands(self):
+        self.write_delay = 0.5
+        editor = self.make_editor(interval=60, max_edits=1)
+        self.run_commands(editor, "delete 1")
+
+        started = time.monotonic()
+        self.run_commands(editor, "delete 1", "undo", "delete 1")
+        self.assertLess(time.monotonic() - started, self.write_delay)
+
+        # The explicit save waits for the autosave in progress and then writes the latest state itself.
+        self.run_commands(editor, "save")
+        self.assertEqual(self.read_file(), ["Line #3"])
+        self.assertFalse(editor.document.has_unsaved_changes)
+
+    def test_close_flushes_pending_edits(self):
+        editor = self.make_editor(interval=60, max_edits=100)
+        self.run_commands(editor, "delete 1", "close")
+        self.assertEqual(self.read_file(), ["Line #2\n", "Line #3"])
+        self.assertEqual(self.writes, [])
+
+    def test_shutdown_flushes_pending_edits(self):
+        editor = self.make_editor(interval=60, max_edits=100)
+        self.run_commands(editor, "delete 2")
+        editor.shutdown()
+        self.assertEqual(self.read_file(), ["Line #1\n", "Line #3"])
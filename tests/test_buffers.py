@@ -0,0 +1,227 @@
+import os
+import pathlib
+import random
+import unittest
+import unittest.mock
+import weakref
+
+from editor.buffers import BytesBuffer, ListBuffer, MappedBuffer, MappedFile, RopeBuffer
+from editor.buffers import rope_buffer
+from editor.document import Document
+from editor.exceptions import *
+
+
+class TestRopeBuffer(unittest.TestCase):
+    def assert_balanced(self, node):
+        if isinstance(node, rope_buffer._Branch):
+            self.assertLessEqual(abs(node.left.height - node.right.height), 1)
+            self.assertEqual(node.size, node.left.size + node.right.size)
+            self.assert_balanced(node.left)
+            self.assert_balanced(node.right)
+
+    def test_build_from_lines(self):
+        lines = [f"Line #{i}\n" for i in range(5000)]
+        buffer = RopeBuffer(lines)
+        self.assertEqual(len(buffer), 5000)
+        self.assertEqual(buffer, lines)
+        self.assertEqual(buffer[-1], "Line #4999\n")
+        self.assert_balanced(buffer.root)
+
+    def test_random_edits_match_list(self):
+        rng = random.Random(42)
+        expected = [f"{i}\n" for i in range(3000)]
+        buffer = RopeBuffer(expected)
+
+        for step in range(20000):
+            action = rng.random()
+            if action < 0.45 or not expected:
+                index = rng.randint(0, len(expected))
+                expected.insert(index, f"new {step}\n")
+                buffer.insert(index, f"new {step}\n")
+            elif action < 0.8:
+                index = rng.randrange(len(expected))
+                del expected[index]
+                del buffer[index]
+            else:
+                index = rng.randrange(len(expected))
+                expected[index] = f"set {step}\n"
+                buffer[index] = f"set {step}\n"
+
+        self.assertEqual(buffer, expected)
+        self.assert_balanced(buffer.root)
+
+    def test_clear(self):
+        buffer = RopeBuffer(["Line #1\n", "Line #2"])
+        buffer.clear()
+        self.assertEqual(buffer, [])
+        buffer.append("Line #1")
+        self.assertEqual(buffer, ["Line #1"])
+
+    def test_index_out_of_range(self):
+        buffer = RopeBuffer(["Line #1\n"])
+        with self.assertRaises(IndexError):
+            buffer[1]
+
+    def test_copy_is_independent(self):
+        buffer = RopeBuffer(["Line #1\n", "Line #2"])
+        copy = buffer.copy()
+        del buffer[0]
+        self.assertEqual(copy, ["Line #1\n", "Line #2"])
+
+    def test_list_buffer_copy_keeps_type(self):
+        self.assertIsInstance(ListBuffer(["Line #1"]).copy(), ListBuffer)
+
+
+class TestMappedBuffer(unittest.TestCase):
+    temporary_file = pathlib.Path("files", "tmp_mapped.txt")
+
+    def write(self, data: bytes) -> None:
+        with open(self.temporary_file, "wb") as f:
+            f.write(data)
+        self.addCleanup(os.remove, self.temporary_file)
+
+    def open(self) -> MappedBuffer:
+        buffer = MappedBuffer.open(self.temporary_file)
+        self.addCleanup(buffer.source.close)
+        return buffer
+
+    def test_lines_across_blocks(self):
+        lines = [f"Line #{i}{'x' * (i % 7)}\n" for i in range(500)] + ["Last line"]
+        self.write("".join(lines).encode("utf-8"))
+
+        with unittest.mock.patch.object(MappedFile, "block_size", 64), unittest.mock.patch.object(
+            MappedFile, "chunk_size", 100
+        ):
+            buffer = self.open()
+            self.assertEqual(buffer[250], lines[250])
+            self.assertEqual(len(buffer), 501)
+            self.assertEqual(buffer[-1], "Last line")
+            self.assertEqual(buffer, lines)
+
+    def test_file_is_not_scanned_until_needed(self):
+        self.write(b"Line #1\nLine #2\n")
+        buffer = self.open()
+        self.assertIsNone(buffer.source._number_of_lines)
+        self.assertEqual(len(buffer), 2)
+
+    def test_crlf_lines_are_translated(self):
+        self.write(b"Line #1\r\nLine #2\r\n")
+        self.assertEqual(self.open(), ["Line #1\n", "Line #2\n"])
+
+    def test_edits_keep_untouched_lines_mapped(self):
+        self.write(b"".join(b"Line #%d\n" % i for i in range(1000)))
+        buffer = self.open()
+        buffer[500] = "changed\n"
+        buffer.insert(100, "inserted\n")
+        del buffer[0]
+
+        expected = [f"Line #{i}\n" for i in range(1, 1000)]
+        expected[499] = "changed\n"
+        expected.insert(99, "inserted\n")
+        self.assertEqual(buffer, expected)
+        decoded_lines = [leaf.piece for leaf in rope_buffer._leaves(buffer.root) if isinstance(leaf.piece, list)]
+        self.assertEqual(sum(map(len, decoded_lines)), 2)
+
+    def test_empty_file(self):
+        self.write(b"")
+        self.assertEqual(self.open(), [])
+
+    def test_invalid_utf8_is_an_editor_error(self):
+        self.write(b"Line #1\n\xff\xfe\n")
+        buffer = self.open()
+        self.assertEqual(buffer[0], "Line #1\n")
+        with self.assertRaises(InvalidEncoding) as context:
+            buffer[1]
+        self.assertEqual(context.exception.offset, 8)
+        with self.assertRaises(InvalidEncoding):
+            list(buffer)
+
+    def test_source_is_released_with_its_last_span(self):
+        self.write(b"Line #1\nLine #2\n")
+        buffer = MappedBuffer.open(self.temporary_file)
+        source = weakref.ref(buffer.source)
+        fileno = buffer.source.fileno()
+        span = buffer.cut(1, 2)
+        del buffer
+        self.assertIsNotNone(source())
+        self.assertEqual(span, ["Line #2\n"])
+        del span
+        self.assertIsNone(source())
+        with self.assertRaises(OSError):
+            os.fstat(fileno)
+
+
+class TestBytesBuffer(unittest.TestCase):
+    temporary_file = pathlib.Path("files", "tmp_bytes.txt")
+
+    def write(self, data: bytes) -> None:
+        with open(self.temporary_file, "wb") as f:
+            f.write(data)
+        self.addCleanup(os.remove, self.temporary_file)
+
+    def read(self) -> bytes:
+        with open(self.temporary_file, "rb") as f:
+            return f.read()
+
+    def test_lines_are_decoded_when_read(self):
+        self.write(b"Line #1\r\nLine #2\r\nLine #3")
+        buffer = BytesBuffer.open(self.temporary_file)
+        self.assertEqual(buffer.newline, "\r\n")
+        self.assertEqual(buffer, ["Line #1\n", "Line #2\n", "Line #3"])
+        buffer[1] = "changed\n"
+        buffer.insert(0, "inserted\n")
+        # Lines read from the file keep their bytes, edited lines are text.
+        self.assertEqual(
+            [getattr(line, "raw", line) for line in buffer], ["inserted\n", b"Line #1\r\n", "changed\n", b"Line #3"]
+        )
+
+    def test_untouched_lines_are_copied_from_the_file(self):
+        self.write(b"".join(b"Line #%d\r\n" % i for i in range(10_000)))
+        document = Document(self.temporary_file, "bytes")
+        document.insert_line("!", 5000)
+        report = document.save()
+        self.assertEqual(report.bytes_written - report.bytes_copied, len(b"Line #4999!\r\n"))
+        self.assertEqual(self.read().splitlines()[4998:5001], [b"Line #4998", b"Line #4999!", b"Line #5000"])
+
+    def test_untouched_lines_are_saved_byte_for_byte(self):
+        self.write(b"a\r\nb\nc\n")
+        document = Document(self.temporary_file, "bytes")
+        document.insert_line("!", 3)
+        document.save()
+        self.assertEqual(self.read(), b"a\r\nb\nc!\r\n")
+
+        # Swapped, moved and restored lines keep their own line breaks.
+        document.swap_lines(1, 2)
+        document.move_lines(3, 3, 0)
+        document.save()
+        self.assertEqual(self.read(), b"c!\r\nb\na\r\n")
+        document.undo(3)
+        document.save()
+        self.assertEqual(self.read(), b"a\r\nb\nc\n")
+
+    def test_new_lines_use_the_detected_line_break(self):
+        self.write(b"a\r\nb")
+        document = Document(self.temporary_file, "bytes")
+        document.insert_line("c")
+        document.save()
+        self.assertEqual(self.read(), b"a\r\nb\r\nc")
+
+        document.clear()
+        document.insert_line("x")
+        document.insert_line("y")
+        document.save()
+        self.assertEqual(self.read(), b"x\r\ny")
+
+    def test_invalid_utf8_is_kept_until_edited(self):
+        self.write(b"Line #1\n\xff\xfe\nLine #3\n")
+        document = Document(self.temporary_file, "bytes")
+        document.swap_lines(1, 3)
+        document.save()
+        self.assertEqual(self.read(), b"Line #3\n\xff\xfe\nLine #1\n")
+        with self.assertRaises(InvalidEncoding) as context:
+            document.insert_line("!", 2)
+        self.assertEqual(context.exception.offset, 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+from editor.commands import COMMANDS, TEXT, LineRange, command, number, parse, tokenize
+from editor.exceptions import *
+
+
+class TestCommands(unittest.TestCase):
+    def test_tokenize_words(self):
+        self.assertEqual(tokenize("swap 1 2"), (["swap", "1", "2"], None))
+
+    def test_tokenize_text(self):
+        self.assertEqual(tokenize('insert 1 "a "quoted" text"'), (["insert", "1"], 'a "quoted" text'))
+
+    def test_tokenize_unterminated_text(self):
+        with self.assertRaises(UnknownCommand):
+            tokenize('insert 1 "text')
+
+    def test_parse_every_insert_form(self):
+        self.assertEqual(parse('insert "text"').args, ("text",))
+        self.assertEqual(parse('insert 1 "text"').args, (1, "text"))
+        self.assertEqual(parse('insert 1 2 "text"').args, (1, 2, "text"))
+
+    def test_parse_optional_count(self):
+        self.assertEqual(parse("undo").args, ())
+        self.assertEqual(parse("undo 3").args, (3,))
+
+    def test_parse_text_pair(self):
+        self.assertEqual(parse('replace "old" "new"').args, ("old", "new"))
+        self.assertEqual(parse('replace 1 2 "a" "b c"').args, (1, 2, "a", "b c"))
+        self.assertEqual(parse('replace "old" ""').args, ("old", ""))
+        self.assertEqual(str(parse('replace-re 1 2 "a" "b c"')), 'replace-re 1 2 "a" "b c"')
+        for line in ('replace "old"', 'replace "" "new"'):
+            with self.subTest(line=line), self.assertRaises(UnknownCommand):
+                parse(line)
+
+    def test_parse_line_ranges(self):
+        self.assertEqual(parse("delete 3").args, (3,))
+        self.assertEqual(parse("delete 10-50000").args, (LineRange(10, 50000),))
+        self.assertEqual(parse("move 1-2 9").args, (LineRange(1, 2), 9))
+        self.assertEqual(str(parse("swap-range 1-2 5")), "swap-range 1-2 5")
+        for line in ("delete 1-", "delete -2", "delete 1-2-3", "move 1-2", "copy 1 2-3"):
+            with self.subTest(line=line), self.assertRaises(UnknownCommand):
+                parse(line)
+
+    def test_unknown_commands(self):
+        for line in ("", "frobnicate", "delete", "delete x", "delete 1 2", "save ", 'insert ""', "clear 1", '"text"'):
+            with self.subTest(line=line), self.assertRaises(UnknownCommand):
+                parse(line)
+
+    def test_str_is_parseable(self):
+        parsed = parse('insert 3 1 "text"')
+        self.assertEqual(str(parsed), 'insert 3 1 "text"')
+        self.assertEqual(parse(str(parsed)), parsed)
+
+    def test_register_command(self):
+        @command("shout", (number, TEXT))
+        def shout(document, times, text):
+            return text.upper() * times
+
+        self.addCleanup(COMMANDS.pop, "shout")
+        self.assertEqual(parse('shout 2 "a"').execute(None), "AA")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,10 @@
 import os
 import pathlib
+import random
 import unittest
 import unittest.mock
 
+from editor.diff import unified_hunks
 from editor.document import Document
 from editor.exceptions import *
 
@@ -181,6 +183,108 @@ class TestDocument(unittest.TestCase):
             document.undo()
             self.assertEqual(document.current_content, ["Line #1\n", "Line #2\n", "Line #3"])
 
+    def test_undo_multiple_levels(self):
+        with unittest.mock.patch("sys.argv", ["main.py", self.file_with_3_lines]):
+            document = Document()
+            document.delete_line(3)
+            document.swap_lines(1, 2)
+            document.insert_line("Line #3")
+            document.undo()
+            self.assertEqual(document.current_content, ["Line #2\n", "Line #1\n"])
+            document.undo(2)
+            self.assertEqual(document.current_content, ["Line #1\n", "Line #2\n", "Line #3"])
+
+    def test_undo_without_history(self):
+        with unittest.mock.patch("sys.argv", ["main.py", self.file_with_3_lines]):
+            document = Document()
+            document.undo()
+            self.assertEqual(document.current_content, ["Line #1\n", "Line #2\n", "Line #3"])
+
+    def test_redo(self):
+        with unittest.mock.patch("sys.argv", ["main.py", self.file_with_3_lines]):
+            document = Document()
+            document.insert_line(" is now longer", 1)
+            document.clear()
+            document.undo(2)
+            document.redo()
+            self.assertEqual(document.current_content, ["Line #1 is now longer\n", "Line #2\n", "Line #3"])
+            document.redo()
+            self.assertEqual(document.current_content, [])
+
+    def test_new_edit_drops_redo_history(self):
+        with unittest.mock.patch("sys.argv", ["main.py", self.file_with_3_lines]):
+            document = Document()
+            document.delete_line(1)
+            document.undo()
+            document.delete_line(2)
+            document.redo()
+            self.assertEqual(document.current_content, ["Line #1\n", "Line #3"])
+
+    def test_undo_depth_is_limited(self):
+        with unittest.mock.patch("sys.argv", ["main.py", self.file_with_3_lines]):
+            document = Document()
+            document.journal.max_depth = 2
+            document.delete_line(3)
+            document.delete_line(2)
+            document.delete_line(1)
+            document.undo(3)
+            self.assertEqual(document.current_content, ["Line #1\n", "Line #2\n"])
+
+    def test_apply_batch(self):
+        with unittest.mock.patch("sys.argv", ["main.py", self.file_with_3_lines]):
+            document = Document()
+            document.apply_batch([("insert_line", "> ", line_number, 1) for line_number in (1, 2, 3)])
+            self.assertEqual(document.current_content, ["> Line #1\n", "> Line #2\n", "> Line #3"])
+            document.undo()
+            self.assertEqual(document.current_content, ["Line #1\n", "Line #2\n", "Line #3"])
+
+    def test_apply_batch_uses_starting_line_numbers(self):
+        with unittest.mock.patch("sys.argv", ["main.py", self.file_with_3_lines]):
+            document = Document()
+            document.apply_batch(
+                [("delete_line", 1), ("swap_lines", 2, 3), ("insert_line", "Line #4"), ("insert_line", "!", 4)]
+            )
+            self.assertEqual(document.current_content, ["Line #3\n", "Line #2\n", "Line #4!\n"])
+
+    def test_apply_batch_is_atomic(self):
+        with unittest.mock.patch("sys.argv", ["main.py", self.file_with_3_lines]):
+            document = Document()
+            with self.assertRaises(TooLargeLineNumber):
+                document.apply_batch([("delete_line", 1), ("delete_line", 42)])
+            self.assertEqual(document.current_content, ["Line #1\n", "Line #2\n", "Line #3"])
+            document.close()
+
+    def test_apply_batch_on_deleted_line(self):
+        with unittest.mock.patch("sys.argv", ["main.py", self.file_with_3_lines]):
+            document = Document()
+            with self.assertRaises(LineAlreadyDeleted):
+                document.apply_batch([("delete_line", 2), ("swap_lines", 1, 2)])
+
+    def test_apply_batch_with_many_deletions(self):
+        with open(self.temporary_file, "w", encoding="utf-8") as f:
+            f.writelines(f"Line #{i}\n" for i in range(1, 1001))
+        self.addCleanup(os.remove, self.temporary_file)
+
+        with unittest.mock.patch("sys.argv", ["main.py", self.temporary_file]):
+            document = Document()
+            document.apply_batch([("delete_line", line_number) for line_number in range(1, 1001, 2)])
+            self.assertEqual(document.current_content, [f"Line #{i}\n" for i in range(2, 1001, 2)])
+            document.undo()
+            self.assertEqual(document.number_of_lines, 1000)
+            self.assertFalse(document.has_unsaved_changes)
+
+    def test_swap_identical_lines_is_not_journaled(self):
+        with open(self.temporary_file, "w", encoding="utf-8") as f:
+            f.write("same\nsame\nother\n")
+        self.addCleanup(os.remove, self.temporary_file)
+
+        document = Document(self.temporary_file)
+        document.delete_line(3)
+        document.swap_lines(1, 2)
+        document.undo()
+        self.assertEqual(list(document.current_content), ["same\n", "same\n", "other\n"])
+        document.close()
+
     def test_clear(self):
         with unittest.mock.patch("sys.argv", ["main.py", self.file_with_3_lines]):
             document = Document()
@@ -216,6 +320,59 @@ class TestDocument(unittest.TestCase):
             with self.assertRaises(UnsavedChangesExist):
                 document.close()
 
+    def test_close_after_undoing_all_changes(self):
+        with unittest.mock.patch("sys.argv", ["main.py", self.file_with_3_lines]):
+            document = Document()
+            document.delete_line(3)
+            document.swap_lines(1, 2)
+            document.undo(2)
+            document.close()
+
+    def test_close_with_unsaved_changes_after_redo(self):
+        with unittest.mock.patch("sys.argv", ["main.py", self.file_with_3_lines]):
+            document = Document()
+            document.delete_line(3)
+            document.undo()
+            document.redo()
+            with self.assertRaises(UnsavedChangesExist):
+                document.close()
+
+    def test_close_when_file_was_changed_on_disk(self):
+        with open(self.temporary_file, "w", encoding="utf-8") as f:
+            f.write("Line #1\n")
+        self.addCleanup(os.remove, self.temporary_file)
+
+        with unittest.mock.patch("sys.argv", ["main.py", self.temporary_file]):
+            document = Document()
+            with open(self.temporary_file, "a", encoding="utf-8") as f:
+                f.write("Line #2\n")
+            os.utime(self.temporary_file, ns=(0, 0))
+            with self.assertRaises(UnsavedChangesExist):
+                document.close()
+
+    def test_close_when_file_was_replaced_with_invalid_utf8(self):
+        with open(self.temporary_file, "w", encoding="utf-8") as f:
+            f.write("Line #1\n")
+        self.addCleanup(os.remove, self.temporary_file)
+
+        with unittest.mock.patch("sys.argv", ["main.py", self.temporary_file]):
+            document = Document()
+            replacement = self.temporary_file.with_name("tmp_replacement.txt")
+            replacement.write_bytes(b"Line #1\xff\n")
+            os.replace(replacement, self.temporary_file)
+            with self.assertRaises(UnsavedChangesExist):
+                document.close()
+
+    def test_close_when_file_was_touched_on_disk(self):
+        with open(self.temporary_file, "w", encoding="utf-8") as f:
+            f.write("Line #1\n")
+        self.addCleanup(os.remove, self.temporary_file)
+
+        with unittest.mock.patch("sys.argv", ["main.py", self.temporary_file]):
+            document = Document()
+            os.utime(self.temporary_file, ns=(0, 0))
+            document.close()
+
     def test_insert_to_the_first_line_in_empty_file(self):
         with unittest.mock.patch("sys.argv", ["main.py", self.empty_file]):
             document = Document()
@@ -228,6 +385,254 @@ class TestDocument(unittest.TestCase):
             document.insert_line("Line #1", 1, 1)
             self.assertEqual(document.current_content, ["Line #1\n"])
 
+    def test_find(self):
+        with unittest.mock.patch("sys.argv", ["main.py", self.file_with_3_lines]):
+            document = Document()
+            self.assertEqual(document.find("#"), [(1, "Line #1\n"), (2, "Line #2\n"), (3, "Line #3")])
+            self.assertEqual(document.find(r"#[23]$", regex=True), [(2, "Line #2\n"), (3, "Line #3")])
+            self.assertEqual(document.find("Line", False, 2, 2), [(2, "Line #2\n")])
+            self.assertEqual(document.find("Nothing"), [])
+
+    def test_find_in_wrong_range(self):
+        with unittest.mock.patch("sys.argv", ["main.py", self.file_with_3_lines]):
+            document = Document()
+            self.assertRaises(ZeroLineNumber, document.find, "Line", False, 0, 1)
+            self.assertRaises(TooLargeLineNumber, document.find, "Line", False, 1, 4)
+            self.assertRaises(WrongLineRange, document.find, "Line", False, 3, 2)
+            self.assertRaises(InvalidPattern, document.find, "(", True)
+
+    def test_search_index_follows_edits(self):
+        with unittest.mock.patch("sys.argv", ["main.py", self.file_with_3_lines]):
+            document = Document()
+            self.assertEqual([n for n, _ in document.find("#3")], [3])
+            document.delete_line(1)
+            document.insert_line(" #3", 1)
+            self.assertEqual([n for n, _ in document.find("#3")], [1, 2])
+            document.swap_lines(1, 2)
+            document.insert_line("Line #3")
+            self.assertEqual([n for n, _ in document.find("#3")], [1, 2, 3])
+            document.undo(3)
+            self.assertEqual([n for n, _ in document.find("#3")], [2])
+            document.clear()
+            self.assertEqual(document.find("#3"), [])
+            document.undo()
+            self.assertEqual(document.find("#3"), [(2, "Line #3")])
+
+    def test_replace(self):
+        with unittest.mock.patch("sys.argv", ["main.py", self.file_with_3_lines]):
+            document = Document()
+            self.assertEqual(document.replace("Line", "Row", False, 2, 3), (2, 2))
+            self.assertEqual(document.current_content, ["Line #1\n", "Row #2\n", "Row #3"])
+            self.assertEqual(document.replace(r"(\w+) #(\d)", r"\2 \1", regex=True), (3, 3))
+            self.assertEqual(document.current_content, ["1 Line\n", "2 Row\n", "3 Row"])
+            self.assertEqual(document.find("Row"), [(2, "2 Row\n"), (3, "3 Row")])
+            document.undo()
+            self.assertEqual(document.find("Row"), [(2, "Row #2\n"), (3, "Row #3")])
+
+    def test_replace_with_line_break(self):
+        with unittest.mock.patch("sys.argv", ["main.py", self.file_with_3_lines]):
+            document = Document()
+            self.assertRaises(InvalidPattern, document.replace, "#", r"\n", True)
+            self.assertEqual(document.current_content, ["Line #1\n", "Line #2\n", "Line #3"])
+
+    def make_numbered_file(self, number_of_lines: int) -> None:
+        with open(self.temporary_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(f"{i}" for i in range(1, number_of_lines + 1)))
+        self.addCleanup(os.remove, self.temporary_file)
+
+    def test_delete_lines(self):
+        self.make_numbered_file(1000)
+        with unittest.mock.patch("sys.argv", ["main.py", self.temporary_file]):
+            document = Document()
+            self.assertEqual([n for n, _ in document.find("^99", regex=True)], [99, *range(990, 1000)])
+            document.delete_lines(10, 990)
+            self.assertEqual(
+                list(document.current_content),
+                [*(f"{i}\n" for i in range(1, 10)), *(f"{i}\n" for i in range(991, 1000)), "1000"],
+            )
+            self.assertEqual([n for n, _ in document.find("^99", regex=True)], list(range(10, 19)))
+            document.undo()
+            self.assertEqual(document.number_of_lines, 1000)
+            self.assertEqual([n for n, _ in document.find("^99", regex=True)], [99, *range(990, 1000)])
+            self.assertFalse(document.has_unsaved_changes)
+
+    def test_move_lines(self):
+        self.make_numbered_file(6)
+        with unittest.mock.patch("sys.argv", ["main.py", self.temporary_file]):
+            document = Document()
+            self.assertEqual([n for n, _ in document.find("[23]", regex=True)], [2, 3])
+            document.move_lines(2, 3, 5)
+            self.assertEqual(list(document.current_content), ["1\n", "4\n", "5\n", "2\n", "3\n", "6"])
+            self.assertEqual([n for n, _ in document.find("[23]", regex=True)], [4, 5])
+            document.move_lines(4, 5, 0)
+            self.assertEqual(list(document.current_content), ["2\n", "3\n", "1\n", "4\n", "5\n", "6"])
+            # The last line gets a line break once other lines follow it.
+            document.move_lines(1, 1, 6)
+            self.assertEqual(list(document.current_content), ["3\n", "1\n", "4\n", "5\n", "6\n", "2\n"])
+            document.move_lines(5, 6, 1)
+            self.assertEqual(list(document.current_content), ["3\n", "6\n", "2\n", "1\n", "4\n", "5\n"])
+            document.undo(4)
+            self.assertEqual(list(document.current_content), ["1\n", "2\n", "3\n", "4\n", "5\n", "6"])
+            document.redo()
+            self.assertEqual(list(document.current_content), ["1\n", "4\n", "5\n", "2\n", "3\n", "6"])
+
+    def test_copy_lines(self):
+        self.make_numbered_file(3)
+        with unittest.mock.patch("sys.argv", ["main.py", self.temporary_file]):
+            document = Document()
+            document.copy_lines(2, 3, 1)
+            self.assertEqual(list(document.current_content), ["1\n", "2\n", "3\n", "2\n", "3"])
+            document.copy_lines(1, 2, 5)
+            self.assertEqual(list(document.current_content), ["1\n", "2\n", "3\n", "2\n", "3\n", "1\n", "2\n"])
+            document.insert_line("!", 1)
+            document.undo(3)
+            self.assertEqual(list(document.current_content), ["1\n", "2\n", "3"])
+
+    def test_swap_ranges(self):
+        self.make_numbered_file(7)
+        with unittest.mock.patch("sys.argv", ["main.py", self.temporary_file]):
+            document = Document()
+            document.swap_ranges((6, 7), (1, 3))
+            self.assertEqual(list(document.current_content), ["6\n", "7\n", "4\n", "5\n", "1\n", "2\n", "3\n"])
+            document.swap_ranges((1, 2), (3, 3))
+            self.assertEqual(list(document.current_content), ["4\n", "6\n", "7\n", "5\n", "1\n", "2\n", "3\n"])
+            document.undo(2)
+            self.assertEqual(list(document.current_content), [f"{i}\n" for i in range(1, 7)] + ["7"])
+
+    def test_range_errors(self):
+        self.make_numbered_file(5)
+        with unittest.mock.patch("sys.argv", ["main.py", self.temporary_file]):
+            document = Document()
+            self.assertRaises(ZeroLineNumber, document.delete_lines, 0, 2)
+            self.assertRaises(TooLargeLineNumber, document.delete_lines, 2, 6)
+            self.assertRaises(WrongLineRange, document.delete_lines, 3, 2)
+            self.assertRaises(TooLargeLineNumber, document.move_lines, 1, 2, 6)
+            self.assertRaises(LinesMovedIntoThemselves, document.move_lines, 1, 3, 2)
+            self.assertRaises(TooLargeLineNumber, document.copy_lines, 1, 2, 6)
+            self.assertRaises(LineRangesOverlap, document.swap_ranges, (1, 3), (3, 4))
+            document.move_lines(2, 3, 3)
+            self.assertFalse(document.journal.can_undo)
+
+    def test_diff(self):
+        self.make_numbered_file(20)
+        document = Document(self.temporary_file)
+        self.assertEqual(document.diff(), "")
+        document.insert_line("!", 5)
+        document.delete_line(12)
+        document.insert_line("21")
+        self.assertEqual(
+            document.diff().splitlines()[2:],
+            [
+                "@@ -2,14 +2,13 @@",
+                *(f" {i}" for i in range(2, 5)),
+                "-5",
+                "+5!",
+                *(f" {i}" for i in range(6, 12)),
+                "-12",
+                *(f" {i}" for i in range(13, 16)),
+                "@@ -17,4 +16,5 @@",
+                " 17",
+                " 18",
+                " 19",
+                "-20",
+                "\\ No newline at end of file",
+                "+20",
+                "+21",
+                "\\ No newline at end of file",
+            ],
+        )
+        document.undo(3)
+        self.assertEqual(document.diff(), "")
+
+    @staticmethod
+    def apply_diff(lines: list[str], diff: str) -> list[str]:
+        result, position = [], 0
+        for line in diff.splitlines()[2:]:
+            if line.startswith("@@"):
+                start = int(line.split()[1][1:].split(",")[0])
+                length = int(line.split()[1].split(",")[1]) if "," in line.split()[1] else 1
+                start = start if length else start + 1
+                result.extend(lines[position : start - 1])
+                position = start - 1
+            elif line.startswith("\\"):
+                result[-1] = result[-1].removesuffix("\n")
+            elif line[0] in " +":
+                result.append(f"{line[1:]}\n")
+            if line[0] in " -":
+                position += 1
+        return [*result, *lines[position:]]
+
+    def test_diff_of_random_edits(self):
+        self.make_numbered_file(300)
+        generator = random.Random(3)
+        document = Document(self.temporary_file)
+        document.line_map.max_runs = 8
+        with open(self.temporary_file, "r", encoding="utf-8") as f:
+            file_lines = f.readlines()
+        for _ in range(60):
+            size = document.number_of_lines
+            first = generator.randint(1, size)
+            last = min(size, first + generator.randint(0, 5))
+            match generator.randrange(6):
+                case 0:
+                    document.insert_line("!", first)
+                case 1:
+                    document.insert_line(f"{generator.random()}", first, 1)
+                case 2 if size > 50:
+                    document.delete_lines(first, last)
+                case 3:
+                    document.move_lines(first, last, generator.choice([0, *range(last, size + 1)]))
+                case 4:
+                    document.copy_lines(first, last, generator.randint(0, size))
+                case 5 if document.journal.can_undo:
+                    document.undo()
+            self.assertEqual(self.apply_diff(file_lines, document.diff()), list(document.current_content))
+
+    def test_diff_reads_only_edited_lines(self):
+        self.make_numbered_file(100_000)
+        document = Document(self.temporary_file)
+        document.insert_line("!", 50_000)
+        document.move_lines(70_000, 70_010, 60_000)
+        with unittest.mock.patch("editor.document.unified_hunks", wraps=unified_hunks) as hunks:
+            lines = document.diff().splitlines()
+        self.assertLess(sum(len(call.args[0]) for call in hunks.call_args_list), 50)
+        self.assertEqual(lines[2:6], ["@@ -49997,7 +49997,7 @@", " 49997", " 49998", " 49999"])
+        self.assertEqual(sum(line.startswith("@@") for line in lines), 3)
+        self.assertEqual(sum(line.startswith(("-", "+")) for line in lines[2:]), 2 + 22)
+
+        # Once the file is changed by someone else, the whole of it is compared.
+        with open(self.temporary_file, "a", encoding="utf-8") as f:
+            f.write("\nappended")
+        with unittest.mock.patch("editor.document.unified_hunks", wraps=unified_hunks) as hunks:
+            lines = document.diff().splitlines()
+        self.assertEqual(len(hunks.call_args.args[0]), 100_001)
+        self.assertIn("-appended", lines)
+
+
+class TestDocumentWithRopeEngine(TestDocument):
+    def setUp(self):
+        patcher = unittest.mock.patch.object(Document, "default_engine", "rope")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_unknown_engine(self):
+        with unittest.mock.patch("sys.argv", ["main.py", self.file_with_3_lines]):
+            self.assertRaises(UnknownBufferEngine, Document, engine="no-such-engine")
+
+
+class TestDocumentWithMappedEngine(TestDocument):
+    def setUp(self):
+        patcher = unittest.mock.patch.object(Document, "default_engine", "mapped")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TestDocumentWithBytesEngine(TestDocument):
+    def setUp(self):
+        patcher = unittest.mock.patch.object(Document, "default_engine", "bytes")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,121 @@
+import io
+import os
+import pathlib
+import unittest
+import unittest.mock
+
+from editor import Editor
+from editor.exceptions import *
+
+
+class TestEditorScript(unittest.TestCase):
+    temporary_file = pathlib.Path("files", "tmp_editor.txt")
+
+    def setUp(self):
+        with open(self.temporary_file, "w", encoding="utf-8") as f:
+            f.write("Line #1\nLine #2\nLine #3")
+        self.addCleanup(os.remove, self.temporary_file)
+        self.editor = Editor(self.temporary_file)
+
+    def run_script(self, script: str, keep_going: bool = False) -> tuple[int, str]:
+        with unittest.mock.patch("sys.stderr", new_callable=io.StringIO) as stderr:
+            status = self.editor.run_script(io.StringIO(script), keep_going)
+        return status, stderr.getvalue()
+
+    def test_parse_insert(self):
+        command = self.editor.parse('insert 2 3 "text with "quotes""')
+        self.assertEqual(command.name, "insert")
+        self.assertEqual(command.args, (2, 3, 'text with "quotes"'))
+
+    def test_parse_unknown_command(self):
+        with self.assertRaises(UnknownCommand):
+            self.editor.parse("delete")
+
+    def test_run_script(self):
+        status, errors = self.run_script('# comment\ndelete 1\n\ninsert 1 "!"\nswap 1 2\nsave\nclose\n')
+        self.assertEqual((status, errors), (0, ""))
+        with open(self.temporary_file, "r", encoding="utf-8") as f:
+            self.assertEqual(f.readlines(), ["Line #3\n", "Line #2!\n"])
+
+    def test_unknown_command_stops_script_before_applying_anything(self):
+        status, errors = self.run_script("delete 1\nfrobnicate\n")
+        self.assertEqual(status, 1)
+        self.assertEqual(errors, "Line 2: Error! Unknown command.\n")
+        self.assertEqual(self.editor.document.number_of_lines, 3)
+
+    def test_failed_command_stops_script(self):
+        status, errors = self.run_script("delete 42\ndelete 1\n")
+        self.assertEqual(status, 1)
+        self.assertTrue(errors.startswith("Line 1: Error! You can't access the line №42."))
+        self.assertEqual(self.editor.document.number_of_lines, 3)
+
+    def test_keep_going(self):
+        status, errors = self.run_script("delete 42\nfrobnicate\ndelete 1\n", keep_going=True)
+        self.assertEqual(status, 1)
+        self.assertEqual(len(errors.splitlines()), 2)
+        self.assertEqual(self.editor.document.current_content, ["Line #2\n", "Line #3"])
+
+    def test_diff_command(self):
+        with unittest.mock.patch("sys.stdout", new_callable=io.StringIO) as stdout:
+            status, errors = self.run_script("diff\ndelete 1\ndiff\n")
+        self.assertEqual((status, errors), (0, ""))
+        self.assertEqual(
+            stdout.getvalue().splitlines()[1:],
+            [f"--- {self.temporary_file}", f"+++ {self.temporary_file} (unsaved)", "@@ -1,3 +1,2 @@", "-Line #1"]
+            + [" Line #2", " Line #3", "\\ No newline at end of file"],
+        )
+        self.assertEqual(stdout.getvalue().splitlines()[0], "No changes.")
+
+    def test_close_with_unsaved_changes(self):
+        status, errors = self.run_script("delete 1\nclose\n")
+        self.assertEqual(status, 1)
+        self.assertEqual(errors, "Line 2: Error! The file has unsaved changes.\n")
+
+    def test_invalid_utf8_is_reported(self):
+        with open(self.temporary_file, "wb") as f:
+            f.write(b"Line #1\n\xff\xfe\n")
+        self.editor = Editor(self.temporary_file, engine="mapped")
+        status, errors = self.run_script('delete 1\nfind "zz"\ninsert "!"\n', keep_going=True)
+        self.assertEqual(status, 1)
+        # Only the commands that read the invalid line fail; the line next to it can still be deleted.
+        self.assertEqual([error.split(":")[0] for error in errors.splitlines()], ["Line 2", "Line 3"])
+        self.assertIn("Error! Following file isn't valid UTF-8 at byte 8:", errors)
+        self.assertEqual(self.editor.document.number_of_lines, 1)
+
+        inputs = iter(['find "zz"', "undo", "close"])
+        with unittest.mock.patch("builtins.input", lambda prompt: next(inputs)), unittest.mock.patch(
+            "sys.stdout", new_callable=io.StringIO
+        ) as stdout, self.assertRaises(SystemExit):
+            self.editor.start()
+        self.assertIn("isn't valid UTF-8", stdout.getvalue())
+
+
+class TestEditorStats(unittest.TestCase):
+    def test_commands_are_counted_by_phase(self):
+        editor = Editor(pathlib.Path("files", "file_with_3_lines.txt"))
+        with unittest.mock.patch("sys.stderr", new_callable=io.StringIO):
+            editor.run_script(["delete 1", "delete 42", "undo", "close"], keep_going=True)
+
+        commands = editor.stats.to_dict(editor.document)["commands"]
+        self.assertEqual(commands["delete"]["parse"]["count"], 2)
+        self.assertEqual(commands["delete"]["apply"]["count"], 2)
+        self.assertEqual(commands["delete"]["backup"]["count"], 1)
+        self.assertEqual(commands["delete"]["errors"], 1)
+        self.assertEqual(commands["close"]["io"]["count"], 1)
+
+    def test_stats_command(self):
+        editor = Editor(pathlib.Path("files", "file_with_3_lines.txt"))
+        editor.execute(editor.parse("swap 1 2"))
+        report = editor.execute(editor.parse("stats"))
+        self.assertIn("Buffer: 3 lines (list engine)", report)
+        self.assertIn("swap", report)
+
+    def test_disabled_stats(self):
+        editor = Editor(pathlib.Path("files", "file_with_3_lines.txt"), stats=False)
+        editor.execute(editor.parse("swap 1 2"))
+        self.assertIsNone(editor.document.stats)
+        self.assertEqual(editor.execute(editor.parse("stats")), "Statistics are disabled.")
+
+
+if __name__ == "__main__":
+    unittest.main()
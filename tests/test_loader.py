@@ -0,0 +1,122 @@
+import os
+import pathlib
+import threading
+import unittest
+import unittest.mock
+
+from editor.document import Document
+from editor.loader import BackgroundLoader
+from editor.exceptions import *
+
+
+class GatedLoader(BackgroundLoader):
+    """
+    Loader that reads a chunk of about 80 bytes only when the test releases it.
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.gate = threading.Semaphore(0)
+        super().__init__(path, 80)
+
+    def _read(self, file) -> list[bytes]:
+        self.gate.acquire()
+        return super()._read(file)
+
+    def release_all(self) -> None:
+        self.gate.release(1000)
+
+
+class TestBackgroundLoader(unittest.TestCase):
+    temporary_file = pathlib.Path("files", "tmp_loader.txt")
+    lines = [f"line {i}\n" for i in range(100)]
+
+    def make_file(self, data: bytes) -> None:
+        with open(self.temporary_file, "wb") as f:
+            f.write(data)
+        self.addCleanup(os.remove, self.temporary_file)
+
+    def open_gated(self, engine: str = "list") -> tuple[Document, GatedLoader]:
+        with unittest.mock.patch("editor.document.BackgroundLoader", GatedLoader):
+            document = Document(self.temporary_file, engine, background=True)
+        self.addCleanup(document.loader.release_all)
+        return document, document.loader
+
+    def test_lines_match_a_file_read_at_once(self):
+        self.make_file(b"".join(f"line {i}\r\n".encode() for i in range(20_000)) + b"cr\rmixed\r\nunicode \xc3\xa9")
+        for engine in ("list", "rope"):
+            with self.subTest(engine=engine):
+                document = Document(self.temporary_file, engine, background=True)
+                self.assertEqual(
+                    list(document.current_content), list(Document(self.temporary_file, engine).current_content)
+                )
+
+    def test_commands_on_loaded_lines_dont_wait_for_the_file(self):
+        self.make_file("".join(self.lines).encode())
+        for engine in ("list", "rope"):
+            with self.subTest(engine=engine):
+                document, loader = self.open_gated(engine)
+                loader.gate.release()
+                document.delete_line(3)
+                document.swap_lines(1, 2)
+                document.insert_line("!", 4, 1)
+                self.assertEqual(document.find("line", False, 1, 2), [(1, "line 1\n"), (2, "line 0\n")])
+                document.undo()
+                self.assertIsNotNone(document.loader)
+                self.assertLess(loader.lines_read, len(self.lines))
+
+                # Lines past the loaded ones are waited for, and only them.
+                threading.Timer(0.05, loader.gate.release).start()
+                document.delete_lines(12, 13)
+                self.assertIsNotNone(document.loader)
+
+                loader.release_all()
+                expected = self.lines.copy()
+                del expected[2]
+                expected[:2] = expected[1::-1]
+                del expected[11:13]
+                self.assertEqual(list(document.current_content), expected)
+                self.assertIsNone(document.loader)
+
+    def test_appends_are_queued_until_the_file_is_loaded(self):
+        self.make_file("".join(self.lines).encode() + b"no line break")
+        document, loader = self.open_gated()
+        loader.gate.release()
+        document.insert_line("appended")
+        document.insert_line("appended again")
+        self.assertEqual(document.queued_appends, ["appended", "appended again"])
+
+        # The next command waits for the whole file, then applies the appends before it runs.
+        loader.release_all()
+        document.undo()
+        self.assertEqual(list(document.current_content), [*self.lines, "no line break\n", "appended"])
+        document.undo()
+        self.assertEqual(list(document.current_content), [*self.lines, "no line break"])
+
+    def test_invalid_encoding_is_reported_for_lines_past_it(self):
+        self.make_file("".join(self.lines).encode() + b"\xff\n")
+        document, loader = self.open_gated()
+        loader.release_all()
+        document.delete_line(1)
+        with self.assertRaises(InvalidEncoding) as context:
+            document.delete_line(101)
+        self.assertEqual(context.exception.offset, len("".join(self.lines)))
+
+    def test_save_and_close_while_loading(self):
+        self.make_file("".join(self.lines).encode())
+        document, loader = self.open_gated()
+        loader.gate.release()
+        # Closing an unedited document doesn't wait for the rest of the file.
+        document.close()
+        self.assertLess(loader.lines_read, len(self.lines))
+
+        document, loader = self.open_gated()
+        loader.gate.release()
+        document.delete_line(1)
+        loader.release_all()
+        document.save()
+        with open(self.temporary_file, "r", encoding="utf-8") as f:
+            self.assertEqual(f.readlines(), self.lines[1:])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import pathlib
+import random
+import unittest
+
+from editor.document import Document
+from editor.exceptions import *
+from editor.long_line import LONG_LINE_THRESHOLD, GapLine
+
+
+class TestGapLine(unittest.TestCase):
+    def test_matches_string_edits(self):
+        generator = random.Random(42)
+        line = "".join(generator.choice("abcdef") for _ in range(10_000))
+        gap_line = GapLine(line)
+        for _ in range(2_000):
+            position = generator.randint(0, len(line))
+            if generator.random() < 0.7 or position == len(line):
+                text = "x" * generator.randint(0, 20)
+                gap_line.insert(position, text)
+                line = f"{line[:position]}{text}{line[position:]}"
+            else:
+                length = generator.randint(1, min(100, len(line) - position))
+                self.assertEqual(gap_line.cut(position, length), line[position : position + length])
+                line = f"{line[:position]}{line[position + length:]}"
+            self.assertEqual(len(gap_line), len(line))
+        self.assertEqual(str(gap_line), line)
+
+    def test_nearby_inserts_share_the_line(self):
+        line = "a" * 100_000
+        gap_line = GapLine(line)
+        for position in range(50_000, 50_100):
+            gap_line.insert(position, "!")
+        # The inserts were merged into one piece between the two halves of the original line.
+        self.assertEqual(len(gap_line.before) + len(gap_line.after), 3)
+        self.assertTrue(all(text is line for text, _, _ in (gap_line.before[0], gap_line.after[0])))
+
+
+class TestLongLineDocument(unittest.TestCase):
+    temporary_file = pathlib.Path("files", "tmp_long_line.txt")
+    long_line = "0123456789" * (LONG_LINE_THRESHOLD // 10 + 1) + "\n"
+
+    def setUp(self):
+        with open(self.temporary_file, "w", encoding="utf-8") as f:
+            f.write(f"short\n{self.long_line}last")
+        self.addCleanup(os.remove, self.temporary_file)
+        self.addCleanup(pathlib.Path("files", ".tmp_long_line.txt.wal").unlink, missing_ok=True)
+
+    def test_column_inserts(self):
+        for engine in ("list", "rope", "mapped"):
+            with self.subTest(engine=engine):
+                document = Document(self.temporary_file, engine)
+                expected = [self.long_line]
+                for column in (11, 12, 13, 1, len(self.long_line)):
+                    document.insert_line("<>", 2, column)
+                    expected.append(f"{expected[-1][:column - 1]}<>{expected[-1][column - 1:]}")
+                self.assertEqual(list(document.current_content), ["short\n", expected[-1], "last"])
+
+                # The journal keeps the inserted texts instead of copies of the line.
+                self.assertLess(document.journal.size, 100)
+                document.undo(2)
+                document.redo()
+                document.insert_line("!", 1)
+                self.assertEqual(document.current_content[1], expected[-2])
+                self.assertEqual(document.current_content[0], "short!\n")
+
+    def test_errors_are_unchanged(self):
+        document = Document(self.temporary_file)
+        with self.assertRaises(ZeroColumnNumber):
+            document.insert_line("!", 2, 0)
+        with self.assertRaises(TooLargeColumnNumber):
+            document.insert_line("!", 2, len(self.long_line) + 1)
+        with self.assertRaises(TooLargeLineNumber):
+            document.insert_line("!", 4, 1)
+        document.insert_line("!", 2, len(self.long_line))
+        self.assertEqual(document.current_content[1], f"{self.long_line[:-1]}!\n")
+
+    def test_range_commands_keep_column_inserts(self):
+        long_line = self.long_line.removesuffix("\n")
+        edited_line = f"H{long_line}"
+        cases = [
+            ("move", "a\n", lambda document: document.move_lines(1, 1, 2), [f"{edited_line}\n", "a\n"]),
+            ("copy", "a\n", lambda document: document.copy_lines(2, 2, 0), [f"{edited_line}\n", "a\n", edited_line]),
+            (
+                "swap-range",
+                "a\n\n",
+                lambda document: document.swap_ranges((1, 1), (3, 3)),
+                [f"{edited_line}\n", "\n", "a\n"],
+            ),
+        ]
+        for name, head, command, expected in cases:
+            with self.subTest(command=name):
+                with open(self.temporary_file, "w", encoding="utf-8") as f:
+                    f.write(f"{head}{long_line}")
+                document = Document(self.temporary_file)
+                document.insert_line("H", head.count("\n") + 1, 1)
+                command(document)
+                self.assertEqual(list(document.current_content), expected)
+                document.undo()
+                self.assertEqual(list(document.current_content), [*head.splitlines(keepends=True), edited_line])
+
+    def test_search_save_and_recovery(self):
+        document = Document(self.temporary_file)
+        document.enable_wal()
+        self.assertEqual(len(document.find("<>")), 0)
+        document.insert_line("<>", 2, 5)
+        document.insert_line("<>", 2, 8)
+        self.assertEqual([line_number for line_number, _ in document.find("<>")], [2])
+
+        recovered = Document(self.temporary_file)
+        self.assertEqual(recovered.enable_wal(), 2)
+        self.assertEqual(recovered.current_content[1], document.current_content[1])
+
+        document.save()
+        with open(self.temporary_file, "r", encoding="utf-8") as f:
+            self.assertEqual(f.readlines()[1], f"0123<>4<>{self.long_line[5:]}")
+        document.close()
@@ -0,0 +1,48 @@
+import os
+import pathlib
+import shutil
+import unittest
+
+from editor.editor import parse_script
+from editor.parallel import edit_files, expand_paths
+
+
+class TestEditFiles(unittest.TestCase):
+    directory = pathlib.Path("files", "tmp_parallel")
+
+    def setUp(self):
+        (self.directory / "nested").mkdir(parents=True)
+        self.addCleanup(shutil.rmtree, self.directory)
+        for i in range(8):
+            with open(self.directory / "nested" / f"file_{i}.txt", "w", encoding="utf-8") as f:
+                f.write(f"Line #1 of {i}\nLine #2 of {i}\n")
+        with open(self.directory / "short.txt", "w", encoding="utf-8") as f:
+            f.write("Only line\n")
+
+        self.commands, errors = parse_script(["swap 1 2", "save"])
+        self.assertEqual(errors, [])
+
+    def test_expand_paths(self):
+        paths = expand_paths([os.path.join(self.directory, "**", "*.txt"), "missing.txt", "missing.txt"])
+        self.assertEqual(len(paths), 10)
+        self.assertIn(str(self.directory / "short.txt"), paths)
+        self.assertEqual(paths[-1], "missing.txt")
+
+    def check_results(self, workers: int):
+        paths = expand_paths([os.path.join(self.directory, "nested", "*.txt"), str(self.directory / "short.txt")])
+        results = list(edit_files([*paths, "missing.txt"], self.commands, workers=workers, chunksize=2))
+
+        self.assertEqual([result.path for result in results], [*paths, "missing.txt"])
+        self.assertTrue(all(result.ok for result in results[:8]))
+        self.assertEqual(results[8].errors[0][0], 1)
+        self.assertIn("Line 1: Error! You can't access the line №2.", str(results[8]))
+        self.assertEqual(str(results[9]), "missing.txt: Error! Following path doesn't exist: missing.txt")
+
+        with open(self.directory / "nested" / "file_3.txt", "r", encoding="utf-8") as f:
+            self.assertEqual(f.readlines(), ["Line #2 of 3\n", "Line #1 of 3\n"])
+
+    def test_edit_files_in_this_process(self):
+        self.check_results(workers=1)
+
+    def test_edit_files_in_a_pool(self):
+        self.check_results(workers=3)
@@ -0,0 +1,113 @@
+import os
+import pathlib
+import random
+import time
+import unittest
+
+from editor.document import Document
+from editor.search import SearchIndex
+
+
+class TestSearchIndex(unittest.TestCase):
+    temporary_file = pathlib.Path("files", "tmp_search.txt")
+
+    def make_file(self, lines: list[str]) -> None:
+        with open(self.temporary_file, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        self.addCleanup(os.remove, self.temporary_file)
+
+    def small_index(self, document: Document) -> None:
+        # Small blocks make the edits split, merge and move blocks, and leave some of them unindexed.
+        document.search_index = SearchIndex()
+        document.search_index.block_size = 4
+
+    def test_matches_a_scan_after_random_edits(self):
+        words = ["alpha", "beta", "gamma", "delta"]
+        generator = random.Random(7)
+        self.make_file([f"{generator.choice(words)} {i}\n" for i in range(60)])
+
+        for engine in ("list", "rope", "mapped"):
+            with self.subTest(engine=engine):
+                document = Document(self.temporary_file, engine)
+                self.small_index(document)
+                for step in range(300):
+                    number_of_lines = document.number_of_lines
+                    line_number = generator.randint(1, number_of_lines)
+                    other_number = generator.randint(1, number_of_lines)
+                    first, last = sorted((line_number, other_number))
+                    match generator.randrange(9):
+                        case 0:
+                            document.insert_line(f" {generator.choice(words)}", line_number)
+                        case 1 if number_of_lines < 150:
+                            document.insert_line(generator.choice(words))
+                        case 2 if number_of_lines > 10:
+                            document.delete_line(line_number)
+                        case 3 if number_of_lines > 20 and last - first < 8:
+                            document.delete_lines(first, last)
+                        case 4 if first > 1:
+                            document.move_lines(first, last, generator.randint(0, first - 1))
+                        case 5 if number_of_lines < 150:
+                            document.copy_lines(first, last, generator.randint(0, number_of_lines))
+                        case 6 if line_number != other_number:
+                            document.swap_lines(line_number, other_number)
+                        case 7 if document.journal.undo_stack:
+                            document.undo()
+                        case 8 if document.journal.redo_stack:
+                            document.redo()
+
+                    last = min(last, document.number_of_lines)
+                    first = min(first, last)
+                    pattern = generator.choice([*words, "a", "ta", " 1"])
+                    lines = list(document.current_content)
+                    expected = [(n, line) for n, line in enumerate(lines, 1) if pattern in line]
+                    self.assertEqual(document.find(pattern), expected, f"step {step}")
+                    self.assertEqual(
+                        document.find(pattern, False, first, last), [(n, l) for n, l in expected if first <= n <= last]
+                    )
+                self.assertEqual(sum(block.size for block in document.search_index.blocks), document.number_of_lines)
+
+    def test_literal_search_scans_only_candidate_blocks(self):
+        self.make_file([f"line {i}\n" for i in range(1000)] + ["needle\n"])
+        document = Document(self.temporary_file)
+        self.assertEqual(document.find("needle"), [(1001, "needle\n")])
+
+        read = []
+        content = document.current_content
+        copy_range = content.copy_range
+        content.copy_range = lambda start, stop: read.append(stop - start) or copy_range(start, stop)
+        document.insert_line("needle", 3)
+        self.assertEqual([n for n, _ in document.find("needle")], [3, 1001])
+        self.assertLessEqual(sum(read), 2 * SearchIndex.block_size)
+
+    def test_repeated_search_scans_only_candidate_blocks(self):
+        self.make_file([f"line {i}\n" for i in range(50_000)] + ["needle\n"] + [f"line {i}\n" for i in range(50_000)])
+        document = Document(self.temporary_file, "rope")
+        read = []
+        content = document.current_content
+        copy_range = content.copy_range
+        content.copy_range = lambda start, stop: read.append(stop - start) or copy_range(start, stop)
+
+        # A search of a range doesn't learn the trigrams of the pattern, since it doesn't read the other blocks.
+        self.assertEqual(document.find("needle", False, 1, 10), [])
+        self.assertEqual(document.find("needle"), [(50_001, "needle\n")])
+        self.assertEqual(sum(read), SearchIndex.block_size + 100_001)
+
+        read.clear()
+        self.assertEqual(document.find("needle"), [(50_001, "needle\n")])
+        self.assertEqual(read, [SearchIndex.block_size])
+
+    def test_edits_dont_depend_on_the_number_of_matches(self):
+        self.make_file([f"line {i}\n" for i in range(200_000)])
+        document = Document(self.temporary_file, "rope")
+        document.find("line")
+        document.find("line")
+
+        started = time.perf_counter()
+        for _ in range(20):
+            document.delete_line(1)
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertEqual(document.find("line 199999"), [(199_980, "line 199999\n")])
+
+
+if __name__ == "__main__":
+    unittest.main()
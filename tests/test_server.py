@@ -0,0 +1,160 @@
+import asyncio
+import json
+import os
+import pathlib
+import tempfile
+import unittest
+import unittest.mock
+
+from editor.server import EditorServer
+
+
+class TestEditorServer(unittest.IsolatedAsyncioTestCase):
+    files = ("tmp_server1.txt", "tmp_server2.txt", "tmp_server3.txt")
+
+    def setUp(self):
+        for name in self.files:
+            with open(pathlib.Path("files", name), "w", encoding="utf-8") as f:
+                f.write("Line #1\nLine #2\nLine #3")
+            self.addCleanup(os.remove, pathlib.Path("files", name))
+            for suffix in ("wal", "checkpoint"):
+                self.addCleanup(pathlib.Path("files", f".{name}.{suffix}").unlink, missing_ok=True)
+
+    async def make_server(
+        self, memory_limit: int = 256 << 20, eviction: str = "save", engine: str | None = None
+    ) -> EditorServer:
+        server = EditorServer("files", engine, memory_limit=memory_limit, eviction=eviction, workers=2)
+        self.addAsyncCleanup(server.shutdown)
+        return server
+
+    async def request(self, server: EditorServer, path: str, command: str) -> dict:
+        return await server.handle_request(json.dumps({"path": path, "command": command}).encode("utf-8"))
+
+    def read_file(self, name: str) -> list[str]:
+        with open(pathlib.Path("files", name), "r", encoding="utf-8") as f:
+            return f.readlines()
+
+    async def test_commands(self):
+        server = await self.make_server()
+        self.assertEqual(await self.request(server, self.files[0], "delete 1"), {"ok": True, "result": None})
+        self.assertEqual(await self.request(server, self.files[0], 'find "#3"'), {"ok": True, "result": "2: Line #3"})
+        response = await server.handle_request(b'{"id": 7, "path": "tmp_server1.txt", "command": "save"}')
+        self.assertEqual((response["id"], response["ok"]), (7, True))
+        self.assertTrue(response["result"].startswith("Saved"))
+        self.assertEqual(self.read_file(self.files[0]), ["Line #2\n", "Line #3"])
+
+        self.assertEqual(await self.request(server, self.files[0], "close"), {"ok": True, "result": None})
+        self.assertEqual(len(server.documents), 0)
+        self.assertEqual(server.size, 0)
+
+    async def test_errors(self):
+        server = await self.make_server()
+        self.assertEqual(await server.handle_request(b"not json"), {"ok": False, "error": "Error! Invalid request."})
+        self.assertEqual(await server.handle_request(b'{"path": 1}'), {"ok": False, "error": "Error! Invalid request."})
+
+        response = await self.request(server, "../main.py", "delete 1")
+        self.assertFalse(response["ok"])
+        self.assertIn("outside", response["error"])
+
+        response = await self.request(server, "missing.txt", "delete 1")
+        self.assertFalse(response["ok"])
+        response = await self.request(server, self.files[0], "jump 1")
+        self.assertFalse(response["ok"])
+        response = await self.request(server, self.files[0], "delete 10")
+        self.assertFalse(response["ok"])
+
+        await self.request(server, self.files[0], "delete 1")
+        response = await self.request(server, self.files[0], "close")
+        self.assertEqual(response, {"ok": False, "error": "Error! The file has unsaved changes."})
+
+    async def test_lru_eviction_saves(self):
+        server = await self.make_server(memory_limit=1)
+        for name in self.files:
+            await self.request(server, name, "delete 1")
+        # Every document is over the limit on its own, so each is evicted after its command.
+        self.assertEqual(len(server.documents), 0)
+        for name in self.files:
+            self.assertEqual(self.read_file(name), ["Line #2\n", "Line #3"])
+
+        self.assertEqual(await self.request(server, self.files[0], 'find "#2"'), {"ok": True, "result": "1: Line #2"})
+
+    async def test_lru_keeps_recently_used(self):
+        server = await self.make_server()
+        for name in self.files:
+            await self.request(server, name, "stats")
+        await self.request(server, self.files[0], "stats")
+        server.memory_limit = server.size - 1
+        await server._evict()
+        self.assertEqual([path.name for path in server.documents], [self.files[2], self.files[0]])
+
+    async def test_inserted_lines_count_toward_memory_limit(self):
+        server = await self.make_server()
+        await self.request(server, self.files[0], "stats")
+        opened_size = server.size
+        journal = next(iter(server.documents.values())).document.journal
+        for _ in range(5):
+            await self.request(server, self.files[0], "copy 1-3 3")
+        # Copies are undone by deleting the lines, so the journal stays small while the buffer grows.
+        self.assertGreater(server.size, opened_size + 5 * 3 * 8)
+        self.assertLess(journal.size, 100)
+        await self.request(server, self.files[0], "undo 5")
+        # The copied lines are now held by the redo history instead.
+        self.assertEqual(server.size - journal.size, opened_size)
+
+        server.memory_limit = opened_size + 100
+        await self.request(server, self.files[0], 'insert 1 "' + "x" * 200 + '"')
+        self.assertEqual(len(server.documents), 0)
+
+    async def test_commands_doing_io_run_in_thread_pool(self):
+        for engine, eviction, delete_runs_in_pool in (
+            (None, "save", False),
+            (None, "journal", True),
+            ("mapped", "save", True),
+        ):
+            with self.subTest(engine=engine, eviction=eviction):
+                server = await self.make_server(eviction=eviction, engine=engine)
+                await self.request(server, self.files[0], "stats")
+                with unittest.mock.patch.object(server, "_run_blocking", wraps=server._run_blocking) as run_blocking:
+                    await self.request(server, self.files[0], "delete 1")
+                self.assertEqual(run_blocking.await_count, int(delete_runs_in_pool))
+                await self.request(server, self.files[0], "undo")
+
+    async def test_journal_eviction_keeps_edits_unsaved(self):
+        server = await self.make_server(memory_limit=1, eviction="journal")
+        await self.request(server, self.files[0], "delete 1")
+        await self.request(server, self.files[0], 'insert 1 "!"')
+        self.assertEqual(len(server.documents), 0)
+        self.assertEqual(self.read_file(self.files[0]), ["Line #1\n", "Line #2\n", "Line #3"])
+
+        self.assertEqual(await self.request(server, self.files[0], 'find "!"'), {"ok": True, "result": "1: Line #2!"})
+        response = await self.request(server, self.files[0], "close")
+        self.assertEqual(response, {"ok": False, "error": "Error! The file has unsaved changes."})
+        await self.request(server, self.files[0], "save")
+        self.assertEqual(self.read_file(self.files[0]), ["Line #2!\n", "Line #3"])
+
+    async def test_concurrent_requests(self):
+        server = await self.make_server(memory_limit=1)
+        responses = await asyncio.gather(
+            *(self.request(server, name, "delete 1") for name in self.files for _ in range(2))
+        )
+        self.assertTrue(all(response["ok"] for response in responses))
+        for name in self.files:
+            self.assertEqual(self.read_file(name), ["Line #3"])
+
+    async def test_unix_socket(self):
+        server = await self.make_server()
+        with tempfile.TemporaryDirectory() as directory:
+            address = os.path.join(directory, "editor.sock")
+            listener = await server.start(address)
+            async with listener:
+                reader, writer = await asyncio.open_unix_connection(address)
+                writer.write(b'{"id": "a", "path": "tmp_server2.txt", "command": "swap 1 3"}\n\n')
+                writer.write(b'{"id": "b", "path": "tmp_server2.txt", "command": "save"}\n')
+                await writer.drain()
+                responses = [json.loads(await reader.readline()) for _ in range(2)]
+                writer.close()
+                await writer.wait_closed()
+
+        self.assertEqual(responses[0], {"id": "a", "ok": True, "result": None})
+        self.assertEqual((responses[1]["id"], responses[1]["ok"]), ("b", True))
+        self.assertEqual(self.read_file(self.files[1]), ["Line #3\n", "Line #2\n", "Line #1\n"])
@@ -0,0 +1,117 @@
+import os
+import pathlib
+import random
+import unittest
+
+from editor import Editor
+from editor.buffers import RopeBuffer
+from editor.document import Document
+from editor.spill import SpillStore
+
+
+class TestSpillStore(unittest.TestCase):
+    def setUp(self):
+        self.store = SpillStore()
+        self.addCleanup(self.store.close)
+
+    def test_lines_and_entries_round_trip(self):
+        first = self.store.append_lines(["a\n", "ünïcode\n", "last"])
+        entry = self.store.spill_ops([("insert", 0, "x\n"), ("insert_range", 1, ["y\n", "z\n"])])
+        second = self.store.append_lines(["b\n"])
+
+        self.assertEqual(first, (0, 3))
+        self.assertEqual(list(self.store.iter_lines(*first)), ["a\n", "ünïcode\n", "last"])
+        self.assertEqual(self.store.line(first[0] + 1), "ünïcode\n")
+        self.assertEqual(list(self.store.iter_lines(*second)), ["b\n"])
+        self.assertEqual(entry.load(), [("insert", 0, "x\n"), ("insert_range", 1, ["y\n", "z\n"])])
+        self.assertEqual(self.store.line_page_ins.count, 3)
+        self.assertEqual(self.store.entry_page_ins.count, 1)
+
+    def test_ropes_spill_their_lines_and_stay_out_of_entries(self):
+        rope = RopeBuffer(f"line {i}\n" for i in range(1000))
+        entry = self.store.spill_ops([("replace", rope)])
+        self.assertEqual(self.store.spilled_lines, 1000)
+        self.assertTrue(all(not isinstance(segment, list) for segment in rope.segments()))
+        (op,) = entry.load()
+        self.assertIs(op[1], rope)
+        self.assertEqual(rope[999], "line 999\n")
+
+
+class TestDocumentMemoryBudget(unittest.TestCase):
+    temporary_file = pathlib.Path("files", "tmp_spill.txt")
+    lines = [f"line {i}\n" for i in range(3000)]
+
+    def setUp(self):
+        with open(self.temporary_file, "w", encoding="utf-8") as f:
+            f.writelines(self.lines)
+        self.addCleanup(os.remove, self.temporary_file)
+
+    def test_edits_match_a_document_without_budget(self):
+        budget = 4000
+        for engine in ("list", "rope", "mapped", "bytes"):
+            with self.subTest(engine=engine):
+                generator = random.Random(5)
+                document = Document(self.temporary_file, engine)
+                document.enable_spill(budget)
+                expected = Document(self.temporary_file, "list")
+                for step in range(200):
+                    number_of_lines = document.number_of_lines
+                    first, last = sorted((generator.randint(1, number_of_lines), generator.randint(1, number_of_lines)))
+                    last = min(last, first + 40)
+                    for target in (document, expected):
+                        match step % 5:
+                            case 0:
+                                target.insert_line(f"edit {step}", first)
+                            case 1 if first != last:
+                                target.swap_lines(first, last)
+                            case 2:
+                                target.delete_lines(first, last)
+                            case 3:
+                                target.copy_lines(first, last, 0)
+                            case 4:
+                                target.undo(2)
+                    self.assertEqual(list(document.current_content), list(expected.current_content), f"step {step}")
+                    if engine != "list":
+                        self.assertLessEqual(document.memory_size, budget)
+
+                document.undo(1000)
+                self.assertEqual(list(document.current_content), self.lines)
+                document.redo(1000)
+                expected.undo(1000)
+                expected.redo(1000)
+                self.assertEqual(list(document.current_content), list(expected.current_content))
+                self.assertGreater(document.spill_store.spilled_entries, 0)
+                self.assertGreater(document.spill_store.entry_page_ins.count, 0)
+
+                document.save()
+                with open(self.temporary_file, "r", encoding="utf-8") as f:
+                    self.assertEqual(f.readlines(), list(expected.current_content))
+                document.close()
+                with open(self.temporary_file, "w", encoding="utf-8") as f:
+                    f.writelines(self.lines)
+
+    def test_cold_lines_are_spilled_first(self):
+        document = Document(self.temporary_file, "rope")
+        document.insert_line("!", 1)
+        document.enable_spill(100_000)
+        segments = list(document.current_content.segments())
+        # The first leaf was edited last, so it's the one kept in memory.
+        self.assertIsInstance(segments[0], list)
+        self.assertTrue(all(not isinstance(segment, list) for segment in segments[1:]))
+
+        report = document.save()
+        self.assertGreater(report.bytes_copied, 0)
+        with open(self.temporary_file, "r", encoding="utf-8") as f:
+            self.assertEqual(f.readlines(), ["line 0!\n", *self.lines[1:]])
+
+    def test_stats_report_page_ins(self):
+        editor = Editor(self.temporary_file, "rope", memory_budget=1000)
+        editor.execute(editor.parse("swap 1 3000"))
+        data = editor.stats.to_dict(editor.document)["spill"]
+        self.assertEqual(data["budget_bytes"], 1000)
+        self.assertGreater(data["line_page_ins"]["count"], 0)
+        self.assertIn("Spill: ", editor.execute(editor.parse("stats")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import pathlib
+import stat
+import unittest
+import unittest.mock
+
+from editor.buffers import MappedBuffer, RopeBuffer
+from editor.storage import write_atomically
+
+
+class TestWriteAtomically(unittest.TestCase):
+    temporary_file = pathlib.Path("files", "tmp_storage.txt")
+
+    def setUp(self):
+        with open(self.temporary_file, "w", encoding="utf-8") as f:
+            f.writelines(f"Line #{i}\n" for i in range(1000))
+        self.addCleanup(os.remove, self.temporary_file)
+
+    def test_write_lines(self):
+        report = write_atomically(self.temporary_file, RopeBuffer(["Line #1\n", "Line #2"]).segments())
+
+        with open(self.temporary_file, "r", encoding="utf-8") as f:
+            self.assertEqual(f.readlines(), ["Line #1\n", "Line #2"])
+        self.assertEqual(report.bytes_written, 15)
+        self.assertEqual(report.bytes_copied, 0)
+
+    def test_untouched_mapped_lines_are_copied(self):
+        buffer = MappedBuffer.open(self.temporary_file)
+        self.addCleanup(buffer.source.close)
+        buffer[500] = "Changed line\n"
+        expected = list(buffer)
+
+        report = write_atomically(self.temporary_file, buffer.segments())
+
+        with open(self.temporary_file, "r", encoding="utf-8") as f:
+            self.assertEqual(f.readlines(), expected)
+        self.assertEqual(report.bytes_written, len("".join(expected)))
+        self.assertEqual(report.bytes_copied, report.bytes_written - len("Changed line\n"))
+
+    def test_file_mode_is_kept(self):
+        os.chmod(self.temporary_file, 0o640)
+        write_atomically(self.temporary_file, [["Line #1\n"]])
+        self.assertEqual(stat.S_IMODE(os.stat(self.temporary_file).st_mode), 0o640)
+
+    def test_failed_write_keeps_original_file(self):
+        def broken_lines():
+            yield "Line #1\n"
+            raise RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            write_atomically(self.temporary_file, [broken_lines()])
+
+        with open(self.temporary_file, "r", encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 1000)
+        self.assertEqual([p for p in self.temporary_file.parent.iterdir() if p.name.endswith(".tmp")], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import io
+import os
+import pathlib
+import unittest
+import unittest.mock
+
+from editor import Editor
+from editor.streaming import StreamedDocument
+
+
+class TestStreamedDocument(unittest.TestCase):
+    input_file = pathlib.Path("files", "tmp_stream_input.txt")
+    output_file = pathlib.Path("files", "tmp_stream_output.txt")
+    script = 'swap 1 1000\ndelete 500\ninsert 10 5 "!"\ninsert "appended"\ndelete 2\nundo\nswap 2 998\n'
+
+    def setUp(self):
+        with open(self.input_file, "w", encoding="utf-8") as f:
+            f.writelines(f"Line #{i}\n" for i in range(1, 1001))
+        self.addCleanup(os.remove, self.input_file)
+        self.addCleanup(lambda: self.output_file.exists() and os.remove(self.output_file))
+
+    def streamed_editor(self) -> Editor:
+        editor = Editor(self.input_file, output=self.output_file)
+        self.addCleanup(lambda: editor.document.current_content.source.close())
+        return editor
+
+    def run_script(self, editor: Editor, script: str) -> int:
+        with unittest.mock.patch("sys.stderr", new_callable=io.StringIO):
+            return editor.run_script(io.StringIO(script))
+
+    def test_output_matches_editing_in_memory(self):
+        editor = self.streamed_editor()
+        self.assertEqual(self.run_script(editor, self.script), 0)
+        with open(self.output_file, "r", encoding="utf-8") as f:
+            streamed = f.readlines()
+
+        with open(self.input_file, "r", encoding="utf-8") as f:
+            self.assertEqual(f.readlines(), [f"Line #{i}\n" for i in range(1, 1001)])
+
+        editor = Editor(self.input_file, "list")
+        self.run_script(editor, self.script)
+        self.assertEqual(streamed, list(editor.document.current_content))
+
+    def test_untouched_lines_are_never_decoded(self):
+        document = StreamedDocument(self.input_file, self.output_file)
+        self.addCleanup(document.current_content.source.close)
+        document.swap_lines(1, 1000)
+        document.delete_line(500)
+
+        decoded = sum(len(segment) for segment in document.current_content.segments() if isinstance(segment, list))
+        self.assertLess(decoded, 100)
+
+        report = document.save()
+        self.assertGreater(report.bytes_copied, report.bytes_written * 9 // 10)
+
+    def test_failed_script_writes_nothing(self):
+        editor = self.streamed_editor()
+        self.assertEqual(self.run_script(editor, "delete 1\ndelete 1001\n"), 1)
+        self.assertFalse(self.output_file.exists())
+
+    def test_save_writes_output_and_close_keeps_it(self):
+        editor = self.streamed_editor()
+        self.assertEqual(self.run_script(editor, "delete 1\nsave\ndelete 1\nundo\nclose\n"), 0)
+        with open(self.output_file, "r", encoding="utf-8") as f:
+            self.assertEqual(f.readline(), "Line #2\n")
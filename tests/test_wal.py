@@ -0,0 +1,148 @@
+import os
+import pathlib
+import time
+import unittest
+import unittest.mock
+
+from editor.autosave import Autosaver
+from editor.document import Document
+from editor.wal import WriteAheadLog
+
+
+class TestWriteAheadLog(unittest.TestCase):
+    temporary_file = pathlib.Path("files", "tmp_wal.txt")
+    log_file = pathlib.Path("files", ".tmp_wal.txt.wal")
+    checkpoint_file = pathlib.Path("files", ".tmp_wal.txt.checkpoint")
+
+    def setUp(self):
+        with open(self.temporary_file, "w", encoding="utf-8") as f:
+            f.writelines(f"Line #{i}\n" for i in range(1, 101))
+        self.addCleanup(os.remove, self.temporary_file)
+        self.addCleanup(self.log_file.unlink, missing_ok=True)
+        self.addCleanup(self.checkpoint_file.unlink, missing_ok=True)
+
+    def open_document(self, engine: str = "list") -> tuple[Document, int]:
+        document = Document(self.temporary_file, engine)
+        recovered = document.enable_wal()
+        self.addCleanup(lambda: document.wal.fd != -1 and os.close(document.wal.fd))
+        return document, recovered
+
+    def edit(self, document: Document) -> None:
+        document.delete_line(1)
+        document.insert_line("appended")
+        document.swap_lines(1, 99)
+        document.insert_line("!", 50, 3)
+        document.undo()
+        document.redo()
+
+    def test_recover_after_crash(self):
+        for engine in ("list", "rope", "mapped"):
+            with self.subTest(engine=engine):
+                document, recovered = self.open_document(engine)
+                self.assertEqual(recovered, 0)
+                self.edit(document)
+                expected = list(document.current_content)
+
+                # The first document is never saved or closed, like in a killed process.
+                recovered_document, recovered = self.open_document(engine)
+                self.assertEqual(recovered, 6)
+                self.assertEqual(list(recovered_document.current_content), expected)
+                self.assertTrue(recovered_document.has_unsaved_changes)
+                self.log_file.unlink()
+
+    def test_range_edits_are_replayed(self):
+        for engine in ("list", "rope", "mapped"):
+            with self.subTest(engine=engine):
+                document, _ = self.open_document(engine)
+                document.delete_lines(10, 50)
+                document.move_lines(1, 5, 20)
+                document.copy_lines(30, 40, 0)
+                document.swap_ranges((1, 3), (50, 60))
+                document.undo()
+                expected = list(document.current_content)
+
+                recovered_document, recovered = self.open_document(engine)
+                self.assertEqual(recovered, 5)
+                self.assertEqual(list(recovered_document.current_content), expected)
+                self.log_file.unlink()
+
+    def test_torn_tail_is_ignored(self):
+        document, _ = self.open_document()
+        document.delete_line(1)
+        document.delete_line(1)
+        with open(self.log_file, "ab") as f:
+            f.write(b'0badc0de [["delete",0]]\n12345678 [["del')
+
+        document, recovered = self.open_document()
+        self.assertEqual(recovered, 2)
+        document.delete_line(1)
+
+        document, recovered = self.open_document()
+        self.assertEqual(recovered, 3)
+        self.assertEqual(document.current_content[0], "Line #4\n")
+
+    def test_clear_is_checkpointed(self):
+        document, _ = self.open_document()
+        document.delete_line(1)
+        document.clear()
+        document.insert_line("After clear")
+        self.assertTrue(self.checkpoint_file.exists())
+
+        document, recovered = self.open_document()
+        self.assertEqual(recovered, 1)
+        self.assertEqual(document.current_content, ["After clear"])
+
+    def test_periodic_checkpoint(self):
+        with unittest.mock.patch.object(WriteAheadLog, "checkpoint_records", 3):
+            document, _ = self.open_document()
+            for _ in range(5):
+                document.delete_line(1)
+            self.assertEqual(document.wal.records, 1)
+
+            document, recovered = self.open_document()
+            self.assertEqual(recovered, 1)
+            self.assertEqual(document.current_content[0], "Line #6\n")
+
+    def test_stale_log_is_discarded(self):
+        document, _ = self.open_document()
+        document.delete_line(1)
+        with open(self.temporary_file, "a", encoding="utf-8") as f:
+            f.write("Changed by someone else\n")
+
+        document, recovered = self.open_document()
+        self.assertEqual(recovered, 0)
+        self.assertEqual(document.number_of_lines, 101)
+
+    def test_save_and_close(self):
+        document, _ = self.open_document()
+        document.delete_line(1)
+        document.save()
+        document.delete_line(1)
+
+        recovered_document, recovered = self.open_document()
+        self.assertEqual(recovered, 1)
+        self.assertEqual(recovered_document.current_content[0], "Line #3\n")
+
+        document.undo()
+        document.close()
+        self.assertFalse(self.log_file.exists())
+
+    def test_autosave_rebases_log(self):
+        document, _ = self.open_document()
+        autosaver = Autosaver(document, interval=60, max_edits=2)
+        self.addCleanup(autosaver.stop)
+
+        for _ in range(2):
+            with autosaver.lock:
+                document.delete_line(1)
+            autosaver.edited()
+        deadline = time.monotonic() + 5
+        while document.wal.records and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(document.wal.records, 0)
+
+        with autosaver.lock:
+            document.delete_line(1)
+        recovered_document, recovered = self.open_document()
+        self.assertEqual(recovered, 1)
+        self.assertEqual(recovered_document.current_content[0], "Line #4\n")